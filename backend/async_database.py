@@ -0,0 +1,149 @@
+# async_database.py
+# Optional asyncio backend (DB_BACKEND=async) on psycopg 3's async pool.
+import os
+from contextlib import asynccontextmanager
+
+import time
+
+from psycopg.pq import TransactionStatus  # type: ignore
+from psycopg.rows import dict_row  # type: ignore
+from psycopg_pool import AsyncConnectionPool, PoolTimeout  # type: ignore
+
+from database import PoolTimeoutError, connection_params
+from query_stats import QueryStats
+from statements import Statement, registry
+
+
+class AsyncDatabase:
+    """
+    Async counterpart of database.Database: same execute() signature, awaited.
+    Uses the same DB_DSN and DB_POOL_MIN / DB_POOL_MAX / DB_POOL_TIMEOUT settings.
+    The pool is opened by open() on application startup.
+
+    psycopg prepares any query on a connection after its fifth run there;
+    Statements (statements.py) are prepared on their first. DB_PREPARE=0
+    turns both off.
+    """
+
+    def __init__(
+        self, minconn=None, maxconn=None, timeout=None, queries=None, dsn=None
+    ):
+        self.minconn = int(minconn or os.getenv("DB_POOL_MIN", 1))
+        self.maxconn = int(maxconn or os.getenv("DB_POOL_MAX", 10))
+        self.timeout = float(timeout or os.getenv("DB_POOL_TIMEOUT", 5))
+        self.queries = queries or QueryStats()
+        self.statements = registry if os.getenv("DB_PREPARE", "1") != "0" else None
+        self.dsn = dsn or os.getenv("DB_DSN")
+
+        if self.dsn:
+            params = {}
+        else:
+            params = {k: v for k, v in connection_params().items() if v is not None}
+        if self.statements is None:
+            params["prepare_threshold"] = None
+        self.pool = AsyncConnectionPool(
+            self.dsn or "",
+            kwargs={**params, "row_factory": dict_row, "autocommit": True},
+            min_size=self.minconn,
+            max_size=self.maxconn,
+            timeout=self.timeout,
+            check=AsyncConnectionPool.check_connection,
+            open=False,
+        )
+
+    async def open(self):
+        await self.pool.open(wait=True)
+
+    async def close(self):
+        await self.pool.close()
+
+    @asynccontextmanager
+    async def connection(self):
+        try:
+            async with self.pool.connection() as conn:
+                yield conn
+        except PoolTimeout as exc:
+            raise PoolTimeoutError(str(exc)) from exc
+
+    async def execute(self, query, params=None, fetch_one=False, commit=False):
+        async with self.connection() as conn:
+            return await AsyncTransaction(conn, self.queries, self.statements).execute(
+                query, params, fetch_one, commit
+            )
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Async version of Database.transaction()."""
+        async with self.connection() as conn:
+            async with conn.transaction():
+                yield AsyncTransaction(conn, self.queries, self.statements)
+
+    def stats(self):
+        stats = self.pool.get_stats()
+        size = stats.get("pool_size", 0)
+        available = stats.get("pool_available", 0)
+        return {
+            "minSize": self.minconn,
+            "maxSize": self.maxconn,
+            "inUse": size - available,
+            "utilization": round((size - available) / self.maxconn, 3),
+            "checkouts": stats.get("requests_num", 0),
+            "waitAvgMs": (
+                round(stats.get("requests_wait_ms", 0) / stats["requests_num"], 3)
+                if stats.get("requests_num")
+                else 0.0
+            ),
+            "queued": stats.get("requests_queued", 0),
+            "timeouts": stats.get("requests_errors", 0),
+            "reconnects": stats.get("connections_lost", 0),
+        }
+
+
+class AsyncTransaction:
+    """Async counterpart of database.Transaction."""
+
+    def __init__(self, connection, queries=None, statements=None):
+        self.connection = connection
+        self.queries = queries
+        self.statements = statements
+
+    async def execute(self, query, params=None, fetch_one=False, commit=False):
+        async with self.connection.cursor() as cur:
+            statement = self.statements is not None and isinstance(query, Statement)
+            started = time.perf_counter()
+            # psycopg keeps the per-connection PREPAREd statements itself
+            await cur.execute(query, params, prepare=True if statement else None)
+            seconds = time.perf_counter() - started
+            if statement:
+                self.statements.record(query, seconds, prepared=True)
+            if self.queries is not None:
+                await self._record(query, params, seconds, cur)
+            if commit:
+                return None
+            if fetch_one:
+                return await cur.fetchone()
+            else:
+                return await cur.fetchall()
+
+    async def _record(self, query, params, seconds, cur):
+        # QueryStats calls explain() synchronously, so a wanted plan is
+        # fetched here first and handed over as a ready result.
+        stats = self.queries
+        plan_rows = None
+        if (
+            stats.wants_plan(query, seconds)
+            and self.connection.info.transaction_status == TransactionStatus.IDLE
+        ):
+            try:
+                async with self.connection.cursor() as ecur:
+                    await ecur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                    plan_rows = await ecur.fetchall()
+            except Exception as exc:  # the plan is best-effort diagnostics
+                plan_rows = [{"plan": f"EXPLAIN failed: {exc}"}]
+
+        def explain(prefix):
+            if plan_rows is None:
+                raise RuntimeError("inside a transaction")
+            return plan_rows
+
+        stats.record(query, seconds, cur.rowcount, explain)
@@ -0,0 +1,263 @@
+# async_routes.py
+# `async def` handlers for DB_BACKEND=async. main.py includes this router before
+# its own sync routes, so these win for every path they define; everything
+# else keeps using the sync handlers.
+import asyncio
+from datetime import date, datetime
+
+from fastapi import APIRouter, Depends, Query, HTTPException, Request  # type: ignore
+
+from match_service import PAGE_SIZE, MAX_PAGE_SIZE
+from async_services import (
+    AsyncPlayerService,
+    AsyncMatchService,
+    AsyncLeaderboardService,
+    AsyncEloService,
+    AsyncEloSettingsService,
+)
+from dependencies import (
+    get_adb,
+    get_elo_service,
+    get_job_queue,
+    get_live_updates,
+    get_rollup_service,
+    refresh_snapshot,
+)
+from result_cache import cached_json_async
+
+
+class AsyncServices:
+    """The async services over one AsyncDatabase, plus the sync services
+    they delegate to."""
+
+    def __init__(self, adb, elo_service, rollup_service, live_updates, jobs):
+        self.adb = adb
+        self.rollup = rollup_service
+        self.live = live_updates
+        self.players = AsyncPlayerService(adb)
+        self.leaderboard = AsyncLeaderboardService(adb)
+        self.elo_settings = AsyncEloSettingsService(adb)
+        self.elo = AsyncEloService(adb, elo_service)
+        self.matches = AsyncMatchService(adb, elo_service=self.elo, jobs=jobs)
+
+
+def build_router(result_cache) -> APIRouter:
+    router = APIRouter()
+    built = []
+
+    async def get_services() -> AsyncServices:
+        # built on the first request, once the pool is open
+        if not built:
+            adb = await get_adb()
+            sync_services = await asyncio.gather(
+                asyncio.to_thread(get_elo_service),
+                asyncio.to_thread(get_rollup_service),
+                asyncio.to_thread(get_live_updates),
+                asyncio.to_thread(get_job_queue),
+            )
+            if not built:
+                built.append(AsyncServices(adb, *sync_services))
+        return built[0]
+
+    # ----------- Player Routes -----------
+    @router.get("/players")
+    async def get_players(svc: AsyncServices = Depends(get_services)):
+        return await svc.players.get_players()
+
+    @router.post("/players")
+    async def add_player(player: dict, svc: AsyncServices = Depends(get_services)):
+        name = player.get("name")
+        if not name or not str(name).strip():
+            raise HTTPException(status_code=400, detail="name is required")
+        await svc.players.add_player(name)
+        await svc.matches.backfill_participants(player_name=name)
+        await asyncio.to_thread(svc.rollup.apply_player, name)
+        await svc.elo.invalidate()
+        await asyncio.to_thread(result_cache.bump)
+        await asyncio.to_thread(svc.live.publish_reset)
+        await asyncio.to_thread(refresh_snapshot)
+        return {"message": f"Player {name} added successfully."}
+
+    # ----------- Match Routes -----------
+    @router.get("/matches")
+    async def get_matches(svc: AsyncServices = Depends(get_services)):
+        return await svc.matches.get_matches()
+
+    @router.get("/matches/page")
+    async def get_matches_page(
+        limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = None,
+        player_id: int | None = None,
+        club: str | None = None,
+        start: date | None = None,
+        end: date | None = None,
+        svc: AsyncServices = Depends(get_services),
+    ):
+        try:
+            return await svc.matches.get_matches_page(
+                limit, cursor, player_id=player_id, club=club, start=start, end=end
+            )
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+
+    @router.post("/matches")
+    async def add_match(match: dict, svc: AsyncServices = Depends(get_services)):
+        created = await svc.matches.add_match(
+            match.get("clubA"),
+            match.get("clubB"),
+            match.get("teamA"),
+            match.get("teamB"),
+            match.get("scoreA"),
+            match.get("scoreB"),
+        )
+        await asyncio.to_thread(result_cache.bump)
+        return {"message": "Match added successfully.", "match": created}
+
+    # ----------- Leaderboard Routes -----------
+    @router.get("/leaderboard/players")
+    async def get_players_lb(
+        request: Request,
+        start_time: date = Query(...),
+        svc: AsyncServices = Depends(get_services),
+    ):
+        return await cached_json_async(
+            result_cache,
+            request,
+            ("leaderboard/players", start_time, None),
+            lambda: svc.leaderboard.get_player_leaderboard(start_time),
+        )
+
+    @router.get("/leaderboard/teams")
+    async def get_teams_lb(
+        request: Request,
+        start_time: date = Query(...),
+        svc: AsyncServices = Depends(get_services),
+    ):
+        return await cached_json_async(
+            result_cache,
+            request,
+            ("leaderboard/teams", start_time, None),
+            lambda: svc.leaderboard.get_team_leaderboard(start_time),
+        )
+
+    @router.get("/leaderboard/duos")
+    async def get_duos_lb(
+        request: Request,
+        start_time: date = Query(...),
+        svc: AsyncServices = Depends(get_services),
+    ):
+        return await cached_json_async(
+            result_cache,
+            request,
+            ("leaderboard/duos", start_time, None),
+            lambda: svc.leaderboard.get_duo_leaderboard(start_time),
+        )
+
+    @router.get("/leaderboard/all")
+    async def get_all_lb(
+        request: Request,
+        start_time: date = Query(...),
+        svc: AsyncServices = Depends(get_services),
+    ):
+        async def compute():
+            players, teams, duos = await asyncio.gather(
+                svc.leaderboard.get_player_leaderboard(start_time),
+                svc.leaderboard.get_team_leaderboard(start_time),
+                svc.leaderboard.get_duo_leaderboard(start_time),
+            )
+            return {"players": players, "teams": teams, "duos": duos}
+
+        return await cached_json_async(
+            result_cache, request, ("leaderboard/all", start_time, None), compute
+        )
+
+    # ----------- Pair Stats -----------
+    @router.get("/stats/partners")
+    async def get_partner_stats(
+        request: Request,
+        player: int = Query(...),
+        start_time: date = date(2000, 1, 1),
+        svc: AsyncServices = Depends(get_services),
+    ):
+        return await cached_json_async(
+            result_cache,
+            request,
+            ("stats/partners", start_time, player),
+            lambda: svc.leaderboard.get_partner_stats(player, start_time),
+        )
+
+    @router.get("/stats/rivals")
+    async def get_rival_stats(
+        request: Request,
+        player: int = Query(...),
+        start_time: date = date(2000, 1, 1),
+        svc: AsyncServices = Depends(get_services),
+    ):
+        return await cached_json_async(
+            result_cache,
+            request,
+            ("stats/rivals", start_time, player),
+            lambda: svc.leaderboard.get_rival_stats(player, start_time),
+        )
+
+    # ----------- Admin Routes -----------
+    @router.get("/admin/players")
+    async def get_all_players(svc: AsyncServices = Depends(get_services)):
+        return await svc.players.get_players()
+
+    @router.delete("/admin/player/{player_id}")
+    async def delete_player(player_id: int, svc: AsyncServices = Depends(get_services)):
+        # the player's rollup rows go with it (ON DELETE CASCADE)
+        result = await svc.players.delete_player(player_id)
+        await svc.elo.invalidate()
+        await asyncio.to_thread(result_cache.bump)
+        await asyncio.to_thread(svc.live.publish_reset)
+        await asyncio.to_thread(refresh_snapshot)
+        return result
+
+    @router.get("/admin/matches")
+    async def get_all_matches(svc: AsyncServices = Depends(get_services)):
+        return await svc.matches.get_matches()
+
+    @router.delete("/admin/match/{match_id}")
+    async def delete_match(match_id: int, svc: AsyncServices = Depends(get_services)):
+        result = await svc.matches.delete_match(match_id)
+        await asyncio.to_thread(result_cache.bump)
+        return result
+
+    @router.get("/admin/db/pool")
+    async def get_pool_stats(svc: AsyncServices = Depends(get_services)):
+        return svc.adb.stats()
+
+    # ----------- ELO Ratings -----------
+    @router.get("/elo")
+    async def get_elo(
+        request: Request,
+        k: int | None = Query(default=None, ge=1, le=200),
+        as_of: datetime | None = None,
+        svc: AsyncServices = Depends(get_services),
+    ):
+        async def compute():
+            stored_k = await svc.elo_settings.get_k_factor()
+            if as_of is not None:
+                if k is not None and k != stored_k:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="as_of is only available for the stored K",
+                    )
+                ratings = await svc.elo.get_ratings_as_of(stored_k, as_of)
+            elif k is None or k == stored_k:
+                ratings = await svc.elo.get_ratings(k_factor=stored_k)
+            else:
+                ratings = await svc.elo.compute_ratings(k_factor=k)
+            return {
+                "ratings": [
+                    {"playerId": pid, "elo": elo} for pid, elo in ratings.items()
+                ]
+            }
+
+        return await cached_json_async(
+            result_cache, request, ("elo", as_of, k), compute
+        )
+
+    return router
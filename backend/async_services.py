@@ -0,0 +1,197 @@
+# async_services.py
+# Async versions of the request-path services for DB_BACKEND=async.
+# SQL is shared with the sync modules so both backends run identical queries.
+import asyncio
+from datetime import date
+from typing import Dict
+
+from elo_service import INITIAL_ELO, FETCH_STATE, PERSISTED_RATINGS, RATINGS_AS_OF
+from elo_settings_service import GET_K_FACTOR
+from leaderboard_service import (
+    PLAYER_LEADERBOARD,
+    TEAM_LEADERBOARD,
+    DUO_LEADERBOARD,
+    PARTNER_STATS,
+    RIVAL_STATS,
+)
+from job_queue import ENQUEUE_JOB, enqueue_params
+from match_service import (
+    DELETE_MATCH,
+    GET_MATCHES,
+    INSERT_MATCH,
+    MATCH_PARTICIPANTS,
+    PAGE_SIZE,
+    PARTICIPANTS_FROM_TEAMS,
+    elo_change,
+    page_query,
+    page_result,
+)
+from player_service import DELETE_PLAYER, GET_PLAYERS, INSERT_PLAYER
+from rollup_service import APPLY_MATCH, PRUNE_MATCH
+
+
+class AsyncPlayerService:
+    def __init__(self, adb):
+        self.db = adb
+
+    async def add_player(self, name):
+        await self.db.execute(INSERT_PLAYER, (name,), commit=True)
+
+    async def get_players(self):
+        return await self.db.execute(GET_PLAYERS, fetch_one=False)
+
+    async def delete_player(self, player_id):
+        await self.db.execute(DELETE_PLAYER, (player_id,), commit=True)
+        return {"message": f"Player with ID {player_id} deleted successfully."}
+
+
+class AsyncMatchService:
+    """Enqueues the "elo" job in the write's transaction like MatchService."""
+
+    def __init__(self, adb, elo_service=None, jobs=None):
+        self.db = adb
+        self.elo_service = elo_service
+        self.jobs = jobs
+
+    async def add_match(self, club_a, club_b, team_a, team_b, score_a, score_b):
+        async with self.db.transaction() as tx:
+            match = await tx.execute(
+                INSERT_MATCH,
+                (club_a, club_b, team_a, team_b, score_a, score_b),
+                fetch_one=True,
+            )
+            await tx.execute(
+                MATCH_PARTICIPANTS,
+                (match["id"],),
+                commit=True,
+            )
+            for query in APPLY_MATCH:
+                await tx.execute(
+                    query, {"match_id": match["id"], "sign": 1}, commit=True
+                )
+            await self._enqueue_elo(tx, "added", match)
+        await self._update_elo("added", match)
+        return match
+
+    async def backfill_participants(self, player_name):
+        query = PARTICIPANTS_FROM_TEAMS + "WHERE p.name = %s ON CONFLICT DO NOTHING;"
+        await self.db.execute(query, (player_name,), commit=True)
+
+    async def get_matches(self):
+        return await self.db.execute(GET_MATCHES, fetch_one=False)
+
+    async def get_matches_page(self, limit=PAGE_SIZE, cursor=None, **filters):
+        query, params = page_query(limit, cursor, **filters)
+        return page_result(await self.db.execute(query, params), limit)
+
+    async def delete_match(self, match_id):
+        async with self.db.transaction() as tx:
+            for rollup in APPLY_MATCH + PRUNE_MATCH:
+                await tx.execute(
+                    rollup, {"match_id": match_id, "sign": -1}, commit=True
+                )
+            match = await tx.execute(DELETE_MATCH, (match_id,), fetch_one=True)
+            if match:
+                await self._enqueue_elo(tx, "deleted", match)
+        if match:
+            await self._update_elo("deleted", match)
+        return {"message": f"Match with ID {match_id} deleted successfully."}
+
+    async def _enqueue_elo(self, tx, action, match):
+        if self.jobs:
+            await tx.execute(
+                ENQUEUE_JOB,
+                enqueue_params("elo", [elo_change(action, match)], "elo"),
+                fetch_one=True,
+            )
+
+    async def _update_elo(self, action, match):
+        if self.jobs:
+            # without workers this runs the job, which is sync work
+            await asyncio.to_thread(self.jobs.wake)
+        elif self.elo_service:
+            await self.elo_service.apply_changes([elo_change(action, match)])
+
+
+class AsyncLeaderboardService:
+    def __init__(self, adb):
+        self.db = adb
+
+    async def get_player_leaderboard(self, start_time: date):
+        print("[SERVICE] get_player_leaderboard executing")
+        return await self.db.execute(
+            PLAYER_LEADERBOARD, {"start_time": start_time}, fetch_one=False
+        )
+
+    async def get_team_leaderboard(self, start_time: date):
+        print("[SERVICE] get_team_leaderboard executing")
+        return await self.db.execute(
+            TEAM_LEADERBOARD, {"start_time": start_time}, fetch_one=False
+        )
+
+    async def get_duo_leaderboard(self, start_time: date):
+        print("[SERVICE] get_duo_leaderboard executing")
+        return await self.db.execute(
+            DUO_LEADERBOARD, {"start_time": start_time}, fetch_one=False
+        )
+
+    async def get_partner_stats(self, player_id: int, start_time: date):
+        print("[SERVICE] get_partner_stats executing")
+        return await self.db.execute(
+            PARTNER_STATS, {"player_id": player_id, "start_time": start_time}
+        )
+
+    async def get_rival_stats(self, player_id: int, start_time: date):
+        print("[SERVICE] get_rival_stats executing")
+        return await self.db.execute(
+            RIVAL_STATS, {"player_id": player_id, "start_time": start_time}
+        )
+
+
+class AsyncEloSettingsService:
+    def __init__(self, adb):
+        self.db = adb
+
+    async def get_k_factor(self) -> int:
+        row = await self.db.execute(GET_K_FACTOR, fetch_one=True)
+        return int(row["k_factor"]) if row and row.get("k_factor") is not None else 24
+
+
+class AsyncEloService:
+    """
+    Async reads of the Elo state. Replays and incremental updates are CPU work
+    under a row lock, so they are delegated to the sync EloService in a worker
+    thread rather than re-implemented on the event loop.
+    """
+
+    def __init__(self, adb, elo_service):
+        self.db = adb
+        self.elo_service = elo_service
+
+    async def compute_ratings(self, k_factor: int) -> Dict[int, int]:
+        # replays run over the sync service's in-memory MatchLog
+        return await asyncio.to_thread(self.elo_service.compute_ratings, k_factor)
+
+    async def get_ratings(self, k_factor: int) -> Dict[int, int]:
+        state = await self.db.execute(FETCH_STATE, fetch_one=True)
+        if not state or not state["valid"] or state["k_factor"] != k_factor:
+            await asyncio.to_thread(self.elo_service.rebuild, k_factor)
+
+        rows = await self.db.execute(PERSISTED_RATINGS, (INITIAL_ELO,))
+        return {r["player_id"]: int(round(r["elo"])) for r in rows}
+
+    async def get_ratings_as_of(self, k_factor: int, as_of) -> Dict[int, int]:
+        await asyncio.to_thread(self.elo_service.ensure_current, k_factor)
+        rows = await self.db.execute(
+            RATINGS_AS_OF, {"as_of": as_of, "initial": INITIAL_ELO}
+        )
+        return {r["player_id"]: int(round(r["elo"])) for r in rows}
+
+    async def invalidate(self) -> None:
+        await asyncio.to_thread(self.elo_service.invalidate)
+
+    async def rebuild(self, k_factor: int) -> None:
+        await asyncio.to_thread(self.elo_service.rebuild, k_factor)
+
+    async def apply_changes(self, changes) -> None:
+        await asyncio.to_thread(self.elo_service.apply_changes, changes)
@@ -0,0 +1,87 @@
+"""
+Concurrency benchmark for the pooled Database layer.
+
+Fires leaderboard reads and match inserts in parallel threads against the
+database configured in .env (DB_*), then prints throughput, latency and pool
+stats. Point it at a throwaway local Postgres: it inserts matches and deletes
+them again at the end.
+
+    cd backend
+    DB_POOL_MAX=10 python -m bench.concurrency --threads 16 --seconds 10
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from datetime import date
+
+from database import Database
+from leaderboard_service import LeaderboardService
+from match_service import MatchService
+
+
+def run(threads: int, seconds: float, write_ratio: float):
+    db = Database()
+    leaderboard = LeaderboardService(db)
+    matches = MatchService(db)
+
+    players = [p["name"] for p in db.execute("SELECT name FROM players LIMIT 4;")]
+    clubs = [c["name"] for c in db.execute("SELECT name FROM clubs LIMIT 2;")]
+    if len(players) < 4 or len(clubs) < 2:
+        raise SystemExit("need at least 4 players and 2 clubs in the database")
+
+    latencies = {"read": [], "write": []}
+    inserted = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def worker(n: int):
+        i = 0
+        while time.perf_counter() < deadline:
+            i += 1
+            is_write = (i * threads + n) % 100 < write_ratio * 100
+            started = time.perf_counter()
+            if is_write:
+                m = matches.add_match(
+                    clubs[0], clubs[1], players[:2], players[2:4], i % 5, n % 5
+                )
+            else:
+                leaderboard.get_player_leaderboard(date(2000, 1, 1))
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies["write" if is_write else "read"].append(elapsed)
+                if is_write:
+                    inserted.append(m["id"])
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+
+    for kind, values in latencies.items():
+        if not values:
+            continue
+        values.sort()
+        print(
+            f"{kind:5s} n={len(values):6d} "
+            f"rps={len(values) / seconds:8.1f} "
+            f"p50={1000 * statistics.median(values):7.2f}ms "
+            f"p95={1000 * values[int(len(values) * 0.95) - 1]:7.2f}ms "
+            f"max={1000 * values[-1]:7.2f}ms"
+        )
+    print("pool", db.stats())
+
+    for match_id in inserted:
+        db.execute("DELETE FROM matches WHERE id = %s;", (match_id,), commit=True)
+    db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    args = parser.parse_args()
+    run(args.threads, args.seconds, args.write_ratio)
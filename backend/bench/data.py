@@ -0,0 +1,189 @@
+"""
+Seeded synthetic data: players, clubs and matches with a realistic mix of
+1v1 / 1v2 / 2v2 games, written in the stored "{a,"Can Er"}" team form.
+Loading WIPES players, clubs and matches, so only point it at a throwaway
+database (DB_* in .env).
+
+    cd backend
+    python -m bench.data --players 40 --clubs 60 --matches 100000 --wipe
+"""
+
+import argparse
+import io
+import json
+import math
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from import_service import ImportService
+
+# (mode, side A size, side B size, weight)
+MODES = (("1v1", 1, 1, 0.3), ("1v2", 1, 2, 0.2), ("2v2", 2, 2, 0.5))
+FIRST_NAMES = ["Ali", "Berk", "Can", "Deniz", "Ece", "Fatih", "Gizem", "Hakan"]
+CLUB_NAMES = ["Arsenal", "Barcelona", "Bayern", "City", "Inter", "Juventus"]
+START = datetime(2023, 1, 1, 18, 0)
+
+
+def _array_item(name: str) -> str:
+    # Postgres array output: quote items containing spaces or punctuation
+    if name and not any(c in name for c in ' ,{}"\\'):
+        return name
+    return '"' + name.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def team_text(names: List[str]) -> str:
+    """Team in the form stored by POST /matches (text of a TEXT[])."""
+    return "{" + ",".join(_array_item(n) for n in names) + "}"
+
+
+def _poisson(rng: random.Random, lam: float) -> int:
+    # Knuth; lam stays small (expected goals per side)
+    limit, k, p = math.exp(-lam), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def generate(n_players: int, n_clubs: int, n_matches: int, seed: int = 1) -> dict:
+    """
+    Players carry a hidden strength and clubs a tier, so scores (Poisson goals
+    around 2.5 per side) and ratings spread out like real results. Matches come
+    in evening sessions of a regular group, oldest first.
+    """
+    rng = random.Random(seed)
+    players = []
+    for i in range(n_players):
+        first = FIRST_NAMES[i % len(FIRST_NAMES)]
+        # every other name has a space, so quoting is exercised
+        players.append(f"{first} {i + 1}" if i % 2 else f"{first}{i + 1}")
+    strength = {p: rng.gauss(0, 0.35) for p in players}
+
+    clubs = []
+    for i in range(n_clubs):
+        tier = 1 + i % 5
+        clubs.append(
+            {
+                "name": f"{CLUB_NAMES[i % len(CLUB_NAMES)]} {i + 1}",
+                "tier": tier,
+                "elo": 700 - 50 * tier + rng.randint(-25, 25),
+            }
+        )
+    club_strength = {c["name"]: (c["elo"] - 500) / 400 for c in clubs}
+
+    modes = [m[:3] for m in MODES]
+    weights = [m[3] for m in MODES]
+    group_size = min(n_players, 8)
+    matches, when, group = [], START, []
+    for i in range(n_matches):
+        if i % 12 == 0:
+            # new session: next evening, with a regular group of players
+            when = datetime.combine(
+                (when + timedelta(days=rng.choice((1, 1, 2, 3)))).date(),
+                START.time(),
+            )
+            group = rng.sample(players, group_size)
+        when += timedelta(minutes=rng.randint(8, 15))
+
+        _, size_a, size_b = rng.choices(modes, weights)[0]
+        if size_a + size_b > len(group):
+            size_a = size_b = 1
+        if rng.random() < 0.5:
+            size_a, size_b = size_b, size_a
+        picked = rng.sample(group, size_a + size_b)
+        team_a, team_b = picked[:size_a], picked[size_a:]
+        club_a, club_b = rng.sample(clubs, 2)
+
+        edge = (
+            sum(strength[p] for p in team_a) / size_a
+            - sum(strength[p] for p in team_b) / size_b
+            + club_strength[club_a["name"]]
+            - club_strength[club_b["name"]]
+        )
+        matches.append(
+            {
+                "time": when.isoformat(),
+                "club_a": club_a["name"],
+                "club_b": club_b["name"],
+                "team_a": team_text(team_a),
+                "team_b": team_text(team_b),
+                "score_a": _poisson(rng, max(0.3, 1.4 * math.exp(edge))),
+                "score_b": _poisson(rng, max(0.3, 1.4 * math.exp(-edge))),
+            }
+        )
+    return {"players": players, "clubs": clubs, "matches": matches}
+
+
+def wipe(db) -> None:
+    db.execute(
+        "TRUNCATE matches, players, clubs RESTART IDENTITY CASCADE;", commit=True
+    )
+
+
+def load(
+    db,
+    data: dict,
+    elo_service=None,
+    rollup_service=None,
+    elo_settings=None,
+    batch_size: Optional[int] = None,
+) -> dict:
+    """
+    Replaces the database contents with `data`: players and clubs are COPYed,
+    matches go through ImportService (the same path as POST /admin/matches/import)
+    and the derived state is rebuilt once. Returns the import stats.
+    """
+    started = time.perf_counter()
+    wipe(db)
+    with db.transaction() as tx:
+        tx.copy(
+            "COPY players (name) FROM STDIN;",
+            io.StringIO("".join(f"{p}\n" for p in data["players"])),
+        )
+        tx.copy(
+            "COPY clubs (name, tier, elo) FROM STDIN;",
+            io.StringIO(
+                "".join(
+                    f"{c['name']}\t{c['tier']}\t{c['elo']}\n" for c in data["clubs"]
+                )
+            ),
+        )
+    importer = ImportService(db, elo_service, rollup_service, elo_settings)
+    lines = (json.dumps(m) for m in data["matches"])
+    result = importer.import_matches(lines, "ndjson", batch_size)
+    result["totalSeconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a throwaway database")
+    parser.add_argument("--players", type=int, default=40)
+    parser.add_argument("--clubs", type=int, default=60)
+    parser.add_argument("--matches", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--wipe", action="store_true", help="required: existing data is deleted"
+    )
+    args = parser.parse_args()
+    if not args.wipe:
+        raise SystemExit("refusing to replace the database contents without --wipe")
+
+    from database import Database
+    from elo_service import EloService
+    from elo_settings_service import EloSettingsService
+    from migrations import migrate
+    from rollup_service import RollupService
+
+    db = Database()
+    migrate(db)
+    data = generate(args.players, args.clubs, args.matches, args.seed)
+    result = load(db, data, EloService(db), RollupService(db), EloSettingsService(db))
+    print(json.dumps(result))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
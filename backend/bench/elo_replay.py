@@ -0,0 +1,88 @@
+"""
+Elo replay microbenchmark: reference replay() over raw match rows vs
+MatchLog.replay over the preresolved log. Uses synthetic in-memory data, so no
+database is needed.
+
+    cd backend
+    python -m bench.elo_replay --matches 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from elo_service import INITIAL_ELO, MatchLog, replay
+
+CLUBS = ["Arsenal", "Barcelona", "Bayern", "City", "Liverpool", "Psg", "Real"]
+
+
+def synthetic(n_matches: int, n_players: int, seed: int = 1):
+    rng = random.Random(seed)
+    players = [{"id": i + 1, "name": f"Player {i + 1}"} for i in range(n_players)]
+    clubs = [{"name": c, "elo": rng.randint(400, 700)} for c in CLUBS]
+    start = datetime(2024, 1, 1)
+    matches = []
+    for i in range(n_matches):
+        size = rng.choice((1, 2))
+        picked = rng.sample(players, size * 2)
+        matches.append(
+            {
+                "id": i + 1,
+                "time": start + timedelta(minutes=i),
+                "club_a": rng.choice(CLUBS),
+                "club_b": rng.choice(CLUBS),
+                "team_a": "{" + ",".join(p["name"] for p in picked[:size]) + "}",
+                "team_b": "{" + ",".join(p["name"] for p in picked[size:]) + "}",
+                "score_a": rng.randint(0, 5),
+                "score_b": rng.randint(0, 5),
+            }
+        )
+    return players, matches, clubs
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+
+def run(n_matches: int, n_players: int, k_factor: int):
+    players, matches, clubs = synthetic(n_matches, n_players)
+
+    def reference():
+        ratings = {p["id"]: float(INITIAL_ELO) for p in players}
+        replay(ratings, matches, players, clubs, k_factor)
+        return ratings
+
+    log = MatchLog()
+    _, load_s = timed(lambda: log.load(players, matches))
+
+    def logged():
+        ratings = log.new_ratings()
+        log.replay(ratings, log.club_elo(clubs), k_factor)
+        return ratings
+
+    expected, ref_s = timed(reference)
+    actual, log_s = timed(logged)
+    same = all(actual[pid] == r for pid, r in expected.items())
+
+    print(
+        f"{n_matches:>9} matches  reference {ref_s * 1000:9.1f} ms  "
+        f"log {log_s * 1000:9.1f} ms  ({ref_s / log_s:4.1f}x)  "
+        f"load {load_s * 1000:9.1f} ms  identical={same}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--matches", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--players", type=int, default=40)
+    parser.add_argument("--k", type=int, default=24)
+    args = parser.parse_args()
+    for n in args.matches:
+        run(n, args.players, args.k)
+
+
+if __name__ == "__main__":
+    main()
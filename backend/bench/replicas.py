@@ -0,0 +1,114 @@
+"""
+Read/write splitting check: runs the replica-routed read methods and reports
+which pool served each, then records one match and shows reads staying on the
+primary until the replicas have had time to replay it, and how long that took.
+Needs DB_REPLICAS (comma-separated DSNs); a second local instance works, as a
+streaming replica (pg_basebackup -R) or as a plain copy standing in for one.
+The primary must be writable: the match is deleted again at the end.
+
+    cd backend
+    DB_REPLICAS="host=localhost port=5433 dbname=fifa user=postgres" \\
+        python -m bench.replicas
+"""
+
+import argparse
+import threading
+import time
+from datetime import date
+
+from database import Database
+from elo_service import EloService
+from leaderboard_service import LeaderboardService
+from match_service import MatchService
+from player_service import PlayerService
+from club_service import ClubService
+
+
+def served_by(db: Database, fn) -> str:
+    """'primary' or 'replica N' for the pool whose checkouts `fn` used."""
+    pools = [db] + db.replicas
+    before = [p.stats()["checkouts"] for p in pools]
+    fn()
+    used = [i for i, p in enumerate(pools) if p.stats()["checkouts"] > before[i]]
+    return ", ".join("primary" if i == 0 else f"replica {i}" for i in used)
+
+
+def reads(db: Database) -> dict:
+    lb = LeaderboardService(db)
+    matches = MatchService(db)
+    elo = EloService(db)
+    since = date(2000, 1, 1)
+    return {
+        "leaderboard.players": lambda: lb.get_player_leaderboard(since),
+        "leaderboard.teams": lambda: lb.get_team_leaderboard(since),
+        "leaderboard.duos": lambda: lb.get_duo_leaderboard(since),
+        "matches.page": lambda: matches.get_matches_page(),
+        "matches.export": lambda: list(matches.export_matches()),
+        "players": lambda: PlayerService(db).get_players(),
+        "clubs": lambda: ClubService(db).get_clubs(),
+        "elo.compute_ratings": lambda: elo.compute_ratings(24),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    db = Database()
+    if not db.replicas:
+        raise SystemExit("set DB_REPLICAS to at least one replica DSN")
+    for i, replica in enumerate(db.replicas, 1):
+        print(f"replica {i}: lag {replica.lag(0)} s (max {db.max_lag} s)")
+
+    def routing(label):
+        # each check in a fresh context, like a request that has not written
+        def run():
+            for name, fn in reads(db).items():
+                print(f"  {name:24s} {served_by(db, fn)}")
+
+        print(label)
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+
+    routing("-- before any write")
+
+    players = [p["name"] for p in PlayerService(db).get_players()[:4]]
+    if len(players) < 4:
+        raise SystemExit("needs at least four players")
+    match = MatchService(db).add_match(
+        "Replica",
+        "Check",
+        "{%s,%s}" % tuple(players[:2]),
+        "{%s,%s}" % tuple(players[2:]),
+        1,
+        0,
+    )
+    written = time.monotonic()
+    routing(f"-- within {db.max_lag} s of the write")
+
+    for i, replica in enumerate(db.replicas, 1):
+        while time.monotonic() - written < args.timeout:
+            row = replica.execute(
+                "SELECT 1 FROM matches WHERE id = %s;", (match["id"],), fetch_one=True
+            )
+            if row:
+                print(
+                    f"replica {i} has the match after "
+                    f"{1000 * (time.monotonic() - written):.1f} ms"
+                )
+                break
+            time.sleep(0.005)
+        else:
+            print(f"replica {i} did not replay the match within {args.timeout} s")
+
+    MatchService(db).delete_match(match["id"])
+    time.sleep(db.max_lag)
+    routing("-- after the lag window")
+    print(db.stats())
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
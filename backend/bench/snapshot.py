@@ -0,0 +1,77 @@
+"""
+Analytics snapshot check: exports the match history (match_snapshot.py), then
+times each leaderboard in SQL and from the mapped file for a few windows and
+checks both return the same rows in the same order. Read-only apart from the
+files it writes.
+
+    cd backend
+    python -m bench.snapshot --out /tmp/matches.arrow --runs 20
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from database import Database
+from elo_service import EloService
+from leaderboard_service import LeaderboardService
+from match_snapshot import MatchSnapshot, export
+
+
+def ms(fn, runs: int) -> float:
+    """Median wall time of `fn` in milliseconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append(1000 * (time.perf_counter() - start))
+    return statistics.median(times)
+
+
+def rows(result) -> list:
+    # Decimal vs str win_percentage compare equal through Decimal
+    return [
+        {k: Decimal(v) if k == "win_percentage" else v for k, v in r.items()}
+        for r in result
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", default="matches.arrow")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    db = Database()
+    start = time.perf_counter()
+    print(export(db, args.out), f"{time.perf_counter() - start:.2f} s")
+    snapshot = MatchSnapshot(db, args.out)
+    sql = LeaderboardService(db)
+    fast = LeaderboardService(db, snapshot)
+
+    windows = [date(2000, 1, 1), date.today() - timedelta(days=90), date.today()]
+    for since in windows:
+        for name in ("player", "team", "duo"):
+            method = f"get_{name}_leaderboard"
+            a = getattr(sql, method)
+            b = getattr(fast, method)
+            same = rows(a(since)) == rows(b(since))
+            print(
+                f"{since} {name:7s} same={same}  sql {ms(lambda: a(since), args.runs):7.2f} ms"
+                f"  snapshot {ms(lambda: b(since), args.runs):7.2f} ms"
+            )
+
+    elo, elo_snapshot = EloService(db), EloService(db, snapshot)
+    same = elo.parsed_history() == elo_snapshot.parsed_history()
+    print(
+        f"elo history same={same}"
+        f"  sql {ms(elo.parsed_history, 1):7.2f} ms"
+        f"  snapshot {ms(elo_snapshot.parsed_history, 1):7.2f} ms"
+    )
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Cold-start benchmark: in fresh interpreters, times `import main` and the first
+request (which builds the services and runs the schema-version check), then
+the same with the database unreachable. Read-only against the database in .env.
+
+    cd backend
+    python -m bench.startup --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in the child interpreter; prints one JSON line
+CHILD = """
+import json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(main.app, raise_server_exceptions=False)
+ready = time.perf_counter()
+status = client.get("/clubs").status_code
+first = time.perf_counter()
+client.get("/clubs")
+second = time.perf_counter()
+print(json.dumps({
+    "importMs": 1000 * (imported - started),
+    "firstRequestMs": 1000 * (first - ready),
+    "secondRequestMs": 1000 * (second - first),
+    "status": status,
+}))
+"""
+
+
+def child(env) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def summarize(label, results) -> None:
+    line = f"{label:12s}"
+    for key in ("importMs", "firstRequestMs", "secondRequestMs"):
+        values = [r[key] for r in results]
+        line += f"  {key} p50 {statistics.median(values):8.2f} max {max(values):8.2f}"
+    statuses = sorted({r["status"] for r in results})
+    print(f"{line}  status {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--out", help="write the JSON results here")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    down = {**env, "DB_HOST": "127.0.0.1", "DB_PORT": "1"}
+    report = {}
+    for label, child_env in (("reachable", env), ("unreachable", down)):
+        report[label] = [child(child_env) for _ in range(args.runs)]
+        summarize(label, report[label])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Prepared-statement check: runs the leaderboard statements as plain text and
+through PREPARE / EXECUTE (statements.py) on one connection, and reports the
+client-side latency plus the server's planning and execution time, from
+EXPLAIN (ANALYZE, SUMMARY). Postgres plans the first five EXECUTEs of a
+statement for their values and may then switch to a cached generic plan, so
+each variant is warmed up first. Read-only.
+
+    cd backend
+    python -m bench.statements --runs 50
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+from database import Database, Transaction
+from leaderboard_service import (
+    DUO_LEADERBOARD,
+    DUO_LINES,
+    PARTNER_STATS,
+    PLAYER_LEADERBOARD,
+    PLAYER_LINES,
+    TEAM_LEADERBOARD,
+)
+from statements import registry
+
+EXPLAIN = "EXPLAIN (ANALYZE, SUMMARY, TIMING OFF, FORMAT JSON) "
+WARMUP = 10
+
+
+def cases(db: Database, since: date) -> dict:
+    players = [p["id"] for p in db.execute("SELECT id FROM players ORDER BY id;")]
+    return {
+        "player_leaderboard": (PLAYER_LEADERBOARD, {"start_time": since}),
+        "team_leaderboard": (TEAM_LEADERBOARD, {"start_time": since}),
+        "duo_leaderboard": (DUO_LEADERBOARD, {"start_time": since}),
+        "player_lines": (
+            PLAYER_LINES,
+            {"start_time": since, "player_ids": players[:4]},
+        ),
+        "duo_lines": (
+            DUO_LINES,
+            {"start_time": since, "team_a": players[:2], "team_b": players[2:4]},
+        ),
+        "partner_stats": (
+            PARTNER_STATS,
+            {"start_time": since, "player_id": players[0] if players else 0},
+        ),
+    }
+
+
+def timings(conn, statement, params, prepared: bool, runs: int) -> dict:
+    """Median client ms, server planning ms and execution ms over `runs`."""
+    tx = Transaction(conn, None, registry if prepared else None)
+    for _ in range(WARMUP):
+        tx.execute(statement, params)
+    client, plan, execute = [], [], []
+    sql, args = statement.execute_sql(params) if prepared else (statement, params)
+    with conn.cursor() as cur:
+        for _ in range(runs):
+            started = time.perf_counter()
+            tx.execute(statement, params)
+            client.append(1000 * (time.perf_counter() - started))
+            cur.execute(EXPLAIN + sql, args)
+            summary = next(iter(cur.fetchone().values()))[0]
+            plan.append(summary["Planning Time"])
+            execute.append(summary["Execution Time"])
+    return {
+        "client": statistics.median(client),
+        "plan": statistics.median(plan),
+        "execute": statistics.median(execute),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90, help="leaderboard window")
+    args = parser.parse_args()
+
+    db = Database()
+    since = date.today() - timedelta(days=args.days)
+    print(
+        f"{'statement':20s} {'':9s} {'client ms':>10s} {'plan ms':>9s} {'exec ms':>9s}"
+    )
+    with db.connection() as conn:
+        for name, (statement, params) in cases(db, since).items():
+            text = timings(conn, statement, params, False, args.runs)
+            prepared = timings(conn, statement, params, True, args.runs)
+            for label, t in (("text", text), ("prepared", prepared)):
+                print(
+                    f"{name:20s} {label:9s} {t['client']:10.3f}"
+                    f" {t['plan']:9.3f} {t['execute']:9.3f}"
+                )
+            saved = text["plan"] - prepared["plan"]
+            print(
+                f"{'':20s} {'saved':9s} {text['client'] - prepared['client']:10.3f}"
+                f" {saved:9.3f}"
+            )
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Backend benchmark suite: seeds synthetic data at several scales (bench.data),
+then times the hot service methods and HTTP routes, reporting latency
+percentiles and queries per call. Results are written as JSON so two runs can
+be compared. Every scale WIPES the database configured in .env (DB_*), so
+only run it against a throwaway local Postgres.
+
+    cd backend
+    python -m bench.suite --scales 1000 10000 100000 --out before.json --wipe
+    python -m bench.suite --scales 1000 10000 100000 --out after.json --wipe
+    python -m bench.suite --compare before.json after.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+from datetime import date, datetime, timedelta
+
+from bench.data import generate, load
+from database import Database, Transaction
+from match_service import encode_cursor
+from migrations import migrate
+
+RECENT = date.today() - timedelta(days=90)
+
+
+class QueryCounter:
+    """Counts statements sent through Transaction (used by every db.execute)."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def installed(self):
+        execute, copy, stream = Transaction.execute, Transaction.copy, Database.stream
+        counter = self
+
+        def counted(fn):
+            def wrapper(*args, **kwargs):
+                with counter._lock:
+                    counter.count += 1
+                return fn(*args, **kwargs)
+
+            return wrapper
+
+        Transaction.execute = counted(execute)
+        Transaction.copy = counted(copy)
+        Database.stream = counted(stream)
+        try:
+            yield self
+        finally:
+            Transaction.execute, Transaction.copy, Database.stream = (
+                execute,
+                copy,
+                stream,
+            )
+
+
+def percentile(values, q):
+    values = sorted(values)
+    i = min(len(values) - 1, max(0, round(q * (len(values) - 1))))
+    return values[i]
+
+
+def measure(fn, counter: QueryCounter, repeat: int, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    times, queries = [], []
+    for _ in range(repeat):
+        before = counter.count
+        started = time.perf_counter()
+        fn()
+        times.append(1000 * (time.perf_counter() - started))
+        queries.append(counter.count - before)
+    return {
+        "n": repeat,
+        "meanMs": round(statistics.fmean(times), 3),
+        "p50Ms": round(percentile(times, 0.50), 3),
+        "p90Ms": round(percentile(times, 0.90), 3),
+        "p99Ms": round(percentile(times, 0.99), 3),
+        "maxMs": round(max(times), 3),
+        "queries": round(statistics.fmean(queries), 2),
+    }
+
+
+def cases(app):
+    """name -> zero-argument callable."""
+    from fastapi.testclient import TestClient  # type: ignore
+
+    client = TestClient(app.app)
+    k = app.elo_settings_service.get_k_factor()
+    ids = [p["id"] for p in app.db.execute("SELECT id FROM players ORDER BY id;")]
+    middle = app.db.execute(
+        "SELECT time, id FROM matches ORDER BY time, id OFFSET "
+        "(SELECT COUNT(*) / 2 FROM matches) LIMIT 1;",
+        fetch_one=True,
+    )
+    deep_cursor = encode_cursor(middle) if middle else None
+
+    def http(path, **params):
+        def call():
+            # measure the computed response, not a result-cache hit
+            app.result_cache.bump()
+            response = client.get(path, params=params)
+            response.raise_for_status()
+
+        return call
+
+    def elo_cold():
+        app.elo_service.invalidate()
+        app.elo_service.get_ratings(k)
+
+    lb = app.leaderboard_service
+    return {
+        "service.leaderboard.players.all": lambda: lb.get_player_leaderboard(
+            date(2000, 1, 1)
+        ),
+        "service.leaderboard.players.recent": lambda: lb.get_player_leaderboard(RECENT),
+        "service.leaderboard.teams.all": lambda: lb.get_team_leaderboard(
+            date(2000, 1, 1)
+        ),
+        "service.leaderboard.duos.all": lambda: lb.get_duo_leaderboard(
+            date(2000, 1, 1)
+        ),
+        "service.stats.partners": lambda: lb.get_partner_stats(
+            ids[0], date(2000, 1, 1)
+        ),
+        "service.elo.compute_ratings": lambda: app.elo_service.compute_ratings(k),
+        "service.elo.get_ratings.warm": lambda: app.elo_service.get_ratings(k),
+        "service.elo.get_ratings.cold": elo_cold,
+        "service.matches.page.first": lambda: app.match_service.get_matches_page(),
+        "service.matches.page.deep": lambda: app.match_service.get_matches_page(
+            cursor=deep_cursor
+        ),
+        "service.matchmaking.teams": lambda: app.matchmaking_service.balanced_teams(
+            ids[:12], "2v2"
+        ),
+        "http.leaderboard.all": http("/leaderboard/all", start_time="2000-01-01"),
+        "http.elo": http("/elo"),
+        "http.matches": http("/matches"),
+        "http.matches.page": http("/matches/page"),
+        "http.bootstrap": http("/bootstrap"),
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _application():
+    """main's app and its services, on a migrated database."""
+    import dependencies as deps
+    import main
+
+    db = Database()
+    migrate(db)
+    db.close()
+    return SimpleNamespace(
+        app=main.app,
+        db=deps.get_db(),
+        result_cache=deps.result_cache,
+        elo_service=deps.get_elo_service(),
+        elo_settings_service=deps.get_elo_settings_service(),
+        rollup_service=deps.get_rollup_service(),
+        leaderboard_service=deps.get_leaderboard_service(),
+        match_service=deps.get_match_service(),
+        matchmaking_service=deps.get_matchmaking_service(),
+    )
+
+
+def run(scales, players, clubs, repeat, seed, only=None) -> dict:
+    app = _application()
+
+    counter = QueryCounter()
+    report = {
+        "meta": {
+            "startedAt": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "postgres": app.db.execute("SHOW server_version;", fetch_one=True)[
+                "server_version"
+            ],
+            "players": players,
+            "clubs": clubs,
+            "seed": seed,
+            "repeat": repeat,
+        },
+        "scales": {},
+    }
+    for n_matches in scales:
+        data = generate(players, clubs, n_matches, seed)
+        seeded = load(
+            app.db,
+            data,
+            app.elo_service,
+            app.rollup_service,
+            app.elo_settings_service,
+        )
+        app.matchmaking_service.club_index.invalidate()
+        app.db.execute("ANALYZE;", commit=True)
+        print(f"-- {n_matches} matches (seeded in {seeded['totalSeconds']}s)")
+
+        results = {"seed": seeded}
+        with counter.installed():
+            for name, fn in cases(app).items():
+                if only and not any(o in name for o in only):
+                    continue
+                results[name] = stats = measure(fn, counter, repeat)
+                print(
+                    f"{name:40s} p50 {stats['p50Ms']:9.2f} ms  "
+                    f"p90 {stats['p90Ms']:9.2f} ms  p99 {stats['p99Ms']:9.2f} ms  "
+                    f"queries {stats['queries']:g}"
+                )
+        report["scales"][str(n_matches)] = results
+    return report
+
+
+def compare(before_path, after_path) -> None:
+    """Prints p50 and query-count changes per scale and case."""
+    with open(before_path) as f:
+        before = json.load(f)["scales"]
+    with open(after_path) as f:
+        after = json.load(f)["scales"]
+    for scale in after:
+        if scale not in before:
+            continue
+        print(f"-- {scale} matches")
+        for name, new in after[scale].items():
+            old = before[scale].get(name)
+            if name == "seed" or not old:
+                continue
+            ratio = new["p50Ms"] / old["p50Ms"] if old["p50Ms"] else float("inf")
+            print(
+                f"{name:40s} p50 {old['p50Ms']:9.2f} -> {new['p50Ms']:9.2f} ms "
+                f"({ratio:5.2f}x)  queries {old['queries']:g} -> {new['queries']:g}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--players", type=int, default=40)
+    parser.add_argument("--clubs", type=int, default=60)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="+", help="substrings of case names to run")
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    parser.add_argument(
+        "--wipe", action="store_true", help="required: each scale replaces the data"
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    if not args.wipe:
+        raise SystemExit("refusing to replace the database contents without --wipe")
+    report = run(
+        args.scales, args.players, args.clubs, args.repeat, args.seed, args.only
+    )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# bootstrap_service.py
+# Everything the home page needs on load, read from one snapshot.
+from club_service import GET_CLUBS
+from elo_service import INITIAL_ELO
+from match_service import page_query, page_result
+from statements import statement
+
+RECENT_MATCHES = 100
+MAX_RECENT_MATCHES = 1000
+
+PLAYERS_WITH_ELO = statement(
+    "players_with_elo",
+    """
+    SELECT p.id, p.name, COALESCE(r.elo, %s) AS elo
+    FROM players p
+    LEFT JOIN elo_ratings r ON r.player_id = p.id
+    ORDER BY p.id ASC;
+    """,
+)
+
+
+class BootstrapService:
+    """
+    Players with their Elo, clubs, the K-factor and the most recent matches.
+    The Elo state is brought up to date first; the reads then share one
+    REPEATABLE READ transaction, so they all see the same database state.
+    """
+
+    def __init__(self, db, elo_service, elo_settings):
+        self.db = db
+        self.elo_service = elo_service
+        self.elo_settings = elo_settings
+
+    def snapshot(self, recent: int = RECENT_MATCHES) -> dict:
+        k_factor = self.elo_settings.get_k_factor()
+        self.elo_service.ensure_current(k_factor)
+
+        with self.db.transaction(read_only=True) as tx:
+            tx.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;", commit=True)
+            players = tx.execute(PLAYERS_WITH_ELO, (INITIAL_ELO,))
+            clubs = tx.execute(GET_CLUBS)
+            query, params = page_query(recent)
+            matches = page_result(tx.execute(query, params), recent)
+
+        for p in players:
+            p["elo"] = int(round(p["elo"]))
+        return {
+            "kFactor": k_factor,
+            "players": players,
+            "clubs": clubs,
+            "matches": matches["items"],
+            "nextCursor": matches["nextCursor"],
+        }
@@ -1,8 +1,17 @@
+from statements import statement
+
+GET_CLUBS = statement("get_clubs", "SELECT * FROM clubs ORDER BY tier, name;")
+SET_CLUB_ELO = statement(
+    "set_club_elo", "UPDATE clubs SET elo = %s WHERE id = %s RETURNING *;"
+)
+
+
 class ClubService:
     def __init__(self, db):
         self.db = db
 
     def get_clubs(self):
-        return self.db.execute(
-            "SELECT * FROM clubs ORDER BY tier, name;", fetch_one=False
-        )
+        return self.db.replica().execute(GET_CLUBS, fetch_one=False)
+
+    def set_elo(self, club_id, elo):
+        return self.db.execute(SET_CLUB_ELO, (elo, club_id), fetch_one=True)
@@ -1,75 +1,478 @@
 import psycopg2  # type: ignore
+import contextvars
+import itertools
 import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from psycopg2.pool import ThreadedConnectionPool  # type: ignore
 from psycopg2.extras import RealDictCursor  # type: ignore
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE  # type: ignore
 from dotenv import load_dotenv
 
+from query_stats import QueryStats
+from statements import STALE_STATEMENT_ERRORS, Statement, registry
+
 load_dotenv()
 
+# Errors that mean the connection itself is unusable (server restart, dropped socket)
+BROKEN_CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+# Seconds behind the primary, measured on the replica itself. A standalone
+# server (not in recovery, e.g. a second local instance standing in for a
+# replica) counts as caught up.
+REPLICA_LAG = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE EXTRACT(EPOCH FROM NOW() - pg_last_xact_replay_timestamp())
+END AS lag;
+"""
+
+# Set for the rest of a request (or thread) once it writes, and inside
+# Database.primary(): Database.replica() then returns the primary
+_on_primary = contextvars.ContextVar("db_on_primary", default=False)
+
+
+class PoolTimeoutError(Exception):
+    """No pooled connection became free within the checkout timeout."""
+
+
+def connection_params():
+    """Connection settings from the environment, shared by the sync and async pools."""
+    env = os.getenv("ENV", "local")
+
+    host = os.getenv("DB_HOST")
+    if env == "cloud":
+        # Use Unix socket for Cloud SQL
+        host = f"/cloudsql/{os.getenv('DB_INSTANCE')}"
+
+    return {
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASS"),
+        "host": host,
+        "port": os.getenv("DB_PORT", 5432),
+    }
+
 
 class Database:
-    def __init__(self):
-        env = os.getenv("ENV", "local")
-
-        host = os.getenv("DB_HOST")
-        if env == "cloud":
-            # Use Unix socket for Cloud SQL
-            host = f"/cloudsql/{os.getenv('DB_INSTANCE')}"
-
-        self.connection = psycopg2.connect(
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASS"),
-            host=host,
-            port=os.getenv("DB_PORT", 5432),
-            cursor_factory=RealDictCursor,
-        )
-        self.connection.autocommit = True
-        self.create_tables()
+    """
+    Thread-safe psycopg2 connection pool.
+    Every execute() borrows a connection for the duration of one statement,
+    transaction() for the duration of the block.
 
-    def create_tables(self):
-        with self.connection.cursor() as cur:
-            # Players table
-            cur.execute(
-                """
-            CREATE TABLE IF NOT EXISTS players (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) UNIQUE NOT NULL
-            );
-            """
-            )
-            # Clubs table
-            cur.execute(
-                """
-            CREATE TABLE IF NOT EXISTS clubs (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) UNIQUE NOT NULL,
-                tier INT NOT NULL
-            );
-            """
+    Pool sizing comes from DB_POOL_MIN / DB_POOL_MAX and DB_POOL_TIMEOUT (seconds
+    a caller waits for a free connection); see stats() for wait time and usage.
+    Connections idle for more than DB_POOL_HEALTHCHECK seconds are pinged
+    before reuse and replaced if the ping fails.
+
+    The schema comes from migrations.py; the pool is opened on first use.
+    Every statement is timed into `queries` (a QueryStats, see query_stats.py).
+
+    The primary is `dsn` (DB_DSN), or the DB_* settings when neither is given.
+    `replicas` (DB_REPLICAS, comma-separated DSNs) get a read-only pool each;
+    read-only service methods run on replica() rather than on this object.
+
+    Statements (statements.py) are prepared once per connection and then
+    EXECUTEd; DB_PREPARE=0 sends their text instead, as for any other query
+    (needed behind a transaction-pooling proxy, where session state is lost).
+    """
+
+    def __init__(
+        self,
+        minconn=None,
+        maxconn=None,
+        timeout=None,
+        queries=None,
+        dsn=None,
+        replicas=None,
+    ):
+        self.minconn = int(minconn or os.getenv("DB_POOL_MIN", 1))
+        self.maxconn = int(maxconn or os.getenv("DB_POOL_MAX", 10))
+        self.timeout = float(timeout or os.getenv("DB_POOL_TIMEOUT", 5))
+        self.healthcheck_after = float(os.getenv("DB_POOL_HEALTHCHECK", 30))
+        self.queries = queries or QueryStats()
+        self.statements = registry if os.getenv("DB_PREPARE", "1") != "0" else None
+        self.dsn = dsn or os.getenv("DB_DSN")
+        self._connect_options = {}
+
+        if replicas is None:
+            replicas = [d for d in os.getenv("DB_REPLICAS", "").split(",") if d.strip()]
+        self.replicas = [self._replica(d.strip()) for d in replicas]
+        # a replica further behind than this is skipped, and reads stay on the
+        # primary this long after a write from this process
+        self.max_lag = float(os.getenv("DB_REPLICA_MAX_LAG", 5))
+        self.lag_check_every = float(os.getenv("DB_REPLICA_LAG_CHECK", 1))
+        self._next_replica = itertools.count()
+        self._last_write = float("-inf")
+        self._lag = None
+        self._lag_checked = float("-inf")
+        self._lag_lock = threading.Lock()
+        self._replica_reads = 0
+
+        # Opened on first use, so constructing a Database never connects
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises instead of waiting when exhausted;
+        # the semaphore makes callers queue for up to `timeout` seconds.
+        self._slots = threading.BoundedSemaphore(self.maxconn)
+        self._stats_lock = threading.Lock()
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._last_used = {}  # id(conn) -> monotonic time it was returned
+
+    def connect_params(self) -> dict:
+        """psycopg2.connect() arguments for this database, for connections
+        kept outside the pool (e.g. LISTEN)."""
+        return {"dsn": self.dsn} if self.dsn else connection_params()
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadedConnectionPool(
+                        self.minconn,
+                        self.maxconn,
+                        cursor_factory=RealDictCursor,
+                        **self.connect_params(),
+                        **self._connect_options,
+                    )
+        return self._pool
+
+    @contextmanager
+    def connection(self):
+        """Borrows a healthy autocommit connection from the pool."""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._stats_lock:
+                self._timeouts += 1
+            raise PoolTimeoutError(
+                f"no database connection available within {self.timeout}s"
             )
-            # Matches table
-            cur.execute(
-                """
-            CREATE TABLE IF NOT EXISTS matches (
-                id SERIAL PRIMARY KEY,
-                time TIMESTAMP DEFAULT NOW(),
-                club_a VARCHAR(100),
-                club_b VARCHAR(100),
-                team_a TEXT,
-                team_b TEXT,
-                score_a INT,
-                score_b INT
-            );
-            """
+        waited = time.perf_counter() - started
+
+        conn = None
+        try:
+            conn = self._checkout()
+            with self._stats_lock:
+                self._in_use += 1
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+            try:
+                yield conn
+            except BROKEN_CONNECTION_ERRORS:
+                self.pool.putconn(conn, close=True)
+                conn = None
+                raise
+            finally:
+                with self._stats_lock:
+                    self._in_use -= 1
+        finally:
+            if conn is not None:
+                self._last_used[id(conn)] = time.monotonic()
+                self.pool.putconn(conn, close=bool(conn.closed))
+            self._slots.release()
+
+    def _checkout(self):
+        conn = self.pool.getconn()
+        if not self._healthy(conn):
+            # Dropped while idle: discard and open a fresh one
+            self._last_used.pop(id(conn), None)
+            self.pool.putconn(conn, close=True)
+            conn = self.pool.getconn()
+            with self._stats_lock:
+                self._reconnects += 1
+        conn.autocommit = True
+        return conn
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        idle_since = self._last_used.get(id(conn))
+        if idle_since is None or time.monotonic() - idle_since < self.healthcheck_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            return True
+        except BROKEN_CONNECTION_ERRORS:
+            return False
+
+    # ----------- Replicas -----------
+    def _replica(self, dsn: str) -> "Database":
+        replica = Database(
+            self.minconn, self.maxconn, self.timeout, self.queries, dsn, replicas=[]
+        )
+        # a write sent to a replica by mistake fails instead of diverging
+        replica._connect_options = {
+            "options": "-c default_transaction_read_only=on",
+            "connect_timeout": 2,
+        }
+        return replica
+
+    def replica(self) -> "Database":
+        """
+        Where a read-only query should run: a replica that is at most max_lag
+        behind, in turn, or this primary when there is none, when this request
+        has written (read-your-writes), inside primary(), or within max_lag
+        seconds of any write from this process.
+        """
+        if (
+            not self.replicas
+            or _on_primary.get()
+            or time.monotonic() - self._last_write < self.max_lag
+        ):
+            return self
+        start = next(self._next_replica)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            lag = replica.lag(self.lag_check_every)
+            if lag is not None and lag <= self.max_lag:
+                with self._stats_lock:
+                    self._replica_reads += 1
+                return replica
+        return self
+
+    @contextmanager
+    def primary(self):
+        """Routes replica() reads in this block to the primary, for reads that
+        must see a write that just happened (e.g. derived-state jobs)."""
+        token = _on_primary.set(True)
+        try:
+            yield self
+        finally:
+            _on_primary.reset(token)
+
+    def lag(self, max_age: float = 1.0):
+        """This replica's lag in seconds, re-measured when older than
+        `max_age`; None while it cannot be measured (e.g. unreachable)."""
+        if time.monotonic() - self._lag_checked < max_age:
+            return self._lag
+        if not self._lag_lock.acquire(blocking=False):
+            return self._lag  # another thread is measuring it
+        try:
+            try:
+                row = self.execute(REPLICA_LAG, fetch_one=True)
+                self._lag = None if row["lag"] is None else float(row["lag"])
+            except (psycopg2.Error, PoolTimeoutError) as exc:
+                print(f"[DB] replica unavailable: {exc}")
+                self._lag = None
+            self._lag_checked = time.monotonic()
+            return self._lag
+        finally:
+            self._lag_lock.release()
+
+    def _wrote(self):
+        self._last_write = time.monotonic()
+        _on_primary.set(True)
+
+    def stats(self):
+        """Pool utilization and checkout wait times, for sizing DB_POOL_MAX."""
+        stats = self._pool_stats()
+        if self.replicas:
+            stats["replicaReads"] = self._replica_reads
+            stats["replicas"] = [
+                {
+                    **r._pool_stats(),
+                    "lagSeconds": r._lag,
+                    "host": r._host(),
+                }
+                for r in self.replicas
+            ]
+        return stats
+
+    def _host(self):
+        return psycopg2.extensions.parse_dsn(self.dsn).get("host") if self.dsn else None
+
+    def _pool_stats(self):
+        with self._stats_lock:
+            return {
+                "minSize": self.minconn,
+                "maxSize": self.maxconn,
+                "inUse": self._in_use,
+                "utilization": round(self._in_use / self.maxconn, 3),
+                "checkouts": self._checkouts,
+                "waitAvgMs": (
+                    round(1000 * self._wait_total / self._checkouts, 3)
+                    if self._checkouts
+                    else 0.0
+                ),
+                "waitMaxMs": round(1000 * self._wait_max, 3),
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+            }
+
+    def close(self):
+        for replica in self.replicas:
+            replica.close()
+        if self._pool is not None:
+            self._pool.closeall()
+
+    def execute(self, query, params=None, fetch_one=False, commit=False):
+        if commit:
+            self._wrote()
+        try:
+            return self._execute(query, params, fetch_one, commit)
+        except BROKEN_CONNECTION_ERRORS:
+            if commit:
+                # The write may or may not have reached the server; don't replay it
+                raise
+            with self._stats_lock:
+                self._reconnects += 1
+            return self._execute(query, params, fetch_one, commit)
+
+    def _execute(self, query, params, fetch_one, commit):
+        with self.connection() as conn:
+            return Transaction(conn, self.queries, self.statements).execute(
+                query, params, fetch_one, commit
             )
 
+    def stream(self, query, params=None, itersize=1000):
+        """
+        Yields rows from a server-side (named) cursor, fetching `itersize` rows
+        per round trip, so large results never sit in memory at once. The
+        connection stays borrowed until the generator is exhausted or closed.
+        """
+        with self.connection() as conn:
+            conn.autocommit = False
+            try:
+                with conn.cursor(
+                    name=f"stream_{uuid.uuid4().hex}"
+                ) as cur, self.queries.timed(query) as timing:
+                    cur.itersize = itersize
+                    cur.execute(query, params)
+                    timing["rows"] = 0
+                    for row in cur:
+                        timing["rows"] += 1
+                        yield row
+            finally:
+                if not conn.closed:
+                    conn.rollback()
+                    conn.autocommit = True
+
+    @contextmanager
+    def transaction(self, read_only: bool = False):
+        """
+        Groups several execute() calls into one atomic transaction.
+        Yields a Transaction with the same execute() signature as Database.
+        A `read_only` transaction is started READ ONLY and, not being a write,
+        leaves later reads free to go to a replica.
+        """
+        if not read_only:
+            self._wrote()  # reads in the block see its writes
+        with self.connection() as conn:
+            conn.autocommit = False
+            try:
+                tx = Transaction(conn, self.queries, self.statements)
+                if read_only:
+                    tx.execute("SET TRANSACTION READ ONLY;", commit=True)
+                yield tx
+                conn.commit()
+                if not read_only:
+                    self._wrote()  # the lag window starts at commit
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if not conn.closed:
+                    conn.autocommit = True
+
+
+class Transaction:
+    """
+    Database-like handle bound to one borrowed connection.
+    Inside Database.transaction(), commit=True statements are only committed
+    when the block exits. With a statement registry, Statement queries run
+    through PREPARE / EXECUTE (see _run_statement).
+    """
+
+    def __init__(self, connection, queries=None, statements=None):
+        self.connection = connection
+        self.queries = queries
+        self.statements = statements
+
     def execute(self, query, params=None, fetch_one=False, commit=False):
         with self.connection.cursor() as cur:
-            cur.execute(query, params)
+            if isinstance(query, Statement) and self.statements is not None:
+                run, args = self._run_statement, (cur, query, params)
+            else:
+                run, args = cur.execute, (query, params)
+            if self.queries is None:
+                run(*args)
+            else:
+                with self.queries.timed(query, self._explainer(query, params)) as t:
+                    run(*args)
+                    t["rows"] = cur.rowcount
             if commit:
-                self.connection.commit()
                 return None
             if fetch_one:
                 return cur.fetchone()
             else:
                 return cur.fetchall()
+
+    def _run_statement(self, cur, statement, params):
+        """
+        EXECUTEs `statement`, PREPAREd first if this connection has not yet;
+        statements Postgres will not prepare run as text.
+        """
+        registry, conn = self.statements, self.connection
+        # outside a transaction a lost statement can be retried as text, and
+        # an EXPLAIN sample cannot disturb the caller's work
+        idle = (
+            conn.autocommit and conn.get_transaction_status() == TRANSACTION_STATUS_IDLE
+        )
+        prepared = registry.is_prepared(conn, statement) or (
+            registry.can_prepare(statement) and registry.prepare(cur, statement)
+        )
+        sql, args = statement.execute_sql(params) if prepared else (statement, params)
+        started = time.perf_counter()
+        try:
+            cur.execute(sql, args)
+        except STALE_STATEMENT_ERRORS:
+            if not (prepared and idle):
+                registry.forget(conn, statement)
+                raise
+            # the server lost the statement or its plan no longer fits: run
+            # the text now, prepare again next time
+            registry.deallocate(cur, statement)
+            prepared, sql, args = False, statement, params
+            cur.execute(sql, args)
+        registry.record(statement, time.perf_counter() - started, prepared)
+        if idle and registry.wants_sample(statement):
+            with conn.cursor() as scur:
+                registry.sample(scur, statement, sql, args)
+
+    def copy(self, query, file):
+        """Runs a COPY ... FROM STDIN / TO STDOUT statement against `file`."""
+        with self.connection.cursor() as cur:
+            if self.queries is None:
+                cur.copy_expert(query, file)
+            else:
+                with self.queries.timed(query) as t:
+                    cur.copy_expert(query, file)
+                    t["rows"] = cur.rowcount
+            return cur.rowcount
+
+    def _explainer(self, query, params):
+        """EXPLAIN runner for slow statements; only outside open transactions,
+        where a failing EXPLAIN cannot abort the caller's work."""
+        conn = self.connection
+
+        def explain(prefix):
+            if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                raise RuntimeError("inside a transaction")
+            with conn.cursor() as cur:
+                cur.execute(prefix + query, params)
+                return cur.fetchall()
+
+        return explain
@@ -0,0 +1,273 @@
+# dependencies.py
+# Service singletons for route handlers, injected with Depends(get_...).
+# Nothing is built (and no connection is opened) until a request needs it, so
+# importing main.py is cheap and survives a briefly unreachable database.
+import asyncio
+import os
+import threading
+import time
+from functools import wraps
+
+import psycopg2  # type: ignore
+
+from bootstrap_service import BootstrapService
+from club_service import ClubService
+from database import Database
+from elo_service import EloService
+from elo_settings_service import EloSettingsService
+from import_service import ImportService
+from job_queue import JobQueue
+from leaderboard_service import LeaderboardService
+from live_updates import LiveUpdates
+from match_snapshot import MatchSnapshot
+from match_service import MatchService
+from matchmaking_service import MatchmakingService
+from migrations import check_schema, migrate
+from player_service import PlayerService
+from query_stats import QueryStats
+from result_cache import CHANNEL as result_cache_channel, ResultCache
+from rollup_service import RollupService
+
+# Plain in-process objects, safe to create at import
+query_stats = QueryStats()
+result_cache = ResultCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", 256)),
+    notify=lambda epoch: notify_cache_bump(epoch),
+)
+
+# Background job workers per process; with 0, jobs run on the request that
+# enqueued them, after its write commits
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+# Cached responses recomputed after each Elo job, among the cheap kinds below
+CACHE_WARM_ENTRIES = int(os.getenv("CACHE_WARM_ENTRIES", 16))
+# What-if replays (/elo?k=, /elo/batch) and per-player histories are left to
+# their next reader
+WARM_KINDS = {
+    "bootstrap",
+    "leaderboard/players",
+    "leaderboard/teams",
+    "leaderboard/duos",
+    "leaderboard/all",
+}
+# Columnar match-history file for in-process analytics (match_snapshot.py)
+ANALYTICS_SNAPSHOT = os.getenv("ANALYTICS_SNAPSHOT")
+
+_lock = threading.RLock()
+
+
+def singleton(factory):
+    """Builds the value on the first call, once even under concurrent requests.
+    A factory that raises is retried on the next call."""
+    instance = []
+
+    @wraps(factory)
+    def get():
+        if not instance:
+            with _lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    get.peek = lambda: instance[0] if instance else None
+    return get
+
+
+@singleton
+def get_db() -> Database:
+    """The pool, after one schema-version query (or migrating, with
+    DB_AUTO_MIGRATE=1)."""
+    db = Database(queries=query_stats)
+    try:
+        if os.getenv("DB_AUTO_MIGRATE") == "1":
+            migrate(db, RollupService(db))
+        else:
+            check_schema(db)
+    except Exception:
+        db.close()
+        raise
+    return db
+
+
+@singleton
+def get_player_service() -> PlayerService:
+    return PlayerService(get_db())
+
+
+@singleton
+def get_club_service() -> ClubService:
+    return ClubService(get_db())
+
+
+@singleton
+def get_match_snapshot():
+    """The MatchSnapshot for ANALYTICS_SNAPSHOT, or None when it is unset."""
+    if not ANALYTICS_SNAPSHOT:
+        return None
+    return MatchSnapshot(get_db(), ANALYTICS_SNAPSHOT, auto_refresh=True)
+
+
+@singleton
+def get_leaderboard_service() -> LeaderboardService:
+    return LeaderboardService(get_db(), get_match_snapshot())
+
+
+@singleton
+def get_elo_settings_service() -> EloSettingsService:
+    return EloSettingsService(get_db())
+
+
+@singleton
+def get_elo_service() -> EloService:
+    return EloService(get_db(), get_match_snapshot())
+
+
+@singleton
+def get_rollup_service() -> RollupService:
+    return RollupService(get_db())
+
+
+@singleton
+def get_live_updates() -> LiveUpdates:
+    return LiveUpdates(
+        get_db(),
+        get_leaderboard_service(),
+        get_elo_service(),
+        get_elo_settings_service(),
+    )
+
+
+def notify_cache_bump(epoch: str) -> None:
+    """Tells the other processes to drop their cached responses (see
+    ResultCache.listen); delivered when this statement commits."""
+    get_db().execute(
+        "SELECT pg_notify(%s, %s);", (result_cache_channel, epoch), commit=True
+    )
+
+
+def start_cache_listener() -> None:
+    result_cache.listen(lambda: psycopg2.connect(**get_db().connect_params()))
+
+
+def run_elo_job(items) -> None:
+    """
+    The "elo" job: applies the queued match writes to the Elo state, then
+    refreshes what was derived from the old ratings: cached responses (in every
+    process) and live subscribers, on the primary, which has the writes. The
+    cheap cached responses are then recomputed with the usual read routing.
+    """
+    with get_db().primary():
+        get_elo_service().apply_changes(items)
+        result_cache.bump()
+        live_updates = get_live_updates()
+        for item in items:
+            live_updates.publish_match(item["action"], item["match"])
+    result_cache.warm(CACHE_WARM_ENTRIES, warmable)
+    refresh_snapshot()
+
+
+def warmable(key) -> bool:
+    """Cache keys worth recomputing after every Elo job: WARM_KINDS and /elo
+    at the stored K."""
+    return key[0] in WARM_KINDS or key == ("elo", None, None)
+
+
+def elo_job_failed(items) -> None:
+    """
+    The "elo" job gave up, so its matches never reached the Elo state: mark the
+    state stale so the next read rebuilds it, and drop what was derived from it.
+    """
+    get_elo_service().invalidate()
+    result_cache.bump()
+    get_live_updates().publish_reset()
+
+
+def refresh_snapshot() -> None:
+    """Starts rewriting this host's analytics snapshot, if there is one. Other
+    hosts rewrite theirs when their next fresh() finds it behind."""
+    snapshot = get_match_snapshot()
+    if snapshot:
+        snapshot.refresh_in_background()
+
+
+@singleton
+def get_job_queue() -> JobQueue:
+    jobs = JobQueue(get_db(), workers=JOB_WORKERS)
+    jobs.register("elo", run_elo_job, on_failure=elo_job_failed)
+    return jobs
+
+
+def start_job_workers(retry_seconds: float = 5.0) -> None:
+    """Starts the job workers once the database is reachable, retrying until
+    it is; run from a background thread at startup."""
+    while True:
+        try:
+            get_job_queue().start()
+            # catch up with writes made while this process was down
+            refresh_snapshot()
+            return
+        except Exception as exc:
+            print(f"[JOBS] workers not started, retrying: {exc}")
+            time.sleep(retry_seconds)
+
+
+@singleton
+def get_match_service() -> MatchService:
+    return MatchService(
+        get_db(),
+        elo_service=get_elo_service(),
+        rollup_service=get_rollup_service(),
+        jobs=get_job_queue(),
+    )
+
+
+@singleton
+def get_import_service() -> ImportService:
+    return ImportService(
+        get_db(), get_elo_service(), get_rollup_service(), get_elo_settings_service()
+    )
+
+
+@singleton
+def get_matchmaking_service() -> MatchmakingService:
+    return MatchmakingService(
+        get_db(),
+        get_elo_service(),
+        get_elo_settings_service(),
+        cache_version=lambda: result_cache.version,
+    )
+
+
+@singleton
+def get_bootstrap_service() -> BootstrapService:
+    return BootstrapService(get_db(), get_elo_service(), get_elo_settings_service())
+
+
+# ----------- DB_BACKEND=async -----------
+_adb = None
+_adb_lock = asyncio.Lock()
+
+
+async def get_adb():
+    """The psycopg 3 pool, opened on first use (after the sync schema check)."""
+    global _adb
+    if _adb is None:
+        async with _adb_lock:
+            if _adb is None:
+                from async_database import AsyncDatabase
+
+                await asyncio.to_thread(get_db)
+                adb = AsyncDatabase(queries=query_stats)
+                await adb.open()
+                _adb = adb
+    return _adb
+
+
+async def close_adb():
+    global _adb
+    if _adb is not None:
+        await _adb.close()
+        _adb = None
+
+
+def peek_adb():
+    return _adb
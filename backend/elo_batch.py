@@ -0,0 +1,153 @@
+# elo_batch.py
+# What-if Elo over many K-factors (/elo/batch) or rating configurations
+# (elo_sweep) in a single pass over the match history.
+from typing import Dict, List, Optional
+
+import numpy as np  # type: ignore
+
+MAX_BATCH_K = 200  # upper bound on K values per request
+
+# Defaults mirror elo_service.m_upset_bonus
+DEFAULT_BONUS = {"M_max": 3.0, "power": 1.5, "upset_scale": 0.5}
+
+
+def m_upset_bonus_vec(
+    winner_elo: np.ndarray,
+    loser_elo: np.ndarray,
+    margin: int,
+    M_max: float,
+    power: float,
+    upset_scale: float,
+) -> np.ndarray:
+    """elo_service.m_upset_bonus over an array of rating pairs (one per K)."""
+    abs_margin = abs(margin)
+    margin_factor = 1.0 + (M_max - 1.0) * ((abs_margin / 15.0) ** power)
+    gap = loser_elo - winner_elo
+    upset_bonus = np.where(
+        gap > 0, 1.0 + upset_scale * (gap / 400.0) * (abs_margin / 15.0), 1.0
+    )
+    return margin_factor * upset_bonus
+
+
+# MatchLog.parsed rows packed into flat columns (see pack)
+HISTORY_COLUMNS = (
+    ("a_members", np.int32),
+    ("a_offsets", np.int64),
+    ("b_members", np.int32),
+    ("b_offsets", np.int64),
+    ("club_a", np.float64),
+    ("club_b", np.float64),
+    ("score_a", np.int32),
+    ("score_b", np.int32),
+)
+
+
+def pack(parsed: list) -> Dict[str, np.ndarray]:
+    """MatchLog.parsed rows as flat arrays; team j is members[offsets[j]:offsets[j + 1]]."""
+    columns = {}
+    for side, pos in (("a", 0), ("b", 1)):
+        teams = [row[pos] for row in parsed]
+        columns[f"{side}_members"] = [p for team in teams for p in team]
+        columns[f"{side}_offsets"] = np.cumsum([0] + [len(t) for t in teams])
+    for i, name in enumerate(("club_a", "club_b", "score_a", "score_b"), start=2):
+        columns[name] = [row[i] for row in parsed]
+    return {
+        name: np.asarray(columns[name], dtype=dtype) for name, dtype in HISTORY_COLUMNS
+    }
+
+
+def batch_replay(
+    history: Dict[str, np.ndarray],
+    params: Dict[str, np.ndarray],
+    ratings: np.ndarray,
+    played: Optional[np.ndarray] = None,
+    start: int = 0,
+    sample=None,
+):
+    """
+    The apply_match arithmetic for many rows at once over a packed history.
+    `ratings` is (rows, players) and is updated in place; `params` holds one
+    array of len(rows) per parameter (k, k_provisional, provisional_matches,
+    club_weight and the DEFAULT_BONUS keys), so every row can be a different
+    K (/elo/batch), configuration (sweeps) or random season (simulations).
+    `played` counts each player's rated matches, for the provisional K.
+
+    Recorded scores are used unless `sample(expected_a)` is given, which
+    returns a goal difference per row. Returns (log_loss, brier) per row,
+    scored on the pre-match expected score of team A.
+    """
+    rows = ratings.shape[0]
+    if played is None:
+        played = np.zeros(ratings.shape[1], dtype=np.int64)
+    k, k_prov, n_prov = (
+        params["k"],
+        params["k_provisional"],
+        params["provisional_matches"],
+    )
+    weight = params["club_weight"]
+    bonus = {name: params[name] for name in DEFAULT_BONUS}
+    a_members, a_offsets = history["a_members"], history["a_offsets"]
+    b_members, b_offsets = history["b_members"], history["b_offsets"]
+    log_loss = np.zeros(rows)
+    brier = np.zeros(rows)
+    eps = 1e-12
+
+    for j in range(start, len(history["club_a"])):
+        a = a_members[a_offsets[j] : a_offsets[j + 1]]
+        b = b_members[b_offsets[j] : b_offsets[j + 1]]
+        avg_a = ratings[:, a].mean(axis=1) + history["club_a"][j] * weight
+        avg_b = ratings[:, b].mean(axis=1) + history["club_b"][j] * weight
+        exp_a = 1.0 / (1.0 + 10 ** ((avg_b - avg_a) / 400.0))
+
+        if sample is None:
+            diff = int(history["score_a"][j]) - int(history["score_b"][j])
+        else:
+            diff = sample(exp_a)
+        s_a = np.where(diff > 0, 1.0, np.where(diff < 0, 0.0, 0.5))
+        # a zero margin gives M = 1, the draw case
+        M = m_upset_bonus_vec(
+            np.where(diff >= 0, avg_a, avg_b),
+            np.where(diff >= 0, avg_b, avg_a),
+            diff,
+            **bonus,
+        )
+
+        p = np.clip(exp_a, eps, 1 - eps)
+        log_loss -= s_a * np.log(p) + (1 - s_a) * np.log(1 - p)
+        brier += (exp_a - s_a) ** 2
+
+        # exp_b = 1 - exp_a and s_b = 1 - s_a, so team B moves the other way
+        for i in a:
+            ratings[:, i] += np.where(played[i] < n_prov, k_prov, k) * (s_a - exp_a) * M
+        for i in b:
+            ratings[:, i] -= np.where(played[i] < n_prov, k_prov, k) * (s_a - exp_a) * M
+        for i in (*a, *b):
+            played[i] += 1
+
+    n = max(len(history["club_a"]) - start, 1)
+    return log_loss / n, brier / n
+
+
+def k_replay(
+    n_players: int,
+    parsed: list,
+    k_values: List[int],
+    initial_elo: float,
+    bonus: Optional[Dict[str, float]] = None,
+):
+    """
+    batch_replay with one row per K and apply_match's other parameters (half
+    the club rating, no provisional K). Returns (ratings, log_loss, brier).
+    """
+    config = {
+        "k_provisional": 0.0,
+        "provisional_matches": 0.0,
+        "club_weight": 0.5,
+        **DEFAULT_BONUS,
+        **(bonus or {}),
+    }
+    params = {key: np.full(len(k_values), float(v)) for key, v in config.items()}
+    params["k"] = np.asarray(k_values, dtype=float)
+    ratings = np.full((len(k_values), n_players), float(initial_elo))
+    log_loss, brier = batch_replay(pack(parsed), params, ratings)
+    return ratings, log_loss, brier
@@ -1,8 +1,29 @@
 # elo_service.py
-from typing import Dict, List
-import math
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import io
+import json
+import threading
+
+from elo_batch import k_replay
+from statements import statement
 
 INITIAL_ELO = 1000
+DEFAULT_CLUB_ELO = 500  # same fallback the frontend uses for clubs without a rating
+
+# A full ratings snapshot is persisted every SNAPSHOT_INTERVAL processed matches,
+# so deletes / back-dated inserts only replay from the nearest snapshot onward.
+SNAPSHOT_INTERVAL = 250
+
+# Replays write elo_history through COPY in chunks of this many rows
+HISTORY_FLUSH_ROWS = 50_000
+
+# preview() scores goal differences -PREVIEW_MAX_MARGIN..PREVIEW_MAX_MARGIN
+PREVIEW_MAX_MARGIN = 5
+# Lineups accepted by one /elo/preview/batch call
+MAX_PREVIEW_LINEUPS = 200
 
 
 def _clean(s: str) -> str:
@@ -46,104 +67,953 @@ def m_upset_bonus(
     return margin_factor * upset_bonus
 
 
+def expected(a: float, b: float) -> float:
+    return 1.0 / (1.0 + 10 ** ((b - a) / 400.0))
+
+
+def _team_ids(team: Optional[str], name_to_id: Dict[str, int]) -> List[int]:
+    names = [_clean(x) for x in (team or "").split(",") if _clean(x)]
+    return [name_to_id[n] for n in names if n in name_to_id]
+
+
+def apply_match(
+    ratings: Dict[int, float],
+    team_a_ids: List[int],
+    team_b_ids: List[int],
+    club_a_rating: float,
+    club_b_rating: float,
+    score_a: int,
+    score_b: int,
+    k_factor: int,
+) -> tuple:
+    """
+    Applies a single match to `ratings` in place. Cost is O(team size).
+    Returns (expected score of team A, multiplier M) for the history log.
+    """
+
+    def team_avg(ids: List[int]) -> float:
+        if not ids:
+            return float(INITIAL_ELO)
+        return sum(ratings.get(pid, INITIAL_ELO) for pid in ids) / len(ids)
+
+    avg_a = team_avg(team_a_ids) + club_a_rating / 2
+    avg_b = team_avg(team_b_ids) + club_b_rating / 2
+
+    # Expected scores
+    exp_a = expected(avg_a, avg_b)
+    exp_b = 1.0 - exp_a
+
+    # Actual scores
+    if score_a > score_b:
+        s_a, s_b = 1.0, 0.0
+        winner_elo, loser_elo = avg_a, avg_b
+        margin = score_a - score_b
+    elif score_b > score_a:
+        s_a, s_b = 0.0, 1.0
+        winner_elo, loser_elo = avg_b, avg_a
+        margin = score_b - score_a
+    else:
+        s_a, s_b = 0.5, 0.5  # draw
+        winner_elo, loser_elo = avg_a, avg_b
+        margin = 0
+
+    # Margin + upset bonus multiplier
+    if margin > 0:
+        M = m_upset_bonus(winner_elo, loser_elo, margin)
+    else:
+        M = 1.0  # Draws
+
+    # Apply Elo updates
+    for pid in team_a_ids:
+        ratings[pid] = ratings.get(pid, INITIAL_ELO) + k_factor * (s_a - exp_a) * M
+    for pid in team_b_ids:
+        ratings[pid] = ratings.get(pid, INITIAL_ELO) + k_factor * (s_b - exp_b) * M
+    return exp_a, M
+
+
+def club_ratings(clubs: List[dict]) -> Dict[str, float]:
+    return {c["name"]: float(c.get("elo") or DEFAULT_CLUB_ELO) for c in clubs}
+
+
+def preview_match(
+    team_a: Dict[int, float],
+    team_b: Dict[int, float],
+    club_a_rating: float,
+    club_b_rating: float,
+    k_factor: int,
+    max_margin: int = PREVIEW_MAX_MARGIN,
+) -> dict:
+    """
+    Expected score of a hypothetical match and the rating change each side
+    would get per goal difference (A minus B). `team_a` / `team_b` map player
+    id -> current rating. Runs apply_match on a copy of just these ratings,
+    so the cost is O(team size) per scoreline.
+    """
+    ratings = {**team_a, **team_b}
+    first_a, first_b = next(iter(team_a)), next(iter(team_b))
+    outcomes = []
+    for margin in range(-max_margin, max_margin + 1):
+        after = dict(ratings)
+        exp_a, M = apply_match(
+            after,
+            list(team_a),
+            list(team_b),
+            club_a_rating,
+            club_b_rating,
+            max(margin, 0),
+            max(-margin, 0),
+            k_factor,
+        )
+        outcomes.append(
+            {
+                "margin": margin,
+                "multiplier": round(M, 4),
+                "deltaA": round(after[first_a] - ratings[first_a], 2),
+                "deltaB": round(after[first_b] - ratings[first_b], 2),
+            }
+        )
+    return {"expectedA": exp_a, "outcomes": outcomes}
+
+
+def replay(
+    ratings: Dict[int, float],
+    matches: List[dict],
+    players: List[dict],
+    clubs: List[dict],
+    k_factor: int,
+    on_match=None,
+) -> None:
+    """
+    Replays `matches` (chronological) on top of `ratings` in place.
+    on_match(match) is called after each processed match.
+    Reference implementation over raw rows; EloService replays via MatchLog.
+    """
+    name_to_id = {_clean(p["name"]): p["id"] for p in players}
+    club_elo = club_ratings(clubs)
+
+    for m in matches:
+        team_a_ids = _team_ids(m.get("team_a"), name_to_id)
+        team_b_ids = _team_ids(m.get("team_b"), name_to_id)
+        if team_a_ids and team_b_ids:
+            apply_match(
+                ratings,
+                team_a_ids,
+                team_b_ids,
+                club_elo.get(m.get("club_a"), DEFAULT_CLUB_ELO),
+                club_elo.get(m.get("club_b"), DEFAULT_CLUB_ELO),
+                int(m.get("score_a") or 0),
+                int(m.get("score_b") or 0),
+                k_factor,
+            )
+        if on_match:
+            on_match(m)
+
+
+# Shared with async_services.AsyncEloService
+FETCH_PLAYERS = statement(
+    "elo_fetch_players", "SELECT id, name FROM players ORDER BY id ASC;"
+)
+FETCH_MATCHES = statement(
+    "elo_fetch_matches", "SELECT * FROM matches ORDER BY time ASC, id ASC;"
+)
+FETCH_CLUBS = statement("elo_fetch_clubs", "SELECT * FROM clubs ORDER BY id ASC;")
+FETCH_STATE = statement("elo_fetch_state", "SELECT * FROM elo_state WHERE id = 1;")
+LOG_CHECKSUM = statement(
+    "elo_log_checksum",
+    """
+    SELECT
+        (SELECT COUNT(*) FROM matches) AS matches,
+        (SELECT COALESCE(SUM(id), 0) FROM matches) AS match_id_sum,
+        (SELECT COUNT(*) FROM players) AS players,
+        (SELECT COALESCE(SUM(id), 0) FROM players) AS player_id_sum;
+    """,
+)
+# Latest elo_history row per player at or before %(as_of)s (idx_elo_history_player range scan)
+RATINGS_AS_OF = statement(
+    "elo_ratings_as_of",
+    """
+    SELECT p.id AS player_id, COALESCE(h.elo_after, %(initial)s) AS elo
+    FROM players p
+    LEFT JOIN LATERAL (
+        SELECT elo_after FROM elo_history
+        WHERE player_id = p.id AND match_time <= %(as_of)s
+        ORDER BY match_time DESC, match_id DESC
+        LIMIT 1
+    ) h ON TRUE
+    ORDER BY p.id ASC;
+    """,
+)
+PLAYER_HISTORY = statement(
+    "elo_player_history",
+    """
+    SELECT match_id, match_time, elo_before, elo_after, expected, multiplier
+    FROM elo_history
+    WHERE player_id = %(player_id)s
+      AND match_time >= %(start)s AND match_time < %(end)s
+    ORDER BY match_time ASC, match_id ASC;
+    """,
+)
+# Players whose _clean()ed name is in %(names)s, with their persisted rating
+PREVIEW_PLAYERS = statement(
+    "elo_preview_players",
+    """
+    SELECT p.id, p.name, COALESCE(r.elo, %(initial)s) AS elo
+    FROM players p
+    LEFT JOIN elo_ratings r ON r.player_id = p.id
+    WHERE lower(btrim(translate(p.name, '{}()', ''))) = ANY(%(names)s)
+    ORDER BY p.id ASC;
+    """,
+)
+PREVIEW_CLUBS = statement(
+    "elo_preview_clubs", "SELECT name, elo FROM clubs WHERE name = ANY(%s);"
+)
+PERSISTED_RATINGS = statement(
+    "elo_persisted_ratings",
+    """
+    SELECT p.id AS player_id, COALESCE(r.elo, %s) AS elo
+    FROM players p
+    LEFT JOIN elo_ratings r ON r.player_id = p.id
+    ORDER BY p.id ASC;
+    """,
+)
+
+# The incremental path (one per recorded match)
+LOCK_STATE = statement(
+    "elo_lock_state", "SELECT * FROM elo_state WHERE id = 1 FOR UPDATE;"
+)
+INVALIDATE_STATE = statement(
+    "elo_invalidate_state",
+    "UPDATE elo_state SET valid = FALSE, updated_at = NOW() WHERE id = 1;",
+)
+PLAYERS_BY_NAME = statement(
+    "elo_players_by_name",
+    """
+    SELECT id, name FROM players
+    WHERE lower(btrim(translate(name, '{}()', ''))) = ANY(%s)
+    ORDER BY id ASC;
+    """,
+)
+RATINGS_OF = statement(
+    "elo_ratings_of",
+    "SELECT player_id, elo FROM elo_ratings WHERE player_id = ANY(%s);",
+)
+MATCH_CLUBS = statement(
+    "elo_match_clubs", "SELECT * FROM clubs WHERE name IN (%s, %s);"
+)
+SAVE_RATINGS = statement(
+    "elo_save_ratings",
+    """
+    INSERT INTO elo_ratings (player_id, elo)
+    SELECT * FROM unnest(%s::int[], %s::float8[])
+    ON CONFLICT (player_id) DO UPDATE SET elo = EXCLUDED.elo;
+    """,
+)
+SAVE_STATE = statement(
+    "elo_save_state",
+    """
+    UPDATE elo_state
+    SET k_factor = %s, last_match_id = %s, last_match_time = %s,
+        processed = %s, valid = TRUE, updated_at = NOW()
+    WHERE id = 1;
+    """,
+)
+
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _to_micros(t: datetime) -> int:
+    return (t - EPOCH) // timedelta(microseconds=1)
+
+
+class MatchLog:
+    """
+    Compact chronological copy of the match history for replays.
+
+    Per match it keeps the id, time (µs since epoch), the player ids of each
+    side already resolved from the team text, a club slot per side and the
+    scores, so a replay is a loop over integers with no name cleaning or club
+    lookups. Club slots index into a rating list built per replay, so club
+    rating changes never require a reload.
+
+    Built from the database on first use and kept current through add() and
+    remove(); checksum() lets EloService detect writes from other processes.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.loaded = False
+            self.ids = array("q")
+            self.times = array("q")
+            self.team_a: List[tuple] = []
+            self.team_b: List[tuple] = []
+            self.club_a = array("i")
+            self.club_b = array("i")
+            self.score_a = array("i")
+            self.score_b = array("i")
+            self.club_names: List[Optional[str]] = []
+            self._club_slots: Dict[Optional[str], int] = {}
+            self._name_to_id: Dict[str, int] = {}
+            self.player_ids: List[int] = []
+            self._match_id_sum = 0
+
+    def load(self, players: List[dict], matches: List[dict]) -> None:
+        """Rebuilds the log from player rows and chronological match rows."""
+        with self._lock:
+            self.clear()
+            self.player_ids = [p["id"] for p in players]
+            self._name_to_id = {_clean(p["name"]): p["id"] for p in players}
+            for m in matches:
+                self._insert(len(self.ids), m)
+            self.loaded = True
+
+    def checksum(self):
+        """Comparable with the LOG_CHECKSUM row."""
+        return (
+            len(self.ids),
+            self._match_id_sum,
+            len(self.player_ids),
+            sum(self.player_ids),
+        )
+
+    def _club_slot(self, name: Optional[str]) -> int:
+        slot = self._club_slots.get(name)
+        if slot is None:
+            slot = len(self.club_names)
+            self._club_slots[name] = slot
+            self.club_names.append(name)
+        return slot
+
+    def _insert(self, pos: int, m: dict) -> None:
+        self.ids.insert(pos, m["id"])
+        self.times.insert(pos, _to_micros(m["time"]))
+        self.team_a.insert(pos, tuple(_team_ids(m.get("team_a"), self._name_to_id)))
+        self.team_b.insert(pos, tuple(_team_ids(m.get("team_b"), self._name_to_id)))
+        self.club_a.insert(pos, self._club_slot(m.get("club_a")))
+        self.club_b.insert(pos, self._club_slot(m.get("club_b")))
+        self.score_a.insert(pos, int(m.get("score_a") or 0))
+        self.score_b.insert(pos, int(m.get("score_b") or 0))
+        self._match_id_sum += m["id"]
+
+    def position_after(self, time: datetime, match_id: int) -> int:
+        """Index of the first match strictly after (time, match_id)."""
+        key = (_to_micros(time), match_id)
+        return bisect_right(
+            range(len(self.ids)), key, key=lambda i: (self.times[i], self.ids[i])
+        )
+
+    def add(self, match: dict) -> None:
+        with self._lock:
+            if not self.loaded:
+                return
+            pos = self.position_after(match["time"], match["id"])
+            if pos and self.ids[pos - 1] == match["id"]:
+                return  # already loaded
+            self._insert(pos, match)
+
+    def remove(self, match_id: int) -> None:
+        with self._lock:
+            if not self.loaded or match_id not in self.ids:
+                return
+            pos = self.ids.index(match_id)
+            for column in (
+                self.ids,
+                self.times,
+                self.team_a,
+                self.team_b,
+                self.club_a,
+                self.club_b,
+                self.score_a,
+                self.score_b,
+            ):
+                del column[pos]
+            self._match_id_sum -= match_id
+
+    def match_key(self, i: int) -> dict:
+        return {
+            "id": self.ids[i],
+            "time": EPOCH + timedelta(microseconds=self.times[i]),
+        }
+
+    def new_ratings(self) -> List[float]:
+        """Rating list indexed by player id, everyone at INITIAL_ELO."""
+        return [float(INITIAL_ELO)] * (max(self.player_ids, default=-1) + 1)
+
+    def club_elo(self, clubs: List[dict]) -> List[float]:
+        """Club rating per slot for the given club rows."""
+        by_name = club_ratings(clubs)
+        return [by_name.get(name, DEFAULT_CLUB_ELO) for name in self.club_names]
+
+    def replay(
+        self,
+        ratings: List[float],
+        club_elo: List[float],
+        k_factor: int,
+        start: int = 0,
+        on_match=None,
+        history: Optional[list] = None,
+    ) -> None:
+        """
+        Same arithmetic as apply_match(), over preresolved integers.
+        `ratings` is indexed by player id; on_match(i) runs after each match.
+        With `history`, appends (i, player_id, before, after, expected, M)
+        for every rated player.
+        """
+        team_a, team_b = self.team_a, self.team_b
+        club_a, club_b = self.club_a, self.club_b
+        score_a, score_b = self.score_a, self.score_b
+
+        for i in range(start, len(self.ids)):
+            a, b = team_a[i], team_b[i]
+            if a and b:
+                avg_a = sum([ratings[p] for p in a]) / len(a) + club_elo[club_a[i]] / 2
+                avg_b = sum([ratings[p] for p in b]) / len(b) + club_elo[club_b[i]] / 2
+                exp_a = expected(avg_a, avg_b)
+                exp_b = 1.0 - exp_a
+
+                sa, sb = score_a[i], score_b[i]
+                if sa > sb:
+                    s_a, s_b = 1.0, 0.0
+                    M = m_upset_bonus(avg_a, avg_b, sa - sb)
+                elif sb > sa:
+                    s_a, s_b = 0.0, 1.0
+                    M = m_upset_bonus(avg_b, avg_a, sb - sa)
+                else:
+                    s_a, s_b = 0.5, 0.5  # draw
+                    M = 1.0
+
+                if history is not None:
+                    for p in a:
+                        before = ratings[p]
+                        ratings[p] = before + k_factor * (s_a - exp_a) * M
+                        history.append((i, p, before, ratings[p], exp_a, M))
+                    for p in b:
+                        before = ratings[p]
+                        ratings[p] = before + k_factor * (s_b - exp_b) * M
+                        history.append((i, p, before, ratings[p], exp_b, M))
+                else:
+                    for p in a:
+                        ratings[p] = ratings[p] + k_factor * (s_a - exp_a) * M
+                    for p in b:
+                        ratings[p] = ratings[p] + k_factor * (s_b - exp_b) * M
+            if on_match:
+                on_match(i)
+
+    def parsed(self, club_elo: List[float]):
+        """
+        (player_ids, parsed) for elo_batch.pack: team members as dense
+        indices into player_ids and club ratings resolved; one-sided matches
+        are dropped.
+        """
+        index = {pid: i for i, pid in enumerate(self.player_ids)}
+        parsed = [
+            (
+                [index[p] for p in self.team_a[i]],
+                [index[p] for p in self.team_b[i]],
+                club_elo[self.club_a[i]],
+                club_elo[self.club_b[i]],
+                self.score_a[i],
+                self.score_b[i],
+            )
+            for i in range(len(self.ids))
+            if self.team_a[i] and self.team_b[i]
+        ]
+        return list(self.player_ids), parsed
+
+
 class EloService:
-    def __init__(self, db):
+    """
+    Computes player ratings from the match history.
+
+    The ratings for the stored K-factor are persisted (elo_ratings) together with
+    a watermark of the last processed match (elo_state) and periodic snapshots
+    (elo_snapshots). New matches are applied incrementally, deletes and
+    back-dated inserts replay from the nearest snapshot, and reads are a plain
+    table lookup. compute_ratings() still does a full replay for what-if K values.
+    Replays run over an in-memory MatchLog rather than re-reading the table.
+    """
+
+    def __init__(self, db, snapshot=None):
         self.db = db
+        self.log = MatchLog()
+        # match_snapshot.MatchSnapshot; serves parsed_history() while fresh
+        self.snapshot = snapshot
 
-    def _fetch_players(self) -> List[dict]:
-        return self.db.execute("SELECT id, name FROM players ORDER BY id ASC;")
+    # Without `db` (a transaction, or the replica picked for a whole replay)
+    # these read from a replica when one is configured
+    def _fetch_players(self, db=None) -> List[dict]:
+        return (db or self.db.replica()).execute(FETCH_PLAYERS)
 
-    def _fetch_matches(self) -> List[dict]:
-        # chronological order for stable ELO evolution
-        return self.db.execute("SELECT * FROM matches ORDER BY time ASC;")
+    def _fetch_matches(self, db=None) -> List[dict]:
+        # chronological order for stable ELO evolution; id breaks ties
+        return (db or self.db.replica()).execute(FETCH_MATCHES)
 
-    def _fetch_clubs(self) -> List[dict]:
-        return self.db.execute("SELECT * FROM clubs ORDER BY id ASC;")
+    def _fetch_clubs(self, db=None) -> List[dict]:
+        return (db or self.db.replica()).execute(FETCH_CLUBS)
+
+    def _synced_log(self, db) -> MatchLog:
+        """
+        The match log, reloaded when it is missing or its checksum no longer
+        matches the database (e.g. another worker wrote a match).
+        Callers hold self.log._lock while using it.
+        """
+        row = db.execute(LOG_CHECKSUM, fetch_one=True)
+        current = (
+            row["matches"],
+            row["match_id_sum"],
+            row["players"],
+            row["player_id_sum"],
+        )
+        if not self.log.loaded or self.log.checksum() != current:
+            self.log.load(self._fetch_players(db), self._fetch_matches(db))
+        return self.log
 
     def compute_ratings(self, k_factor: int) -> Dict[int, int]:
         """
         Returns {player_id: elo} after processing all matches using the provided K.
+        Full replay; used for ?k= overrides that differ from the persisted state.
         """
-        players = self._fetch_players()
-        matches = self._fetch_matches()
-        clubs = self._fetch_clubs()
+        with self.log._lock:
+            db = self.db.replica()
+            log = self._synced_log(db)
+            if not log.player_ids:
+                return {}
 
-        if not players:
-            return {}
+            ratings = log.new_ratings()
+            log.replay(ratings, log.club_elo(self._fetch_clubs(db)), k_factor)
+            return {pid: int(round(ratings[pid])) for pid in log.player_ids}
 
-        name_to_id = {_clean(p["name"]): p["id"] for p in players}
-        ratings: Dict[int, float] = {p["id"]: float(INITIAL_ELO) for p in players}
-
-        def team_avg(ids: List[int]) -> float:
-            if not ids:
-                return float(INITIAL_ELO)
-            return sum(ratings.get(pid, INITIAL_ELO) for pid in ids) / len(ids)
-
-        def expected(a: float, b: float) -> float:
-            return 1.0 / (1.0 + 10 ** ((b - a) / 400.0))
-
-        for m in matches:
-            team_a_names = [
-                _clean(x) for x in (m.get("team_a") or "").split(",") if _clean(x)
-            ]
-            team_b_names = [
-                _clean(x) for x in (m.get("team_b") or "").split(",") if _clean(x)
-            ]
-
-            team_a_ids = [name_to_id[n] for n in team_a_names if n in name_to_id]
-            team_b_ids = [name_to_id[n] for n in team_b_names if n in name_to_id]
-            if not team_a_ids or not team_b_ids:
-                continue
-
-            club_a = m.get("club_a")
-            club_b = m.get("club_b")
-
-            avg_a = team_avg(team_a_ids)
-            avg_b = team_avg(team_b_ids)
-
-            for club in clubs:
-                if club["name"] == club_a:
-                    club_a_rating = club["elo"]
-                elif club["name"] == club_b:
-                    club_b_rating = club["elo"]
-
-            avg_a += club_a_rating / 2
-            avg_b += club_b_rating / 2
-
-            # Expected scores
-            exp_a = expected(avg_a, avg_b)
-            exp_b = 1.0 - exp_a
-
-            # Actual scores
-            a_score = int(m.get("score_a") or 0)
-            b_score = int(m.get("score_b") or 0)
-            if a_score > b_score:
-                s_a, s_b = 1.0, 0.0
-                winner_elo, loser_elo = avg_a, avg_b
-                margin = a_score - b_score
-            elif b_score > a_score:
-                s_a, s_b = 0.0, 1.0
-                winner_elo, loser_elo = avg_b, avg_a
-                margin = b_score - a_score
-            else:
-                s_a, s_b = 0.5, 0.5  # draw
-                winner_elo, loser_elo = avg_a, avg_b
-                margin = 0
+    def parsed_history(self):
+        """(player_ids, parsed) of the synced log; see MatchLog.parsed."""
+        if self.snapshot and self.snapshot.fresh():
+            return self.snapshot.parsed()
+        with self.log._lock:
+            db = self.db.replica()
+            log = self._synced_log(db)
+            return log.parsed(log.club_elo(self._fetch_clubs(db)))
+
+    def compute_ratings_batch(
+        self, k_values: List[int], bonus: Optional[Dict[str, float]] = None
+    ) -> List[dict]:
+        """
+        What-if ratings for several K values (and optional m_upset_bonus
+        parameters) from one pass over the history, with each K's log-loss and
+        Brier score on pre-match predictions. Nothing is persisted.
+        """
+        player_ids, parsed = self.parsed_history()
+        ratings, log_loss, brier = k_replay(
+            len(player_ids), parsed, k_values, INITIAL_ELO, bonus
+        )
+        return [
+            {
+                "k": k,
+                "logLoss": round(float(log_loss[i]), 6),
+                "brier": round(float(brier[i]), 6),
+                "matches": len(parsed),
+                "ratings": [
+                    {"playerId": pid, "elo": int(round(r))}
+                    for pid, r in zip(player_ids, ratings[i].tolist())
+                ],
+            }
+            for i, k in enumerate(k_values)
+        ]
+
+    # ----------- Persisted state -----------
+    def get_ratings(self, k_factor: int) -> Dict[int, int]:
+        """
+        Returns the persisted {player_id: elo} for `k_factor`.
+        Rebuilds first if the state is invalid or was built with another K.
+        """
+        self.ensure_current(k_factor)
+        rows = self.db.execute(PERSISTED_RATINGS, (INITIAL_ELO,))
+        return {r["player_id"]: int(round(r["elo"])) for r in rows}
+
+    def get_ratings_as_of(self, k_factor: int, as_of: datetime) -> Dict[int, int]:
+        """{player_id: elo} after every match at or before `as_of`."""
+        self.ensure_current(k_factor)
+        rows = self.db.execute(RATINGS_AS_OF, {"as_of": as_of, "initial": INITIAL_ELO})
+        return {r["player_id"]: int(round(r["elo"])) for r in rows}
+
+    def get_history(
+        self, k_factor: int, player_id: int, start: datetime, end: datetime
+    ) -> List[dict]:
+        """Per-match rating changes of one player with start <= time < end."""
+        self.ensure_current(k_factor)
+        return self.db.execute(
+            PLAYER_HISTORY, {"player_id": player_id, "start": start, "end": end}
+        )
+
+    def preview(
+        self,
+        k_factor: int,
+        lineups: List[dict],
+        max_margin: int = PREVIEW_MAX_MARGIN,
+    ) -> List[dict]:
+        """
+        Scores hypothetical matches ({"teamA": [names], "teamB": [names],
+        "clubA": name, "clubB": name}) against the current ratings without a
+        replay: one query for every lineup's players and one for their clubs.
+        Names resolve like recorded matches (_clean); unknown ones are
+        reported and left out, as replay() would. Raises ValueError for a
+        side with no known players or a player listed twice.
+        """
+        self.ensure_current(k_factor)
+        names = {_clean(n) for l in lineups for n in l["teamA"] + l["teamB"]}
+        names.discard("")
+        # later ids win on clashing names, matching replay()'s name_to_id
+        known = {
+            _clean(r["name"]): r
+            for r in self.db.execute(
+                PREVIEW_PLAYERS, {"names": sorted(names), "initial": INITIAL_ELO}
+            )
+        }
+        club_names = sorted(
+            {l[c] for l in lineups for c in ("clubA", "clubB") if l.get(c)}
+        )
+        club_elo = (
+            club_ratings(self.db.execute(PREVIEW_CLUBS, (club_names,)))
+            if club_names
+            else {}
+        )
+
+        results = []
+        for i, lineup in enumerate(lineups):
+            sides, unknown, seen = {}, [], set()
+            for side in ("teamA", "teamB"):
+                players = []
+                for name in lineup[side]:
+                    p = known.get(_clean(name))
+                    if p is None:
+                        unknown.append(name)
+                    elif p["id"] in seen:
+                        raise ValueError(f"lineup {i}: {p['name']} is listed twice")
+                    else:
+                        seen.add(p["id"])
+                        players.append(p)
+                if not players:
+                    raise ValueError(f"lineup {i}: {side} has no known players")
+                sides[side] = players
+
+            clubs = {
+                side: {
+                    "name": lineup.get(side),
+                    "elo": club_elo.get(lineup.get(side), DEFAULT_CLUB_ELO),
+                }
+                for side in ("clubA", "clubB")
+            }
+            team_a = {p["id"]: p["elo"] for p in sides["teamA"]}
+            team_b = {p["id"]: p["elo"] for p in sides["teamB"]}
+            scored = preview_match(
+                team_a,
+                team_b,
+                clubs["clubA"]["elo"],
+                clubs["clubB"]["elo"],
+                k_factor,
+                max_margin,
+            )
+            results.append(
+                {
+                    **{
+                        side: [
+                            {
+                                "id": p["id"],
+                                "name": p["name"],
+                                "elo": round(p["elo"], 2),
+                            }
+                            for p in players
+                        ]
+                        for side, players in sides.items()
+                    },
+                    **clubs,
+                    "unknown": unknown,
+                    "ratingA": round(
+                        sum(team_a.values()) / len(team_a) + clubs["clubA"]["elo"] / 2,
+                        2,
+                    ),
+                    "ratingB": round(
+                        sum(team_b.values()) / len(team_b) + clubs["clubB"]["elo"] / 2,
+                        2,
+                    ),
+                    "expectedA": round(scored["expectedA"], 4),
+                    "expectedB": round(1.0 - scored["expectedA"], 4),
+                    "outcomes": scored["outcomes"],
+                }
+            )
+        return results
+
+    def ensure_current(self, k_factor: int) -> None:
+        """Rebuilds if the persisted state is invalid or was built with another K."""
+        state = self.db.execute(FETCH_STATE, fetch_one=True)
+        if not state or not state["valid"] or state["k_factor"] != k_factor:
+            self.rebuild(k_factor)
+
+    def invalidate(self) -> None:
+        """
+        Marks the persisted state stale; the next get_ratings() rebuilds it.
+        Used when the player set changes, since that changes how names resolve.
+        """
+        self.log.clear()
+        self.db.execute(INVALIDATE_STATE, commit=True)
+
+    def rebuild(self, k_factor: int) -> None:
+        """Full replay for `k_factor`; rewrites ratings, snapshots and watermark."""
+        with self.db.transaction() as tx:
+            self._lock_state(tx)
+            tx.execute("DELETE FROM elo_snapshots;", commit=True)
+            self._replay_from(tx, k_factor, None, 0, {})
+
+    def on_match_added(self, match: dict) -> None:
+        """
+        Applies a newly inserted match. Matches past the watermark are applied
+        incrementally; back-dated ones replay from the nearest earlier snapshot.
+        """
+        self.apply_changes([{"action": "added", "match": match}])
 
-            # Margin + upset bonus multiplier
-            if margin > 0:
-                M = m_upset_bonus(winner_elo, loser_elo, margin)
+    def on_match_deleted(self, match: dict) -> None:
+        """Replays from the nearest snapshot before the deleted match."""
+        self.apply_changes([{"action": "deleted", "match": match}])
+
+    def apply_changes(self, changes: List[dict]) -> None:
+        """
+        Applies a batch of match writes, [{"action": "added" | "deleted",
+        "match": row}] in write order (the "elo" job's items, where times may
+        be ISO strings), under one lock. New matches past the watermark are
+        applied incrementally in (time, id) order; anything earlier, and any
+        delete, becomes a single replay from the earliest point involved.
+        """
+        added, deleted = [], []
+        for change in changes:
+            match = dict(change["match"])
+            if isinstance(match["time"], str):
+                match["time"] = datetime.fromisoformat(match["time"])
+            if change["action"] == "added":
+                self.log.add(match)
+                added.append(match)
             else:
-                M = 1.0  # Draws
-
-            # Apply Elo updates
-            for pid in team_a_ids:
-                ratings[pid] = (
-                    ratings.get(pid, INITIAL_ELO) + k_factor * (s_a - exp_a) * M
-                )
-            for pid in team_b_ids:
-                ratings[pid] = (
-                    ratings.get(pid, INITIAL_ELO) + k_factor * (s_b - exp_b) * M
-                )
-
-        return {pid: int(round(r)) for pid, r in ratings.items()}
+                self.log.remove(match["id"])
+                deleted.append(match)
+        deleted_ids = {m["id"] for m in deleted}
+        added = sorted(
+            (m for m in added if m["id"] not in deleted_ids),
+            key=lambda m: (m["time"], m["id"]),
+        )
+
+        with self.db.transaction() as tx:
+            state = self._lock_state(tx)
+            if not state["valid"]:
+                return  # rebuilt lazily on next read
+
+            last = (state["last_match_time"], state["last_match_id"])
+            replay_from = None
+            if last[0] is not None:
+                points = [(m["time"], m["id"]) for m in deleted]
+                replay_from = min((p for p in points if p <= last), default=None)
+            for match in added:
+                if replay_from is not None:
+                    break  # the replay covers this one and every later one
+                point = (match["time"], match["id"])
+                if last[0] is None or point > last:
+                    self._apply_incremental(tx, state, match)
+                    state = self._lock_state(tx)
+                    last = point
+                else:
+                    replay_from = point
+            if replay_from is not None:
+                self._replay_since(tx, state["k_factor"], replay_from)
+
+    def _lock_state(self, tx) -> dict:
+        return tx.execute(LOCK_STATE, fetch_one=True)
+
+    def _apply_incremental(self, tx, state: dict, match: dict) -> None:
+        names = [
+            _clean(x)
+            for team in (match.get("team_a"), match.get("team_b"))
+            for x in (team or "").split(",")
+            if _clean(x)
+        ]
+        players = tx.execute(PLAYERS_BY_NAME, (names,))
+        name_to_id = {_clean(p["name"]): p["id"] for p in players}
+        team_a_ids = _team_ids(match.get("team_a"), name_to_id)
+        team_b_ids = _team_ids(match.get("team_b"), name_to_id)
+
+        processed = state["processed"] + 1
+        if team_a_ids and team_b_ids:
+            ids = team_a_ids + team_b_ids
+            rows = tx.execute(RATINGS_OF, (ids,))
+            ratings = {pid: float(INITIAL_ELO) for pid in ids}
+            ratings.update({r["player_id"]: r["elo"] for r in rows})
+            before = dict(ratings)
+
+            clubs = tx.execute(MATCH_CLUBS, (match.get("club_a"), match.get("club_b")))
+            club_elo = club_ratings(clubs)
+            exp_a, M = apply_match(
+                ratings,
+                team_a_ids,
+                team_b_ids,
+                club_elo.get(match.get("club_a"), DEFAULT_CLUB_ELO),
+                club_elo.get(match.get("club_b"), DEFAULT_CLUB_ELO),
+                int(match.get("score_a") or 0),
+                int(match.get("score_b") or 0),
+                state["k_factor"],
+            )
+            self._save_ratings(tx, ratings)
+            self._save_history(
+                tx,
+                [
+                    (
+                        pid,
+                        match["time"],
+                        match["id"],
+                        before[pid],
+                        ratings[pid],
+                        exp_a if pid in team_a_ids else 1.0 - exp_a,
+                        M,
+                    )
+                    for pid in ids
+                ],
+            )
+
+        if processed % SNAPSHOT_INTERVAL == 0:
+            rows = tx.execute("SELECT player_id, elo FROM elo_ratings;")
+            self._save_snapshot(
+                tx, match, processed, {r["player_id"]: r["elo"] for r in rows}
+            )
+        self._save_state(tx, state["k_factor"], match, processed)
+
+    def _replay_since(self, tx, k_factor: int, point) -> None:
+        """Replays every match at or after `point` = (time, id)."""
+        snapshot = tx.execute(
+            """
+            SELECT * FROM elo_snapshots
+            WHERE (match_time, match_id) < (%s, %s)
+            ORDER BY match_time DESC, match_id DESC
+            LIMIT 1;
+            """,
+            point,
+            fetch_one=True,
+        )
+        tx.execute(
+            "DELETE FROM elo_snapshots WHERE (match_time, match_id) >= (%s, %s);",
+            point,
+            commit=True,
+        )
+        if snapshot:
+            ratings = {int(pid): elo for pid, elo in snapshot["ratings"].items()}
+            after = (snapshot["match_time"], snapshot["match_id"])
+            self._replay_from(tx, k_factor, after, snapshot["processed"], ratings)
+        else:
+            self._replay_from(tx, k_factor, None, 0, {})
+
+    def _replay_from(
+        self, tx, k_factor: int, after, processed: int, ratings: Dict[int, float]
+    ) -> None:
+        """
+        Replays the log from just after `after` = (time, id), or from the start,
+        on top of `ratings`; rewrites elo_ratings and the watermark.
+        """
+        if after:
+            tx.execute(
+                "DELETE FROM elo_history WHERE (match_time, match_id) > (%s, %s);",
+                after,
+                commit=True,
+            )
+        else:
+            tx.execute("DELETE FROM elo_history;", commit=True)
+
+        with self.log._lock:
+            log = self._synced_log(tx)
+            start = log.position_after(*after) if after else 0
+            last = {"time": after[0], "id": after[1]} if after else None
+            history = []
+
+            def flush_history():
+                rows = []
+                for i, pid, before, after_, exp, M in history:
+                    key = log.match_key(i)
+                    rows.append((pid, key["time"], key["id"], before, after_, exp, M))
+                self._save_history(tx, rows)
+                history.clear()
+
+            values = log.new_ratings()
+            for pid in log.player_ids:
+                values[pid] = ratings.get(pid, float(INITIAL_ELO))
+
+            def current():
+                return {pid: values[pid] for pid in log.player_ids}
+
+            def on_match(i):
+                nonlocal processed, last
+                processed += 1
+                last = log.match_key(i)
+                if processed % SNAPSHOT_INTERVAL == 0:
+                    self._save_snapshot(tx, last, processed, current())
+                if len(history) >= HISTORY_FLUSH_ROWS:
+                    flush_history()
+
+            log.replay(
+                values,
+                log.club_elo(self._fetch_clubs(tx)),
+                k_factor,
+                start,
+                on_match,
+                history,
+            )
+            flush_history()
+
+        tx.execute("DELETE FROM elo_ratings;", commit=True)
+        self._save_ratings(tx, current())
+        self._save_state(tx, k_factor, last, processed)
+
+    def _save_ratings(self, tx, ratings: Dict[int, float]) -> None:
+        if not ratings:
+            return
+        tx.execute(
+            SAVE_RATINGS,
+            (list(ratings.keys()), list(ratings.values())),
+            commit=True,
+        )
+
+    def _save_history(self, tx, rows: List[tuple]) -> None:
+        """COPYs (player_id, time, match_id, before, after, expected, M) rows."""
+        if not rows:
+            return
+        buf = io.StringIO()
+        for pid, time, match_id, before, after, exp, M in rows:
+            buf.write(
+                f"{pid}\t{time.isoformat()}\t{match_id}\t"
+                f"{before!r}\t{after!r}\t{exp!r}\t{M!r}\n"
+            )
+        buf.seek(0)
+        tx.copy(
+            "COPY elo_history (player_id, match_time, match_id, elo_before,"
+            " elo_after, expected, multiplier) FROM STDIN;",
+            buf,
+        )
+
+    def _save_snapshot(self, tx, match: dict, processed: int, ratings) -> None:
+        tx.execute(
+            """
+            INSERT INTO elo_snapshots (match_id, match_time, processed, ratings)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (match_time, match_id) DO UPDATE
+            SET processed = EXCLUDED.processed, ratings = EXCLUDED.ratings;
+            """,
+            (match["id"], match["time"], processed, json.dumps(ratings)),
+            commit=True,
+        )
+
+    def _save_state(self, tx, k_factor: int, last: Optional[dict], processed: int):
+        tx.execute(
+            SAVE_STATE,
+            (
+                k_factor,
+                last["id"] if last else None,
+                last["time"] if last else None,
+                processed,
+            ),
+            commit=True,
+        )
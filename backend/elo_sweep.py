@@ -0,0 +1,306 @@
+# elo_sweep.py
+# Offline rating-system experiments over the recorded history, fanned out
+# across a process pool:
+#
+#     cd backend
+#     python -m elo_sweep sweep --k 16 24 32 --club-weight 0 0.5 --out sweep.json
+#     python -m elo_sweep simulate --runs 10000 --fixtures 200
+#
+# `sweep` replays every combination of the given parameters and reports its
+# Brier score and log-loss on pre-match predictions. `simulate` plays the
+# last --fixtures matches again from the current ratings, with results drawn
+# from the expected scores, and reports each player's rating and rank spread.
+# Both read the database in .env (DB_*) and write nothing to it.
+import argparse
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Optional
+
+import numpy as np  # type: ignore
+
+from elo_batch import DEFAULT_BONUS, HISTORY_COLUMNS, batch_replay, pack
+from elo_service import INITIAL_ELO
+
+# A configuration is one value per key; sweeps take a list per key
+DEFAULT_CONFIG = {
+    "k": 24.0,
+    "initial_elo": float(INITIAL_ELO),
+    # players with fewer than provisional_matches rated matches use k_provisional
+    "k_provisional": 24.0,
+    "provisional_matches": 0,
+    # share of the club rating added to the team average (apply_match uses 1/2)
+    "club_weight": 0.5,
+    **DEFAULT_BONUS,
+}
+
+# Simulated seasons per task; seeds are per chunk, so results do not depend
+# on the number of workers
+SIM_CHUNK = 250
+
+
+class SharedHistory:
+    """
+    The packed history in one shared-memory block, written once by the parent
+    and mapped read-only by every worker (only `spec` is pickled to them).
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        layout, offset = {}, 0
+        for name, _ in HISTORY_COLUMNS:
+            offset = -(-offset // 8) * 8  # keep every column 8-byte aligned
+            layout[name] = (offset, len(arrays[name]))
+            offset += arrays[name].nbytes
+        self.shm = SharedMemory(create=True, size=max(offset, 1))
+        self.spec = {"name": self.shm.name, "layout": layout}
+        for name, array in _views(self.shm, layout).items():
+            array[:] = arrays[name]
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _views(shm: SharedMemory, layout: dict) -> Dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(
+            (layout[name][1],), dtype=dtype, buffer=shm.buf, offset=layout[name][0]
+        )
+        for name, dtype in HISTORY_COLUMNS
+    }
+
+
+# Worker-side state, set by _attach()
+_shm: Optional[SharedMemory] = None
+_history: Dict[str, np.ndarray] = {}
+
+
+def _attach(spec: dict) -> None:
+    global _shm, _history
+    # pool workers share the parent's resource tracker, which unlinks the
+    # block once, in SharedHistory.close()
+    _shm = SharedMemory(name=spec["name"])
+    _history = _views(_shm, spec["layout"])
+    for array in _history.values():
+        array.flags.writeable = False
+
+
+def _params(configs: List[dict], rows: int = 0) -> Dict[str, np.ndarray]:
+    """Column per key; a single config is repeated `rows` times."""
+    if rows:
+        configs = configs * rows
+    return {
+        key: np.array([c[key] for c in configs], dtype=float) for key in DEFAULT_CONFIG
+    }
+
+
+def _sweep_chunk(args) -> List[dict]:
+    configs, n_players = args
+    ratings = np.array([[c["initial_elo"]] * n_players for c in configs], dtype=float)
+    played = np.zeros(n_players, dtype=np.int64)
+    log_loss, brier = batch_replay(_history, _params(configs), ratings, played)
+    return [
+        {
+            **config,
+            "logLoss": round(float(log_loss[i]), 6),
+            "brier": round(float(brier[i]), 6),
+            "spread": round(float(ratings[i].std()), 2),
+        }
+        for i, config in enumerate(configs)
+    ]
+
+
+def _simulate_chunk(args) -> np.ndarray:
+    seed, chunk, runs, config, start_ratings, played, start, draw_rate, margins = args
+    rng = np.random.default_rng([seed, chunk])
+
+    def sample(exp_a):
+        # expected score = P(win) + P(draw) / 2
+        p_win = np.clip(exp_a - draw_rate / 2, 0.0, 1.0 - draw_rate)
+        u = rng.random(exp_a.shape)
+        margin = rng.choice(margins, size=exp_a.shape)
+        return np.where(u < p_win, margin, np.where(u < p_win + draw_rate, 0, -margin))
+
+    ratings = np.tile(start_ratings, (runs, 1))
+    batch_replay(
+        _history, _params([config], runs), ratings, played.copy(), start, sample
+    )
+    return ratings
+
+
+class SweepRunner:
+    """
+    Loads the history once (EloService.parsed_history) into a SharedHistory
+    and runs sweeps and simulations over it on a process pool.
+    """
+
+    def __init__(
+        self, player_ids: List[int], parsed: list, workers: Optional[int] = None
+    ):
+        self.player_ids = player_ids
+        self.matches = len(parsed)
+        self.workers = workers or os.cpu_count() or 1
+        arrays = pack(parsed)
+        self.history = SharedHistory(arrays)
+        self.pool = ProcessPoolExecutor(
+            self.workers, initializer=_attach, initargs=(self.history.spec,)
+        )
+        score_diff = arrays["score_a"] - arrays["score_b"]
+        self.draw_rate = float(np.mean(score_diff == 0)) if self.matches else 0.0
+        margins = np.abs(score_diff[score_diff != 0])
+        self.margins = margins if len(margins) else np.array([1])
+
+    def close(self) -> None:
+        self.pool.shutdown()
+        self.history.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def sweep(self, configs: List[dict]) -> List[dict]:
+        """Metrics per config, best log-loss first."""
+        configs = [{**DEFAULT_CONFIG, **c} for c in configs]
+        size = max(1, math.ceil(len(configs) / self.workers))
+        chunks = [
+            (configs[i : i + size], len(self.player_ids))
+            for i in range(0, len(configs), size)
+        ]
+        results = [r for chunk in self.pool.map(_sweep_chunk, chunks) for r in chunk]
+        results.sort(key=lambda r: r["logLoss"])
+        return results
+
+    def simulate(
+        self,
+        ratings: Dict[int, float],
+        runs: int,
+        fixtures: int,
+        config: Optional[dict] = None,
+        seed: int = 0,
+    ) -> List[dict]:
+        """
+        Replays the last `fixtures` lineups `runs` times from `ratings`
+        ({player_id: elo}), drawing each result from the expected score, the
+        recorded draw rate and the recorded winning margins. Per player:
+        final rating mean / p10 / p90, mean rank and P(rank 1).
+        """
+        config = {**DEFAULT_CONFIG, **(config or {})}
+        index = {pid: i for i, pid in enumerate(self.player_ids)}
+        start_ratings = np.full(len(self.player_ids), config["initial_elo"])
+        for pid, elo in ratings.items():
+            if pid in index:
+                start_ratings[index[pid]] = elo
+        start = max(0, self.matches - fixtures)
+        # `ratings` already include every recorded match
+        views = _views(self.history.shm, self.history.spec["layout"])
+        played = np.bincount(
+            np.concatenate([views["a_members"], views["b_members"]]),
+            minlength=len(self.player_ids),
+        )
+        tasks = [
+            (
+                seed,
+                chunk,
+                min(SIM_CHUNK, runs - offset),
+                config,
+                start_ratings,
+                played,
+                start,
+                self.draw_rate,
+                self.margins,
+            )
+            for chunk, offset in enumerate(range(0, runs, SIM_CHUNK))
+        ]
+        final = np.concatenate(list(self.pool.map(_simulate_chunk, tasks)))
+        # rank 1 = highest rating in that season
+        ranks = (-final).argsort(axis=1).argsort(axis=1) + 1
+        out = [
+            {
+                "playerId": pid,
+                "start": round(float(start_ratings[i]), 2),
+                "mean": round(float(final[:, i].mean()), 2),
+                "p10": round(float(np.percentile(final[:, i], 10)), 2),
+                "p90": round(float(np.percentile(final[:, i], 90)), 2),
+                "meanRank": round(float(ranks[:, i].mean()), 2),
+                "top": round(float((ranks[:, i] == 1).mean()), 4),
+            }
+            for i, pid in enumerate(self.player_ids)
+        ]
+        out.sort(key=lambda r: r["meanRank"])
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Elo parameter sweeps and simulations")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", help="write the JSON results here")
+    parser.add_argument(
+        "--snapshot", help="read the history from this analytics snapshot if fresh"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sweep = commands.add_parser("sweep", help="grid over rating parameters")
+    for key, default in DEFAULT_CONFIG.items():
+        sweep.add_argument(
+            "--" + key.replace("_", "-"),
+            dest=key,
+            type=float,
+            nargs="+",
+            default=[default],
+        )
+    sweep.add_argument("--top", type=int, default=20, help="rows to print")
+
+    simulate = commands.add_parser("simulate", help="Monte-Carlo seasons")
+    simulate.add_argument("--runs", type=int, default=10_000)
+    simulate.add_argument("--fixtures", type=int, default=200)
+    simulate.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from database import Database
+    from elo_service import EloService
+    from elo_settings_service import EloSettingsService
+    from match_snapshot import MatchSnapshot
+
+    db = Database()
+    elo_service = EloService(db, args.snapshot and MatchSnapshot(db, args.snapshot))
+    player_ids, parsed = elo_service.parsed_history()
+    with SweepRunner(player_ids, parsed, args.workers) as runner:
+        if args.command == "sweep":
+            grid = [getattr(args, key) for key in DEFAULT_CONFIG]
+            configs = [dict(zip(DEFAULT_CONFIG, values)) for values in product(*grid)]
+            result = runner.sweep(configs)
+            for r in result[: args.top]:
+                params = " ".join(f"{k}={r[k]:g}" for k in DEFAULT_CONFIG)
+                print(f"logLoss {r['logLoss']:.5f}  brier {r['brier']:.5f}  {params}")
+        else:
+            k = EloSettingsService(db).get_k_factor()
+            result = runner.simulate(
+                elo_service.get_ratings(k),
+                args.runs,
+                args.fixtures,
+                {"k": k, "k_provisional": k},
+                args.seed,
+            )
+            names = {
+                p["id"]: p["name"] for p in db.execute("SELECT id, name FROM players;")
+            }
+            for r in result:
+                print(
+                    f"{names.get(r['playerId'], r['playerId']):20s} "
+                    f"{r['start']:8.1f} -> {r['mean']:8.1f} "
+                    f"[{r['p10']:.0f}, {r['p90']:.0f}]  rank {r['meanRank']:5.2f}  "
+                    f"top {100 * r['top']:5.1f}%"
+                )
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"matches": len(parsed), "results": result}, f, indent=2)
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+# import_service.py
+# Bulk match import from CSV / NDJSON, loaded with COPY in batched transactions.
+#
+#     cd backend
+#     python -m import_service history.csv
+#     python -m import_service history.ndjson --batch-size 10000
+import argparse
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from database import Database
+from elo_service import EloService, _clean
+from elo_settings_service import EloSettingsService
+from match_service import PARTICIPANTS_FROM_TEAMS
+from rollup_service import RollupService
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+# Accepted column / key names -> matches column
+FIELDS = {
+    "time": "time",
+    "club_a": "club_a",
+    "clubA": "club_a",
+    "club_b": "club_b",
+    "clubB": "club_b",
+    "team_a": "team_a",
+    "teamA": "team_a",
+    "team_b": "team_b",
+    "teamB": "team_b",
+    "score_a": "score_a",
+    "scoreA": "score_a",
+    "score_b": "score_b",
+    "scoreB": "score_b",
+}
+
+# team_a / team_b stay TEXT[] in staging so the ::text cast renders them exactly
+# like the list parameters POST /matches stores ("{a,"Can Er"}").
+CREATE_STAGING = """
+CREATE TEMP TABLE match_import (
+    time TIMESTAMP,
+    club_a TEXT,
+    club_b TEXT,
+    team_a TEXT[],
+    team_b TEXT[],
+    score_a INT,
+    score_b INT
+) ON COMMIT DROP;
+"""
+
+COLUMNS = ("time", "club_a", "club_b", "team_a", "team_b", "score_a", "score_b")
+COPY_STAGING = f"COPY match_import ({', '.join(COLUMNS)}) FROM STDIN;"
+
+INSERT_FROM_STAGING = """
+INSERT INTO matches (time, club_a, club_b, team_a, team_b, score_a, score_b)
+SELECT COALESCE(time, NOW()), club_a, club_b, team_a::text, team_b::text, score_a, score_b
+FROM match_import
+RETURNING id;
+"""
+
+
+class MatchImportError(ValueError):
+    """Rejected import; `errors` lists "line N: reason" messages."""
+
+    def __init__(self, errors: List[str]):
+        super().__init__(f"{len(errors)} invalid row(s)")
+        self.errors = errors
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[tuple]:
+    """Yields (line_number, raw dict) from CSV (with header) or NDJSON lines."""
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "ndjson":
+        for n, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield n, json.loads(line)
+            except ValueError:
+                yield n, None
+    else:
+        raise ValueError(f"unsupported format: {fmt}")
+
+
+def _split_team(value) -> List[str]:
+    """Lists, "{a,"Can Er"}" (the stored form) or "a;b" all become name lists."""
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    value = str(value).strip()
+    if value.startswith("{") and value.endswith("}"):
+        reader = csv.reader([value[1:-1]], quotechar='"', escapechar="\\")
+        return [v.strip() for v in next(reader, []) if v.strip()]
+    return [v.strip() for v in value.split(";") if v.strip()]
+
+
+def _copy_value(value) -> str:
+    if value is None:
+        return "\\N"
+    if isinstance(value, list):
+        value = (
+            "{"
+            + ",".join(
+                '"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"' for v in value
+            )
+            + "}"
+        )
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class ImportService:
+    """
+    Validates rows against player / club lookups loaded once per import, then
+    COPYs them into a staging table and inserts them into matches batch by
+    batch. Rollups and Elo are rebuilt once after the last batch.
+    """
+
+    def __init__(self, db, elo_service=None, rollup_service=None, elo_settings=None):
+        self.db = db
+        self.elo_service = elo_service
+        self.rollup_service = rollup_service
+        self.elo_settings = elo_settings
+
+    def _lookups(self):
+        players = {
+            _clean(p["name"]): p["name"]
+            for p in self.db.execute("SELECT name FROM players;")
+        }
+        clubs = {
+            c["name"].lower(): c["name"]
+            for c in self.db.execute("SELECT name FROM clubs;")
+        }
+        return players, clubs
+
+    def _validate(self, raw, players: Dict[str, str], clubs: Dict[str, str]):
+        if not isinstance(raw, dict):
+            raise ValueError("not a JSON object")
+        row = {FIELDS[k]: v for k, v in raw.items() if k in FIELDS}
+
+        match = {}
+        time_value = row.get("time")
+        if time_value in (None, ""):
+            match["time"] = None
+        else:
+            match["time"] = datetime.fromisoformat(str(time_value).strip())
+
+        for side in ("a", "b"):
+            club = str(row.get(f"club_{side}") or "").strip()
+            if club.lower() not in clubs:
+                raise ValueError(f"unknown club {club!r}")
+            match[f"club_{side}"] = clubs[club.lower()]
+
+            names = _split_team(row.get(f"team_{side}"))
+            if not names:
+                raise ValueError(f"team_{side} is empty")
+            unknown = [n for n in names if _clean(n) not in players]
+            if unknown:
+                raise ValueError(f"unknown player(s) {', '.join(unknown)}")
+            match[f"team_{side}"] = [players[_clean(n)] for n in names]
+
+            score = row.get(f"score_{side}")
+            if score in (None, ""):
+                raise ValueError(f"score_{side} is required")
+            score = int(score)
+            if score < 0:
+                raise ValueError(f"score_{side} is negative")
+            match[f"score_{side}"] = score
+
+        if {_clean(n) for n in match["team_a"]} & {_clean(n) for n in match["team_b"]}:
+            raise ValueError("a player is on both teams")
+        return match
+
+    def parse(self, lines: Iterable[str], fmt: str) -> List[dict]:
+        """Validated match rows; raises MatchImportError listing bad lines."""
+        players, clubs = self._lookups()
+        matches, errors = [], []
+        for n, raw in read_rows(lines, fmt):
+            try:
+                matches.append(self._validate(raw, players, clubs))
+            except (TypeError, ValueError) as exc:
+                errors.append(f"line {n}: {exc}")
+                if len(errors) >= MAX_REPORTED_ERRORS:
+                    break
+        if errors:
+            raise MatchImportError(errors)
+        return matches
+
+    def _load_batch(self, batch: List[dict]) -> int:
+        buf = io.StringIO()
+        for m in batch:
+            buf.write("\t".join(_copy_value(m[c]) for c in COLUMNS) + "\n")
+        buf.seek(0)
+
+        with self.db.transaction() as tx:
+            tx.execute(CREATE_STAGING, commit=True)
+            tx.copy(COPY_STAGING, buf)
+            ids = [r["id"] for r in tx.execute(INSERT_FROM_STAGING)]
+            tx.execute(
+                PARTICIPANTS_FROM_TEAMS
+                + "WHERE m.id = ANY(%s) ON CONFLICT DO NOTHING;",
+                (ids,),
+                commit=True,
+            )
+        return len(ids)
+
+    def refresh(self) -> None:
+        """Rebuilds the derived state once for everything imported."""
+        if self.rollup_service:
+            self.rollup_service.rebuild()
+        if self.elo_service:
+            if self.elo_settings:
+                self.elo_service.rebuild(self.elo_settings.get_k_factor())
+            else:
+                self.elo_service.invalidate()
+
+    def import_matches(
+        self, lines: Iterable[str], fmt: str, batch_size: Optional[int] = None
+    ) -> dict:
+        """
+        Validates every row first (nothing is written if any row is bad), then
+        loads in batches of `batch_size`. Returns counts and timings.
+        """
+        batch_size = batch_size or BATCH_SIZE
+        started = time.perf_counter()
+        matches = self.parse(lines, fmt)
+        parsed_at = time.perf_counter()
+
+        inserted = batches = 0
+        try:
+            for i in range(0, len(matches), batch_size):
+                inserted += self._load_batch(matches[i : i + batch_size])
+                batches += 1
+        finally:
+            loaded_at = time.perf_counter()
+            if inserted:
+                self.refresh()
+        finished = time.perf_counter()
+
+        load_s = loaded_at - parsed_at
+        return {
+            "rows": inserted,
+            "batches": batches,
+            "parseSeconds": round(parsed_at - started, 3),
+            "loadSeconds": round(load_s, 3),
+            "refreshSeconds": round(finished - loaded_at, 3),
+            "rowsPerSec": round(inserted / load_s, 1) if load_s > 0 else None,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-import matches")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+
+    db = Database()
+    service = ImportService(
+        db, EloService(db), RollupService(db), EloSettingsService(db)
+    )
+    with open(args.path, newline="", encoding="utf-8") as f:
+        try:
+            result = service.import_matches(f, fmt, args.batch_size)
+        except MatchImportError as exc:
+            raise SystemExit("\n".join([str(exc)] + exc.errors))
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+# job_queue.py
+# Durable background jobs in the `jobs` table: writers enqueue derived-state
+# work (Elo updates, cache warm-up) in their own transaction and return; a
+# small worker pool claims jobs with FOR UPDATE SKIP LOCKED, so any number of
+# workers and processes can share the table without handing out a job twice.
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import orjson
+
+from result_cache import dumps
+from statements import statement
+
+POLL_SECONDS = 1.0
+# A running job whose worker has not renewed its lease within LEASE_SECONDS is
+# assumed lost (crashed process) and is claimed again; a live worker renews it
+# every HEARTBEAT_SECONDS, however long the handler runs
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = LEASE_SECONDS / 3
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 300
+# Finished jobs are kept this long for /admin/jobs, then pruned
+RETENTION_HOURS = 24
+PRUNE_EVERY_SECONDS = 600
+
+# A pending job with the same dedupe_key absorbs the new items instead of
+# queueing a second job, so a burst of writes costs one run. Keys are unique
+# among pending jobs only (idx_jobs_pending_key): running jobs never absorb.
+ENQUEUE_JOB = statement(
+    "enqueue_job",
+    """
+INSERT INTO jobs (kind, dedupe_key, payload, max_attempts)
+VALUES (%(kind)s, %(key)s, jsonb_build_object('items', %(items)s::jsonb), %(max_attempts)s)
+ON CONFLICT (dedupe_key) WHERE status = 'pending'
+DO UPDATE SET
+    payload = jsonb_build_object(
+        'items', (jobs.payload -> 'items') || (EXCLUDED.payload -> 'items')
+    ),
+    coalesced = jobs.coalesced + 1
+RETURNING id;
+""",
+)
+CLAIM_JOB = statement(
+    "claim_job",
+    """
+UPDATE jobs
+SET status = 'running', attempts = attempts + 1, started_at = NOW()
+WHERE id = (
+    SELECT id FROM jobs
+    WHERE (status = 'pending' AND run_after <= NOW())
+       OR (status = 'running' AND started_at < NOW() - %(lease)s * INTERVAL '1 second')
+    ORDER BY id ASC
+    LIMIT 1
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, kind, dedupe_key, payload, attempts, max_attempts;
+""",
+)
+FINISH_JOB = statement(
+    "finish_job",
+    """
+UPDATE jobs SET status = 'done', finished_at = NOW(), last_error = NULL
+WHERE id = %s;
+""",
+)
+# attempts matches only while no other worker has reclaimed the job
+RENEW_LEASE = statement(
+    "renew_job_lease",
+    """
+UPDATE jobs SET started_at = NOW()
+WHERE id = %s AND status = 'running' AND attempts = %s;
+""",
+)
+FAIL_JOB = """
+UPDATE jobs SET status = 'failed', finished_at = NOW(), last_error = %s
+WHERE id = %s;
+"""
+# A failed attempt without a key goes back to pending
+RETRY_JOB = """
+UPDATE jobs
+SET status = 'pending', last_error = %(error)s,
+    run_after = NOW() + %(delay)s * INTERVAL '1 second'
+WHERE id = %(id)s;
+"""
+# With a key, its items are re-queued like an enqueue, so they land in the
+# pending job with that key, if there is one (also one enqueued by another
+# process a moment ago), or in a new one that inherits the attempts; this row
+# is closed. One statement: no window in which idx_jobs_pending_key can fail.
+RETRY_KEYED_JOB = """
+WITH retry AS (
+    INSERT INTO jobs (kind, dedupe_key, payload, attempts, max_attempts, last_error, run_after)
+    SELECT kind, dedupe_key, jsonb_build_object('items', %(items)s::jsonb),
+           attempts, max_attempts, %(error)s,
+           NOW() + %(delay)s * INTERVAL '1 second'
+    FROM jobs WHERE id = %(id)s
+    ON CONFLICT (dedupe_key) WHERE status = 'pending'
+    DO UPDATE SET
+        payload = jsonb_build_object(
+            'items', (EXCLUDED.payload -> 'items') || (jobs.payload -> 'items')
+        ),
+        coalesced = jobs.coalesced + 1,
+        run_after = GREATEST(jobs.run_after, EXCLUDED.run_after)
+    RETURNING id
+)
+UPDATE jobs
+SET status = 'done', finished_at = NOW(),
+    last_error = %(error)s || ' (items moved to job ' || (SELECT id FROM retry) || ')'
+WHERE id = %(id)s;
+"""
+PRUNE_JOBS = """
+DELETE FROM jobs
+WHERE status = 'done' AND finished_at < NOW() - %s * INTERVAL '1 hour';
+"""
+JOB_COUNTS = """
+SELECT kind, status, COUNT(*) AS jobs,
+       COALESCE(SUM(jsonb_array_length(payload -> 'items')), 0) AS items,
+       EXTRACT(EPOCH FROM NOW() - MIN(created_at)) AS oldest_seconds
+FROM jobs
+GROUP BY kind, status
+ORDER BY kind, status;
+"""
+RECENT_JOBS = """
+SELECT id, kind, dedupe_key, status, attempts, max_attempts, coalesced,
+       jsonb_array_length(payload -> 'items') AS items, last_error,
+       created_at, run_after, started_at, finished_at
+FROM jobs
+WHERE %(status)s::text IS NULL OR status = %(status)s
+ORDER BY id DESC
+LIMIT %(limit)s;
+"""
+
+
+def enqueue_params(kind: str, items=None, key: Optional[str] = None) -> dict:
+    """ENQUEUE_JOB parameters, for callers enqueueing inside their own
+    transaction (see JobQueue.enqueue)."""
+    return {
+        "kind": kind,
+        "key": key,
+        "items": dumps(items or []).decode(),
+        "max_attempts": MAX_ATTEMPTS,
+    }
+
+
+class JobQueue:
+    """
+    Handlers are registered per kind and receive the job's item list (the
+    items of every coalesced enqueue, oldest first); they must tolerate seeing
+    items again after a failed attempt. A handler that raises is retried with
+    exponential backoff up to max_attempts, then the job is marked failed and
+    left for /admin/jobs, and the kind's `on_failure(items)` runs, so whatever
+    the job would have brought up to date can be marked stale instead.
+
+    `workers` threads start with start(); enqueue() wakes them, otherwise they
+    poll every POLL_SECONDS, which also picks up jobs enqueued by other
+    processes. With no workers, wake() runs due jobs in the calling thread,
+    after the write that enqueued them.
+    """
+
+    def __init__(self, db, workers: int = 2):
+        self.db = db
+        self.workers = workers
+        self.handlers: Dict[str, Callable[[List], None]] = {}
+        self.on_failure: Dict[str, Callable[[List], None]] = {}
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(
+        self,
+        kind: str,
+        handler: Callable[[List], None],
+        on_failure: Optional[Callable[[List], None]] = None,
+    ) -> None:
+        self.handlers[kind] = handler
+        if on_failure is not None:
+            self.on_failure[kind] = on_failure
+
+    # ----------- Enqueueing -----------
+    def enqueue(self, kind: str, items=None, key: Optional[str] = None, tx=None):
+        """
+        Queues a job and returns its id (the absorbing job's id when coalesced
+        into a pending job with the same `key`). Pass `tx` to enqueue
+        atomically with the caller's write; call wake() after it commits.
+        """
+        row = (tx or self.db).execute(
+            ENQUEUE_JOB, enqueue_params(kind, items, key), fetch_one=True
+        )
+        if tx is None:
+            self.wake()
+        return row["id"]
+
+    def wake(self) -> None:
+        if self.workers:
+            self._wake.set()
+        else:
+            self.run_pending()
+
+    # ----------- Workers -----------
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"jobs-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stops the workers after their current job."""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            try:
+                ran = self.run_one()
+                self._prune()
+            except Exception as exc:  # e.g. the database is briefly unreachable
+                print(f"[JOBS] worker error: {exc}")
+                ran = False
+            if not ran:
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+
+    def run_one(self) -> bool:
+        """Claims and runs one due job; False when there was none."""
+        job = self.db.execute(CLAIM_JOB, {"lease": LEASE_SECONDS}, fetch_one=True)
+        if not job:
+            return False
+        items = job["payload"]["items"]
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat, args=(job, done), name="jobs-lease", daemon=True
+        )
+        heartbeat.start()
+        try:
+            handler = self.handlers[job["kind"]]
+            handler(items)
+        except Exception as exc:
+            self._failed(job, items, f"{type(exc).__name__}: {exc}")
+            return True
+        finally:
+            done.set()
+            heartbeat.join()
+        self.db.execute(FINISH_JOB, (job["id"],), commit=True)
+        self.completed += 1
+        return True
+
+    def run_pending(self) -> int:
+        """Runs due jobs in the calling thread until none is left (CLI,
+        benchmarks); returns how many ran."""
+        ran = 0
+        while self.run_one():
+            ran += 1
+        return ran
+
+    def _heartbeat(self, job: dict, done: threading.Event) -> None:
+        """Renews the job's lease until `done` is set."""
+        while not done.wait(HEARTBEAT_SECONDS):
+            try:
+                self.db.execute(RENEW_LEASE, (job["id"], job["attempts"]), commit=True)
+            except Exception as exc:  # the next beat tries again
+                print(f"[JOBS] lease of job {job['id']} not renewed: {exc}")
+
+    def _failed(self, job: dict, items: List, error: str) -> None:
+        print(f"[JOBS] {job['kind']} job {job['id']} failed: {error}")
+        if job["attempts"] >= job["max_attempts"]:
+            self.db.execute(FAIL_JOB, (error, job["id"]), commit=True)
+            self.failed += 1
+            on_failure = self.on_failure.get(job["kind"])
+            if on_failure is not None:
+                try:
+                    on_failure(items)
+                except Exception as exc:
+                    print(f"[JOBS] {job['kind']} on_failure failed: {exc}")
+            return
+        delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1))
+        self.retried += 1
+        params = {"id": job["id"], "error": error, "delay": delay}
+        if job["dedupe_key"] is None:
+            self.db.execute(RETRY_JOB, params, commit=True)
+            return
+        params["items"] = orjson.dumps(items).decode()
+        self.db.execute(RETRY_KEYED_JOB, params, commit=True)
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        if now - self._last_prune < PRUNE_EVERY_SECONDS:
+            return
+        self._last_prune = now
+        self.db.execute(PRUNE_JOBS, (RETENTION_HOURS,), commit=True)
+
+    # ----------- Status -----------
+    def status(self, status: Optional[str] = None, limit: int = 20) -> dict:
+        """Counts by kind and status, plus the most recent jobs."""
+        return {
+            "workers": len(self._threads),
+            "completed": self.completed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "counts": self.db.execute(JOB_COUNTS),
+            "recent": self.db.execute(RECENT_JOBS, {"status": status, "limit": limit}),
+        }
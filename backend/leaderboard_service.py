@@ -1,191 +1,175 @@
 from database import Database
 from datetime import date
+from rollup_service import window_rows
+from statements import statement
+
+# Shared with async_services.AsyncLeaderboardService.
+# All three read the daily rollups (see rollup_service.window_rows).
+LEADERBOARD_COLUMNS = """
+        SUM(s.wins) AS wins,
+        SUM(s.draws) AS draws,
+        SUM(s.losses) AS losses,
+        SUM(s.matches) AS total_matches,
+        SUM(s.points) AS points,
+        ROUND(
+            (SUM(s.wins)::numeric / NULLIF(SUM(s.matches), 0)) * 100,
+            2
+        ) AS win_percentage,
+        SUM(s.goals_for) AS goals_forwarded,
+        SUM(s.goals_against) AS goals_accepted
+"""
+
+
+def _player_leaderboard(where=""):
+    return f"""
+    SELECT
+        p.name AS name,
+        {LEADERBOARD_COLUMNS}
+    FROM ({window_rows("player")}) AS s
+    JOIN players p ON p.id = s.grp
+    {where}
+    GROUP BY p.id, p.name
+    HAVING SUM(s.matches) > 0
+    ORDER BY win_percentage DESC, total_matches DESC;
+    """
+
+
+def _team_leaderboard(where=""):
+    return f"""
+    SELECT
+        s.grp AS team,
+        {LEADERBOARD_COLUMNS}
+    FROM ({window_rows("club")}) AS s
+    {where}
+    GROUP BY s.grp
+    HAVING SUM(s.matches) > 0
+    ORDER BY win_percentage DESC, total_matches DESC;
+    """
+
+
+# Projection of the partner matrix: one orientation per pair, names in order
+def _duo_leaderboard(where=""):
+    return f"""
+    SELECT
+        pa.name || ' & ' || pb.name AS team_name,
+        {LEADERBOARD_COLUMNS}
+    FROM ({window_rows("partner")}) AS s
+    JOIN players pa ON pa.id = s.grp
+    JOIN players pb ON pb.id = s.grp2
+    WHERE pa.name < pb.name {where}
+    GROUP BY pa.name, pb.name
+    HAVING SUM(s.matches) > 0
+    ORDER BY win_percentage DESC, total_matches DESC;
+    """
+
+
+PLAYER_LEADERBOARD = statement("player_leaderboard", _player_leaderboard())
+TEAM_LEADERBOARD = statement("team_leaderboard", _team_leaderboard())
+DUO_LEADERBOARD = statement("duo_leaderboard", _duo_leaderboard())
+
+# The lines one match touches, for live updates (live_updates.py)
+PLAYER_LINES = statement(
+    "player_lines", _player_leaderboard("WHERE s.grp = ANY(%(player_ids)s)")
+)
+TEAM_LINES = statement("team_lines", _team_leaderboard("WHERE s.grp = ANY(%(clubs)s)"))
+DUO_LINES = statement(
+    "duo_lines",
+    _duo_leaderboard(
+        """AND ((s.grp = ANY(%(team_a)s) AND s.grp2 = ANY(%(team_a)s))
+      OR (s.grp = ANY(%(team_b)s) AND s.grp2 = ANY(%(team_b)s)))"""
+    ),
+)
+
+
+def _pair_stats(kind, other):
+    return f"""
+    SELECT
+        s.grp2 AS {other}_id,
+        p.name AS {other},
+        {LEADERBOARD_COLUMNS},
+        SUM(s.goals_for) - SUM(s.goals_against) AS goal_difference
+    FROM ({window_rows(kind)}) AS s
+    JOIN players p ON p.id = s.grp2
+    WHERE s.grp = %(player_id)s
+    GROUP BY s.grp2, p.name
+    HAVING SUM(s.matches) > 0
+    ORDER BY total_matches DESC, win_percentage DESC;
+    """
+
+
+# One player's record with each partner / against each opponent
+PARTNER_STATS = statement("partner_stats", _pair_stats("partner", "partner"))
+RIVAL_STATS = statement("rival_stats", _pair_stats("rival", "opponent"))
 
 
 class LeaderboardService:
-    def __init__(self, db: Database):
+    """
+    With a MatchSnapshot (match_snapshot.py), the three leaderboards are
+    computed from the mapped file while it is fresh, otherwise in SQL.
+    """
+
+    def __init__(self, db: Database, snapshot=None):
         self.db = db
+        self.snapshot = snapshot
+
+    def _fresh_snapshot(self):
+        return self.snapshot if self.snapshot and self.snapshot.fresh() else None
 
     def get_player_leaderboard(self, start_time: date):
         print("[SERVICE] get_player_leaderboard executing")
-        query = """
-        SELECT
-            p.name AS name,
-            COALESCE(SUM(
-                CASE WHEN (m.score_a > m.score_b AND p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ',')))
-                        OR (m.score_b > m.score_a AND p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')))
-                    THEN 1 ELSE 0 END
-            ), 0) AS wins,
-            COALESCE(SUM(
-                CASE WHEN m.score_a = m.score_b AND (p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ','))
-                        OR p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')))
-                    THEN 1 ELSE 0 END
-            ), 0) AS draws,
-            COALESCE(SUM(
-                CASE WHEN (m.score_a < m.score_b AND p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ',')))
-                        OR (m.score_b < m.score_a AND p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')))
-                    THEN 1 ELSE 0 END
-            ), 0) AS losses,
-            COUNT(m.id) AS total_matches,
-            COALESCE(SUM(
-                CASE WHEN (m.score_a > m.score_b AND p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ',')))
-                        OR (m.score_b > m.score_a AND p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')))
-                    THEN 3
-                    WHEN m.score_a = m.score_b AND (p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ','))
-                        OR p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')))
-                    THEN 1 ELSE 0 END
-            ), 0) AS points,
-            ROUND(
-                (
-                    COALESCE(SUM(
-                        CASE WHEN (m.score_a > m.score_b AND p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ',')))
-                                OR (m.score_b > m.score_a AND p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')))
-                            THEN 1 ELSE 0 END
-                    ), 0)::numeric
-                    / NULLIF(COUNT(m.id), 0)
-                ) * 100,
-                2
-            ) AS win_percentage,
-            COALESCE(SUM(
-                CASE
-                    WHEN p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ',')) THEN m.score_a
-                    WHEN p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')) THEN m.score_b
-                    ELSE 0
-                END
-            ), 0) AS goals_forwarded,
-            COALESCE(SUM(
-                CASE
-                    WHEN p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ',')) THEN m.score_b
-                    WHEN p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ',')) THEN m.score_a
-                    ELSE 0
-                END
-            ), 0) AS goals_accepted
-        FROM players p
-        LEFT JOIN matches m
-        ON p.name = ANY(string_to_array(trim(both '{}' from m.team_a), ','))
-        OR p.name = ANY(string_to_array(trim(both '{}' from m.team_b), ','))
-        WHERE m.time >= CAST(%(start_time)s AS timestamp) - INTERVAL '3 hours'
-        GROUP BY p.name
-        ORDER BY win_percentage DESC, total_matches DESC;
-        """
-        return self.db.execute(query, {"start_time": start_time}, fetch_one=False)
+        snapshot = self._fresh_snapshot()
+        if snapshot:
+            return snapshot.player_leaderboard(start_time)
+        return self.db.replica().execute(
+            PLAYER_LEADERBOARD, {"start_time": start_time}, fetch_one=False
+        )
 
     def get_team_leaderboard(self, start_time: date):
         print("[SERVICE] get_team_leaderboard executing")
-        query = """
-        SELECT
-            club AS team,
-            SUM(CASE WHEN is_winner = 1 THEN 1 ELSE 0 END) AS wins,
-            SUM(CASE WHEN is_winner = 0 THEN 1 ELSE 0 END) AS draws,
-            SUM(CASE WHEN is_winner = -1 THEN 1 ELSE 0 END) AS losses,
-            COUNT(*) AS total_matches,
-            SUM(
-                CASE WHEN is_winner = 1 THEN 3 WHEN is_winner = 0 THEN 1 ELSE 0 END
-            ) AS points,
-            ROUND(
-                (
-                    SUM(CASE WHEN is_winner = 1 THEN 1 ELSE 0 END)::numeric
-                    / NULLIF(COUNT(*), 0)
-                ) * 100,
-                2
-            ) AS win_percentage,
-            SUM(goals_forwarded) AS goals_forwarded,
-            SUM(goals_accepted) AS goals_accepted
-        FROM (
-            SELECT
-                club_a AS club,
-                CASE
-                    WHEN score_a > score_b THEN 1
-                    WHEN score_a = score_b THEN 0
-                    ELSE -1
-                END AS is_winner,
-                score_a AS goals_forwarded,
-                score_b AS goals_accepted
-            FROM matches
-            WHERE time >= CAST(%(start_time)s AS timestamp) - INTERVAL '3 hours'
-
-            UNION ALL
-
-            SELECT
-                club_b AS club,
-                CASE
-                    WHEN score_b > score_a THEN 1
-                    WHEN score_b = score_a THEN 0
-                    ELSE -1
-                END AS is_winner,
-                score_b AS goals_forwarded,
-                score_a AS goals_accepted
-            FROM matches
-            WHERE time >= CAST(%(start_time)s AS timestamp) - INTERVAL '3 hours'
-        ) AS all_teams
-        GROUP BY club
-        ORDER BY win_percentage DESC, total_matches DESC;
-        """
-        return self.db.execute(query, {"start_time": start_time}, fetch_one=False)
+        snapshot = self._fresh_snapshot()
+        if snapshot:
+            return snapshot.team_leaderboard(start_time)
+        return self.db.replica().execute(
+            TEAM_LEADERBOARD, {"start_time": start_time}, fetch_one=False
+        )
 
     def get_duo_leaderboard(self, start_time: date):
         print("[SERVICE] get_duo_leaderboard executing")
-        query = """
-        SELECT
-            team_name,
-            SUM(CASE WHEN is_winner = 1 THEN 1 ELSE 0 END) AS wins,
-            SUM(CASE WHEN is_winner = 0 THEN 1 ELSE 0 END) AS draws,
-            SUM(CASE WHEN is_winner = -1 THEN 1 ELSE 0 END) AS losses,
-            COUNT(*) AS total_matches,
-            SUM(
-                CASE WHEN is_winner = 1 THEN 3 WHEN is_winner = 0 THEN 1 ELSE 0 END
-            ) AS points,
-            ROUND(
-                (
-                    SUM(CASE WHEN is_winner = 1 THEN 1 ELSE 0 END)::numeric
-                    / NULLIF(COUNT(*), 0)
-                ) * 100,
-                2
-            ) AS win_percentage,
-            SUM(goals_forwarded) AS goals_forwarded,
-            SUM(goals_accepted) AS goals_accepted
-        FROM (
-            SELECT
-                array_to_string(
-                    ARRAY(
-                        SELECT unnest(string_to_array(trim(both '{}' from m.team_a), ','))
-                        ORDER BY unnest
-                    ),
-                    ' & '
-                ) AS team_name,
-                CASE
-                    WHEN m.score_a > m.score_b THEN 1
-                    WHEN m.score_a = m.score_b THEN 0
-                    ELSE -1
-                END AS is_winner,
-                m.score_a AS goals_forwarded,
-                m.score_b AS goals_accepted
-            FROM matches m
-            WHERE array_length(string_to_array(trim(both '{}' from m.team_a), ','), 1) > 1
-              AND m.time >= CAST(%(start_time)s AS timestamp) - INTERVAL '3 hours'
-
-            UNION ALL
-
-            SELECT
-                array_to_string(
-                    ARRAY(
-                        SELECT unnest(string_to_array(trim(both '{}' from m.team_b), ','))
-                        ORDER BY unnest
-                    ),
-                    ' & '
-                ) AS team_name,
-                CASE
-                    WHEN m.score_b > m.score_a THEN 1
-                    WHEN m.score_b = m.score_a THEN 0
-                    ELSE -1
-                END AS is_winner,
-                m.score_b AS goals_forwarded,
-                m.score_a AS goals_accepted
-            FROM matches m
-            WHERE array_length(string_to_array(trim(both '{}' from m.team_b), ','), 1) > 1
-            AND m.time >= CAST(%(start_time)s AS timestamp) - INTERVAL '3 hours'
-        ) AS duo_teams
-        GROUP BY team_name
-        ORDER BY win_percentage DESC, total_matches DESC;
+        snapshot = self._fresh_snapshot()
+        if snapshot:
+            return snapshot.duo_leaderboard(start_time)
+        return self.db.replica().execute(
+            DUO_LEADERBOARD, {"start_time": start_time}, fetch_one=False
+        )
+
+    def get_lines(self, start_time: date, team_a_ids, team_b_ids, clubs):
+        """
+        Player, team and duo leaderboard rows for the given sides and clubs
+        only. Groups whose window is now empty are absent.
         """
-        return self.db.execute(query, {"start_time": start_time}, fetch_one=False)
+        print("[SERVICE] get_lines executing")
+        params = {
+            "start_time": start_time,
+            "player_ids": list(team_a_ids) + list(team_b_ids),
+            "team_a": list(team_a_ids),
+            "team_b": list(team_b_ids),
+            "clubs": list(clubs),
+        }
+        db = self.db.replica()
+        return {
+            "players": db.execute(PLAYER_LINES, params),
+            "teams": db.execute(TEAM_LINES, params),
+            "duos": db.execute(DUO_LINES, params),
+        }
+
+    def get_partner_stats(self, player_id: int, start_time: date):
+        print("[SERVICE] get_partner_stats executing")
+        return self.db.replica().execute(
+            PARTNER_STATS, {"player_id": player_id, "start_time": start_time}
+        )
+
+    def get_rival_stats(self, player_id: int, start_time: date):
+        print("[SERVICE] get_rival_stats executing")
+        return self.db.replica().execute(
+            RIVAL_STATS, {"player_id": player_id, "start_time": start_time}
+        )
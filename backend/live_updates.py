@@ -0,0 +1,283 @@
+# live_updates.py
+# Pushes recorded / deleted matches to /stream subscribers (Server-Sent Events)
+# as deltas: the match, the Elo of its players and the leaderboard lines it
+# changed, computed once per event and shared by every connected client.
+import asyncio
+import os
+import queue
+import select
+import threading
+from datetime import date
+from typing import Optional
+
+import orjson
+import psycopg2  # type: ignore
+
+from elo_service import INITIAL_ELO, PERSISTED_RATINGS, _clean
+from result_cache import dumps
+from statements import statement
+
+CHANNEL = "live_updates"
+# Undelivered messages per subscriber; a client that falls further behind
+# gets a single "reset" and is expected to refetch
+QUEUE_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+# A match's players, matched the way match_participants links them
+MATCH_PLAYERS = statement(
+    "live_match_players",
+    """
+    SELECT p.id, p.name, COALESCE(r.elo, %(initial)s) AS elo
+    FROM players p
+    LEFT JOIN elo_ratings r ON r.player_id = p.id
+    WHERE lower(btrim(translate(p.name, '{}()"', ''))) = ANY(%(names)s)
+    ORDER BY p.id ASC;
+    """,
+)
+# Is there a match after (time, id)? Then Elo changed beyond this match's players
+LATER_MATCH = statement(
+    "live_later_match",
+    "SELECT EXISTS (SELECT 1 FROM matches WHERE (time, id) > (%s, %s)) AS later;",
+)
+
+
+def sse(event: str, data) -> bytes:
+    """One Server-Sent Events message."""
+    return b"event: " + event.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+class LiveUpdates:
+    """
+    Writers publish small events: a match row with "added" / "deleted", or a
+    plain "reset" for changes that are not worth a delta (imports, K or club
+    rating changes, player edits). A dispatcher thread turns each event into
+    one payload per distinct start_time among the subscribers and hands it to
+    their queues, so a match costs the same few queries however many screens
+    are watching. Nothing runs until the first subscriber arrives.
+
+    Events travel through Postgres NOTIFY and every worker LISTENs, so
+    subscribers of any worker see writes made by the others, including the
+    Elo job's events, whichever process runs it. LIVE_NOTIFY=0 keeps events in
+    this process, for a single-process deployment.
+    """
+
+    def __init__(self, db, leaderboard_service, elo_service, elo_settings):
+        self.db = db
+        self.leaderboard_service = leaderboard_service
+        self.elo_service = elo_service
+        self.elo_settings = elo_settings
+        self.notify = os.getenv("LIVE_NOTIFY", "1") == "1"
+        self._lock = threading.Lock()
+        self._subscribers = {}  # asyncio.Queue -> (loop, start_time)
+        self._events = queue.Queue()
+        self._started = False
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    # ----------- Publishing -----------
+    def publish_match(self, action: str, match: dict) -> None:
+        self.publish({"type": "match", "action": action, "match": match})
+
+    def publish_reset(self) -> None:
+        self.publish({"type": "reset"})
+
+    def publish(self, event: dict) -> None:
+        self.published += 1
+        if self.notify:
+            # delivered by NOTIFY at commit, to every listening worker (this one
+            # too); best-effort, as the write it follows has already committed
+            try:
+                self.db.execute(
+                    "SELECT pg_notify(%s, %s);",
+                    (CHANNEL, orjson.dumps(event).decode()),
+                    commit=True,
+                )
+            except Exception as exc:
+                print(f"[LIVE] event not published: {exc}")
+        elif self._started:
+            self._events.put(event)
+
+    # ----------- Subscribers -----------
+    def subscribe(self, start_time: Optional[date]) -> asyncio.Queue:
+        """
+        A queue of ready-to-send SSE messages, with leaderboard lines for the
+        window from `start_time` (none when it is None).
+        """
+        self._start()
+        subscription = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[subscription] = (
+                asyncio.get_running_loop(),
+                start_time,
+            )
+        return subscription
+
+    def unsubscribe(self, subscription: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(subscription, None)
+
+    def stats(self):
+        with self._lock:
+            subscribers = len(self._subscribers)
+        return {
+            "subscribers": subscribers,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "notify": self.notify,
+        }
+
+    def _offer(self, subscription: asyncio.Queue, message: bytes) -> None:
+        # runs on the subscriber's event loop
+        try:
+            subscription.put_nowait(message)
+            self.delivered += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            while not subscription.empty():
+                subscription.get_nowait()
+            subscription.put_nowait(sse("reset", {}))
+
+    # ----------- Dispatch -----------
+    def _start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(
+            target=self._dispatch, name="live-dispatch", daemon=True
+        ).start()
+        if self.notify:
+            threading.Thread(
+                target=self._listen, name="live-listen", daemon=True
+            ).start()
+
+    def _listen(self) -> None:
+        """Forwards NOTIFY payloads to the dispatcher; reconnects on failure."""
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.db.connect_params())
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL};")
+                if connected_before:
+                    # anything published while disconnected was missed
+                    self._events.put({"type": "reset"})
+                connected_before = True
+                while True:
+                    if select.select([conn], [], [], HEARTBEAT_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._events.put(orjson.loads(conn.notifies.pop(0).payload))
+            except psycopg2.Error as exc:
+                print(f"[LIVE] listener reconnecting: {exc}")
+                threading.Event().wait(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _dispatch(self) -> None:
+        while True:
+            event = self._events.get()
+            with self._lock:
+                subscribers = list(self._subscribers.items())
+            if not subscribers:
+                continue
+            try:
+                # the event's write may not have reached the replicas yet
+                with self.db.primary():
+                    messages = self._messages(event, {s for _, (_, s) in subscribers})
+            except Exception as exc:  # never let one event stop the dispatcher
+                print(f"[LIVE] delta failed, sending reset: {exc}")
+                messages = {s: sse("reset", {}) for _, (_, s) in subscribers}
+            for subscription, (loop, start_time) in subscribers:
+                try:
+                    loop.call_soon_threadsafe(
+                        self._offer, subscription, messages[start_time]
+                    )
+                except RuntimeError:  # the subscriber's loop is gone
+                    self.unsubscribe(subscription)
+
+    def _messages(self, event: dict, start_times) -> dict:
+        """{start_time: SSE message} for one event."""
+        if event["type"] != "match":
+            return {s: sse("reset", {}) for s in start_times}
+
+        match = event["match"]
+        k = self.elo_settings.get_k_factor()
+        self.elo_service.ensure_current(k)
+        sides = {
+            side: [_key(n) for n in (match.get(side) or "").split(",") if _key(n)]
+            for side in ("team_a", "team_b")
+        }
+        names = sides["team_a"] + sides["team_b"]
+        players = {
+            _key(r["name"]): r
+            for r in self.db.execute(
+                MATCH_PLAYERS, {"names": names, "initial": INITIAL_ELO}
+            )
+        }
+        ids = {
+            side: [players[n]["id"] for n in side_names if n in players]
+            for side, side_names in sides.items()
+        }
+        later = self.db.execute(
+            LATER_MATCH, (match["time"], match["id"]), fetch_one=True
+        )["later"]
+        if later:
+            # back-dated: every later match was replayed
+            elo = [
+                {"playerId": r["player_id"], "elo": int(round(r["elo"]))}
+                for r in self.db.execute(PERSISTED_RATINGS, (INITIAL_ELO,))
+            ]
+        else:
+            elo = [
+                {"playerId": p["id"], "elo": int(round(p["elo"]))}
+                for p in players.values()
+            ]
+        clubs = [c for c in (match.get("club_a"), match.get("club_b")) if c]
+
+        messages = {}
+        for start_time in start_times:
+            messages[start_time] = sse(
+                "match",
+                {
+                    "action": event["action"],
+                    "match": match,
+                    "elo": elo,
+                    "leaderboards": start_time
+                    and self._lines(start_time, players, sides, ids, clubs),
+                },
+            )
+        return messages
+
+    def _lines(self, start_time, players, sides, ids, clubs) -> dict:
+        # rows replace the lines with these keys; a key without a row has no
+        # matches left in the window
+        lines = self.leaderboard_service.get_lines(
+            start_time, ids["team_a"], ids["team_b"], clubs
+        )
+        return {
+            "players": {
+                "keys": [p["name"] for p in players.values()],
+                "rows": lines["players"],
+            },
+            "teams": {"keys": clubs, "rows": lines["teams"]},
+            "duos": {"keys": _duo_keys(players, sides), "rows": lines["duos"]},
+        }
+
+
+def _key(name: str) -> str:
+    return _clean((name or "").replace('"', ""))
+
+
+def _duo_keys(players: dict, sides: dict) -> list:
+    # team_name as DUO_LEADERBOARD spells it: the two names in order
+    keys = []
+    for side_names in sides.values():
+        known = sorted(players[n]["name"] for n in side_names if n in players)
+        keys += [f"{a} & {b}" for i, a in enumerate(known) for b in known[i + 1 :]]
+    return keys
@@ -1,28 +1,94 @@
-from fastapi import FastAPI, Query, HTTPException  # type: ignore
+import asyncio
+import os
+import threading
+import time
+import psycopg2  # type: ignore
+from fastapi import Depends, FastAPI, Query, HTTPException, Request  # type: ignore
+from fastapi.responses import (  # type: ignore
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from pydantic import BaseModel, Field
-from datetime import date
+from datetime import date, datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware  # type: ignore
+from fastapi.middleware.gzip import GZipMiddleware  # type: ignore
+from fastapi.concurrency import run_in_threadpool  # type: ignore
 
-from database import Database
+from database import Database, PoolTimeoutError
 from player_service import PlayerService
 from club_service import ClubService
-from match_service import MatchService
+from match_service import MatchService, PAGE_SIZE, MAX_PAGE_SIZE
 from leaderboard_service import LeaderboardService
-from elo_service import EloService
+from live_updates import LiveUpdates, HEARTBEAT_SECONDS
+from elo_service import EloService, MAX_PREVIEW_LINEUPS
+from elo_batch import MAX_BATCH_K
 from elo_settings_service import EloSettingsService
+from rollup_service import RollupService
+from import_service import ImportService, MatchImportError
+from job_queue import JobQueue
+from matchmaking_service import MatchmakingService, DEFAULT_TOP, MAX_TOP
+from bootstrap_service import BootstrapService, RECENT_MATCHES, MAX_RECENT_MATCHES
+from migrations import SchemaVersionError
+from result_cache import cached_json
+from query_stats import gauges, track_request
+from statements import registry as statements
+from dependencies import (
+    query_stats,
+    result_cache,
+    get_db,
+    get_player_service,
+    get_club_service,
+    get_leaderboard_service,
+    get_elo_settings_service,
+    get_elo_service,
+    get_rollup_service,
+    get_match_service,
+    get_import_service,
+    get_matchmaking_service,
+    get_bootstrap_service,
+    get_live_updates,
+    get_job_queue,
+    get_match_snapshot,
+    refresh_snapshot,
+    start_cache_listener,
+    start_job_workers,
+    close_adb,
+    peek_adb,
+)
 
+# Services are built on first use (dependencies.py): importing this module
+# neither connects nor runs DDL. The schema is applied with
+# `python -m migrations`; the first request checks its version.
 app = FastAPI()
 
-# Database & services
-db = Database()
-player_service = PlayerService(db)
-club_service = ClubService(db)
-match_service = MatchService(db)
-leaderboard_service = LeaderboardService(db)
+# DB_BACKEND=async serves the request-path routes from async handlers on a
+# psycopg 3 pool (async_routes.py); the default "sync" keeps the handlers below.
+DB_BACKEND = os.getenv("DB_BACKEND", "sync")
+if DB_BACKEND == "async":
+    from async_routes import build_router
+
+    app.on_event("shutdown")(close_adb)
+    app.include_router(build_router(result_cache))
+
+
+@app.on_event("startup")
+def start_jobs():
+    # in the background: startup must not wait for (or fail without) the database
+    threading.Thread(target=start_job_workers, name="jobs-start", daemon=True).start()
+    # other processes' writes invalidate this one's cached responses
+    start_cache_listener()
+
+
+@app.on_event("shutdown")
+def close_db():
+    jobs = get_job_queue.peek()
+    if jobs is not None:
+        jobs.stop()
+    db = get_db.peek()
+    if db is not None:
+        db.close()
 
-# New: K-factor settings service + Elo compute service
-elo_settings_service = EloSettingsService(db)
-elo_service = EloService(db)
 
 # CORS
 app.add_middleware(
@@ -31,83 +97,431 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-DB-Queries"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
+@app.middleware("http")
+async def query_timing(request: Request, call_next):
+    """Server-Timing / X-DB-Queries: database time and statements per request
+    (streamed bodies only count what ran before the headers were sent)."""
+    started = time.perf_counter()
+    with track_request() as totals:
+        response = await call_next(request)
+    total_ms = 1000 * (time.perf_counter() - started)
+    response.headers["Server-Timing"] = (
+        f'db;dur={1000 * totals[1]:.2f};desc="{totals[0]} queries", '
+        f"app;dur={total_ms:.2f}"
+    )
+    response.headers["X-DB-Queries"] = str(totals[0])
+    return response
+
+
+@app.exception_handler(PoolTimeoutError)
+def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+@app.exception_handler(psycopg2.OperationalError)
+def database_unavailable_handler(request: Request, exc: psycopg2.OperationalError):
+    # e.g. unreachable at first use; the next request tries again
+    return JSONResponse(status_code=503, content={"detail": "database unavailable"})
+
+
+@app.exception_handler(SchemaVersionError)
+def schema_version_handler(request: Request, exc: SchemaVersionError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+# ----------- Bootstrap -----------
+@app.get("/bootstrap")
+def get_bootstrap(
+    request: Request,
+    recent: int = Query(default=RECENT_MATCHES, ge=1, le=MAX_RECENT_MATCHES),
+    bootstrap_service: BootstrapService = Depends(get_bootstrap_service),
+):
+    """
+    Players (with Elo), clubs, K-factor and the latest `recent` matches in one
+    response; older matches are paged with nextCursor via /matches/page.
+    """
+    return cached_json(
+        result_cache,
+        request,
+        ("bootstrap", None, recent),
+        lambda: bootstrap_service.snapshot(recent),
+    )
 
 
 # ----------- Player Routes -----------
 @app.get("/players")
-def get_players():
+def get_players(player_service: PlayerService = Depends(get_player_service)):
     return player_service.get_players()
 
 
 @app.post("/players")
-def add_player(player: dict):
+def add_player(
+    player: dict,
+    player_service: PlayerService = Depends(get_player_service),
+    elo_service: EloService = Depends(get_elo_service),
+    rollup_service: RollupService = Depends(get_rollup_service),
+    match_service: MatchService = Depends(get_match_service),
+    live_updates: LiveUpdates = Depends(get_live_updates),
+):
     name = player.get("name")
     if not name or not str(name).strip():
         raise HTTPException(status_code=400, detail="name is required")
     player_service.add_player(name)
+    match_service.backfill_participants(player_name=name)
+    rollup_service.apply_player(name)
+    elo_service.invalidate()
+    result_cache.bump()
+    live_updates.publish_reset()
+    refresh_snapshot()
     return {"message": f"Player {name} added successfully."}
 
 
 # ----------- Club Routes -----------
 @app.get("/clubs")
-def get_clubs():
+def get_clubs(club_service: ClubService = Depends(get_club_service)):
     return club_service.get_clubs()
 
 
 # ----------- Match Routes -----------
 @app.get("/matches")
-def get_matches():
+def get_matches(match_service: MatchService = Depends(get_match_service)):
     return match_service.get_matches()
 
 
+@app.get("/matches/page")
+def get_matches_page(
+    limit: int = Query(default=PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    player_id: int | None = None,
+    club: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    match_service: MatchService = Depends(get_match_service),
+):
+    """Newest-first page; pass the returned nextCursor to get the next one."""
+    try:
+        return match_service.get_matches_page(
+            limit, cursor, player_id=player_id, club=club, start=start, end=end
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/matches/export")
+def export_matches(
+    format: str = Query(default="ndjson", pattern="^(csv|ndjson)$"),
+    player_id: int | None = None,
+    club: str | None = None,
+    start: date | None = None,
+    end: date | None = None,
+    match_service: MatchService = Depends(get_match_service),
+):
+    """Oldest-first stream of every matching row; memory use stays flat."""
+    lines = match_service.export_matches(
+        format, player_id=player_id, club=club, start=start, end=end
+    )
+    if format == "csv":
+        return StreamingResponse(
+            lines,
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="matches.csv"'},
+        )
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
 @app.post("/matches")
-def add_match(match: dict):
+def add_match(match: dict, match_service: MatchService = Depends(get_match_service)):
     clubA = match.get("clubA")
     clubB = match.get("clubB")
     teamA = match.get("teamA")
     teamB = match.get("teamB")
     scoreA = match.get("scoreA")
     scoreB = match.get("scoreB")
-    match_service.add_match(clubA, clubB, teamA, teamB, scoreA, scoreB)
-    return {"message": "Match added successfully."}
+    created = match_service.add_match(clubA, clubB, teamA, teamB, scoreA, scoreB)
+    result_cache.bump()
+    return {"message": "Match added successfully.", "match": created}
+
+
+@app.post("/admin/matches/import")
+async def import_matches(
+    request: Request,
+    format: str | None = Query(default=None, pattern="^(csv|ndjson)$"),
+    batch_size: int | None = Query(default=None, ge=1, le=100_000),
+    import_service: ImportService = Depends(get_import_service),
+    live_updates: LiveUpdates = Depends(get_live_updates),
+):
+    """
+    Bulk import from a CSV (header row) or NDJSON request body. Format comes
+    from ?format= or the Content-Type. All rows are validated before any
+    are written; the response reports rows/sec.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    body = (await request.body()).decode("utf-8-sig")
+    try:
+        result = await run_in_threadpool(
+            import_service.import_matches, body.splitlines(), format, batch_size
+        )
+    except MatchImportError as exc:
+        raise HTTPException(
+            status_code=400, detail={"message": str(exc), "errors": exc.errors}
+        )
+    result_cache.bump()
+    await run_in_threadpool(live_updates.publish_reset)
+    await run_in_threadpool(refresh_snapshot)
+    return result
 
 
 # ----------- Leaderboard Routes -----------
 @app.get("/leaderboard/players")
-def get_players_lb(start_time: date = Query(...)):
-    return leaderboard_service.get_player_leaderboard(start_time)
+def get_players_lb(
+    request: Request,
+    start_time: date = Query(...),
+    leaderboard_service: LeaderboardService = Depends(get_leaderboard_service),
+):
+    return cached_json(
+        result_cache,
+        request,
+        ("leaderboard/players", start_time, None),
+        lambda: leaderboard_service.get_player_leaderboard(start_time),
+    )
 
 
 @app.get("/leaderboard/teams")
-def get_teams_lb(start_time: date = Query(...)):
-    return leaderboard_service.get_team_leaderboard(start_time)
+def get_teams_lb(
+    request: Request,
+    start_time: date = Query(...),
+    leaderboard_service: LeaderboardService = Depends(get_leaderboard_service),
+):
+    return cached_json(
+        result_cache,
+        request,
+        ("leaderboard/teams", start_time, None),
+        lambda: leaderboard_service.get_team_leaderboard(start_time),
+    )
 
 
 @app.get("/leaderboard/duos")
-def get_duos_lb(start_time: date = Query(...)):
-    return leaderboard_service.get_duo_leaderboard(start_time)
+def get_duos_lb(
+    request: Request,
+    start_time: date = Query(...),
+    leaderboard_service: LeaderboardService = Depends(get_leaderboard_service),
+):
+    return cached_json(
+        result_cache,
+        request,
+        ("leaderboard/duos", start_time, None),
+        lambda: leaderboard_service.get_duo_leaderboard(start_time),
+    )
+
+
+@app.get("/leaderboard/all")
+def get_all_lb(
+    request: Request,
+    start_time: date = Query(...),
+    leaderboard_service: LeaderboardService = Depends(get_leaderboard_service),
+):
+    return cached_json(
+        result_cache,
+        request,
+        ("leaderboard/all", start_time, None),
+        lambda: {
+            "players": leaderboard_service.get_player_leaderboard(start_time),
+            "teams": leaderboard_service.get_team_leaderboard(start_time),
+            "duos": leaderboard_service.get_duo_leaderboard(start_time),
+        },
+    )
+
+
+# ----------- Pair Stats -----------
+@app.get("/stats/partners")
+def get_partner_stats(
+    request: Request,
+    player: int = Query(...),
+    start_time: date = date(2000, 1, 1),
+    leaderboard_service: LeaderboardService = Depends(get_leaderboard_service),
+):
+    return cached_json(
+        result_cache,
+        request,
+        ("stats/partners", start_time, player),
+        lambda: leaderboard_service.get_partner_stats(player, start_time),
+    )
+
+
+@app.get("/stats/rivals")
+def get_rival_stats(
+    request: Request,
+    player: int = Query(...),
+    start_time: date = date(2000, 1, 1),
+    leaderboard_service: LeaderboardService = Depends(get_leaderboard_service),
+):
+    return cached_json(
+        result_cache,
+        request,
+        ("stats/rivals", start_time, player),
+        lambda: leaderboard_service.get_rival_stats(player, start_time),
+    )
 
 
 # ----------- Admin Routes -----------
 @app.get("/admin/players")
-def get_all_players():
+def get_all_players(player_service: PlayerService = Depends(get_player_service)):
     return player_service.get_players()
 
 
 @app.delete("/admin/player/{player_id}")
-def delete_player(player_id: int):
-    return player_service.delete_player(player_id)
+def delete_player(
+    player_id: int,
+    player_service: PlayerService = Depends(get_player_service),
+    elo_service: EloService = Depends(get_elo_service),
+    live_updates: LiveUpdates = Depends(get_live_updates),
+):
+    # the player's rollup rows go with it (ON DELETE CASCADE)
+    result = player_service.delete_player(player_id)
+    elo_service.invalidate()
+    result_cache.bump()
+    live_updates.publish_reset()
+    refresh_snapshot()
+    return result
 
 
 @app.get("/admin/matches")
-def get_all_matches():
+def get_all_matches(match_service: MatchService = Depends(get_match_service)):
     return match_service.get_matches()
 
 
 @app.delete("/admin/match/{match_id}")
-def delete_match(match_id: int):
-    return match_service.delete_match(match_id)
+def delete_match(
+    match_id: int, match_service: MatchService = Depends(get_match_service)
+):
+    result = match_service.delete_match(match_id)
+    result_cache.bump()
+    return result
+
+
+class ClubEloUpdate(BaseModel):
+    elo: int = Field(..., ge=0, le=3000)
+
+
+@app.put("/admin/club/{club_id}")
+def update_club_elo(
+    club_id: int,
+    payload: ClubEloUpdate,
+    club_service: ClubService = Depends(get_club_service),
+    elo_settings_service: EloSettingsService = Depends(get_elo_settings_service),
+    elo_service: EloService = Depends(get_elo_service),
+    matchmaking_service: MatchmakingService = Depends(get_matchmaking_service),
+    live_updates: LiveUpdates = Depends(get_live_updates),
+):
+    club = club_service.set_elo(club_id, payload.elo)
+    if not club:
+        raise HTTPException(status_code=404, detail="club not found")
+    # club ratings feed every match's expected score
+    matchmaking_service.club_index.invalidate()
+    elo_service.rebuild(elo_settings_service.get_k_factor())
+    result_cache.bump()
+    live_updates.publish_reset()
+    refresh_snapshot()
+    return club
+
+
+@app.get("/admin/db/pool")
+def get_pool_stats(db: Database = Depends(get_db)):
+    return db.stats()
+
+
+@app.get("/admin/cache")
+def get_cache_stats():
+    return result_cache.stats()
+
+
+@app.get("/admin/live")
+def get_live_stats(live_updates: LiveUpdates = Depends(get_live_updates)):
+    return live_updates.stats()
+
+
+@app.get("/admin/jobs")
+def get_job_status(
+    status: str | None = Query(default=None, pattern="^(pending|running|done|failed)$"),
+    limit: int = Query(default=20, ge=1, le=500),
+    jobs: JobQueue = Depends(get_job_queue),
+):
+    """Background jobs by kind and status, and the latest `limit` jobs."""
+    return jobs.status(status, limit)
+
+
+@app.get("/admin/snapshot")
+def get_snapshot_status():
+    """The analytics snapshot's file, row counts and freshness."""
+    snapshot = get_match_snapshot()
+    if snapshot is None:
+        return {"enabled": False}
+    return {"enabled": True, "fresh": snapshot.fresh(), **snapshot.stats()}
+
+
+@app.get("/admin/db/queries")
+def get_query_stats(limit: int = Query(default=50, ge=1, le=500)):
+    """Statements by total time (with their SQL) and the slow-query log."""
+    return query_stats.summary(limit)
+
+
+@app.get("/admin/db/statements")
+def get_statement_stats():
+    """Named statements: prepared vs text calls, client time and, with
+    DB_PLAN_SAMPLE_SECONDS set, the sampled server planning / execution time."""
+    return statements.summary()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    # pool gauges only once a pool exists; scraping never opens one
+    pool = peek_adb() if DB_BACKEND == "async" else get_db.peek()
+    return PlainTextResponse(
+        query_stats.prometheus()
+        + (gauges("db_pool_", pool.stats()) if pool is not None else "")
+        + gauges("result_cache_", result_cache.stats()),
+        media_type="text/plain; version=0.0.4",
+    )
+
+
+# ----------- Live updates -----------
+@app.get("/stream")
+async def stream(
+    start_time: date | None = None,
+    live_updates: LiveUpdates = Depends(get_live_updates),
+):
+    """
+    Server-Sent Events. `match` events carry an added / deleted match, the
+    new Elo of its players (everyone's when it was back-dated) and, with
+    ?start_time=, the leaderboard lines it changed in that window. `reset`
+    means refetch everything (imports, K or club changes, or a client that
+    fell too far behind).
+    """
+    subscription = live_updates.subscribe(start_time)
+
+    async def events():
+        try:
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keep-alive\n\n"
+        finally:
+            live_updates.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ----------- ELO Settings & Ratings -----------
@@ -116,23 +530,235 @@ class EloSettingsUpdate(BaseModel):
 
 
 @app.get("/settings/elo")
-def get_elo_settings():
+def get_elo_settings(
+    elo_settings_service: EloSettingsService = Depends(get_elo_settings_service),
+):
     return {"kFactor": elo_settings_service.get_k_factor()}
 
 
 @app.put("/settings/elo")
-def update_elo_settings(payload: EloSettingsUpdate):
+def update_elo_settings(
+    payload: EloSettingsUpdate,
+    elo_settings_service: EloSettingsService = Depends(get_elo_settings_service),
+    elo_service: EloService = Depends(get_elo_service),
+    live_updates: LiveUpdates = Depends(get_live_updates),
+):
     k = payload.kFactor
     elo_settings_service.set_k_factor(k)
+    elo_service.rebuild(k)
+    result_cache.bump()
+    live_updates.publish_reset()
     return {"kFactor": k}
 
 
 @app.get("/elo")
-def get_elo(k: int | None = Query(default=None, ge=1, le=200)):
+def get_elo(
+    request: Request,
+    k: int | None = Query(default=None, ge=1, le=200),
+    as_of: datetime | None = None,
+    elo_settings_service: EloSettingsService = Depends(get_elo_settings_service),
+    elo_service: EloService = Depends(get_elo_service),
+):
+    """
+    Returns current ratings from the persisted Elo state.
+    Optional ?k=NN overrides the stored K-factor for this calculation only
+    (full replay, nothing is persisted).
+    Optional ?as_of= returns ratings after the last match at or before that
+    time, read from the Elo history (stored K only).
+    """
+
+    def compute():
+        stored_k = elo_settings_service.get_k_factor()
+        if as_of is not None:
+            if k is not None and k != stored_k:
+                raise HTTPException(
+                    status_code=400, detail="as_of is only available for the stored K"
+                )
+            ratings = elo_service.get_ratings_as_of(stored_k, as_of)
+        elif k is None or k == stored_k:
+            ratings = elo_service.get_ratings(k_factor=stored_k)
+        else:
+            ratings = elo_service.compute_ratings(k_factor=k)
+        return {
+            "ratings": [{"playerId": pid, "elo": elo} for pid, elo in ratings.items()]
+        }
+
+    return cached_json(result_cache, request, ("elo", as_of, k), compute)
+
+
+@app.get("/elo/history")
+def get_elo_history(
+    request: Request,
+    player: int = Query(...),
+    start: date | None = Query(default=None, alias="from"),
+    end: date | None = Query(default=None, alias="to"),
+    elo_settings_service: EloSettingsService = Depends(get_elo_settings_service),
+    elo_service: EloService = Depends(get_elo_service),
+):
+    """
+    Per-match rating changes for one player under the stored K, oldest
+    first. `from` / `to` are inclusive dates.
+    """
+
+    def compute():
+        stored_k = elo_settings_service.get_k_factor()
+        rows = elo_service.get_history(
+            stored_k,
+            player,
+            datetime.combine(start or date.min, datetime.min.time()),
+            (
+                datetime.combine(end + timedelta(days=1), datetime.min.time())
+                if end
+                else datetime.max
+            ),
+        )
+        return {
+            "playerId": player,
+            "kFactor": stored_k,
+            "history": [
+                {
+                    "matchId": r["match_id"],
+                    "time": r["match_time"],
+                    "before": round(r["elo_before"], 2),
+                    "after": round(r["elo_after"], 2),
+                    "delta": round(r["elo_after"] - r["elo_before"], 2),
+                    "expected": round(r["expected"], 4),
+                    "multiplier": round(r["multiplier"], 4),
+                }
+                for r in rows
+            ],
+        }
+
+    return cached_json(
+        result_cache, request, ("elo/history", (start, end), player), compute
+    )
+
+
+@app.get("/elo/batch")
+def get_elo_batch(
+    request: Request,
+    k: list[int] | None = Query(default=None),
+    k_min: int | None = Query(default=None, ge=1, le=200),
+    k_max: int | None = Query(default=None, ge=1, le=200),
+    k_step: int = Query(default=1, ge=1),
+    M_max: float | None = Query(default=None, gt=0),
+    power: float | None = Query(default=None, gt=0),
+    upset_scale: float | None = Query(default=None, ge=0),
+    elo_service: EloService = Depends(get_elo_service),
+):
+    """
+    What-if ratings for many K values in one pass, with per-K log-loss/Brier.
+    e.g. /elo/batch?k=16&k=24&k=32 or /elo/batch?k_min=8&k_max=64&k_step=4
+    Optional M_max / power / upset_scale override the m_upset_bonus defaults.
+    """
+    k_values = set(k or [])
+    if k_min is not None and k_max is not None:
+        k_values.update(range(k_min, k_max + 1, k_step))
+    k_values = sorted(k_values)
+    if not k_values:
+        raise HTTPException(status_code=400, detail="provide k or k_min and k_max")
+    if len(k_values) > MAX_BATCH_K or not all(1 <= v <= 200 for v in k_values):
+        raise HTTPException(
+            status_code=400,
+            detail=f"at most {MAX_BATCH_K} K values, each between 1 and 200",
+        )
+
+    bonus = {
+        name: value
+        for name, value in (
+            ("M_max", M_max),
+            ("power", power),
+            ("upset_scale", upset_scale),
+        )
+        if value is not None
+    }
+    key = ("elo/batch", None, (tuple(k_values), tuple(sorted(bonus.items()))))
+    return cached_json(
+        result_cache,
+        request,
+        key,
+        lambda: {"results": elo_service.compute_ratings_batch(k_values, bonus)},
+    )
+
+
+class LineupPreview(BaseModel):
+    # same keys as POST /matches
+    teamA: list[str] = Field(..., min_length=1, max_length=11)
+    teamB: list[str] = Field(..., min_length=1, max_length=11)
+    clubA: str | None = None
+    clubB: str | None = None
+
+
+class LineupPreviewBatch(BaseModel):
+    lineups: list[LineupPreview] = Field(
+        ..., min_length=1, max_length=MAX_PREVIEW_LINEUPS
+    )
+
+
+def _preview(lineups, elo_settings_service, elo_service):
+    try:
+        return elo_service.preview(
+            elo_settings_service.get_k_factor(), [l.model_dump() for l in lineups]
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.post("/elo/preview")
+def preview_elo(
+    lineup: LineupPreview,
+    elo_settings_service: EloSettingsService = Depends(get_elo_settings_service),
+    elo_service: EloService = Depends(get_elo_service),
+):
+    """
+    Win probability of a proposed lineup under the current ratings (stored K),
+    and each side's rating change for every goal difference within
+    PREVIEW_MAX_MARGIN, with the m_upset_bonus multiplier. Nothing is saved.
+    """
+    return _preview([lineup], elo_settings_service, elo_service)[0]
+
+
+@app.post("/elo/preview/batch")
+def preview_elo_batch(
+    payload: LineupPreviewBatch,
+    elo_settings_service: EloSettingsService = Depends(get_elo_settings_service),
+    elo_service: EloService = Depends(get_elo_service),
+):
+    """/elo/preview for many candidate lineups, in the same number of queries."""
+    return {"results": _preview(payload.lineups, elo_settings_service, elo_service)}
+
+
+# ----------- Matchmaking -----------
+@app.get("/matchmaking/teams")
+def get_balanced_teams(
+    player_ids: list[int] = Query(...),
+    mode: str = Query(default="2v2", pattern="^(1v1|1v2|2v2)$"),
+    top: int = Query(default=DEFAULT_TOP, ge=1, le=MAX_TOP),
+    avoid_repeat: bool = True,
+    matchmaking_service: MatchmakingService = Depends(get_matchmaking_service),
+):
+    """
+    Top-N most Elo-balanced splits of the selected players. With avoid_repeat,
+    nobody is paired with a teammate from their last match.
+    """
+    try:
+        return matchmaking_service.balanced_teams(player_ids, mode, top, avoid_repeat)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@app.get("/matchmaking/clubs")
+def get_club_pairs(
+    gap: float = 0.0,
+    margin: float = Query(default=0.0, ge=0),
+    seed: int | None = None,
+    matchmaking_service: MatchmakingService = Depends(get_matchmaking_service),
+):
     """
-    Returns current ratings computed from matches.
-    Optional ?k=NN overrides the stored K-factor for this calculation only.
+    Club pairing for teams whose average Elo differs by `gap` (A - B): a
+    random pick among pairings within `margin`, else the closest one.
     """
-    k_to_use = k if k is not None else elo_settings_service.get_k_factor()
-    ratings = elo_service.compute_ratings(k_factor=k_to_use)
-    return {"ratings": [{"playerId": pid, "elo": elo} for pid, elo in ratings.items()]}
+    try:
+        return matchmaking_service.club_pairs(gap, margin, seed)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
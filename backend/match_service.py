@@ -1,22 +1,266 @@
+import base64
+import binascii
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+
+from statements import statement
+
+# Expands matches.team_a / team_b ("{a,b}" text) into match_participants rows.
+# Names are compared the same way EloService._clean does (case-insensitive,
+# braces/parentheses stripped), plus the quotes Postgres adds around names
+# with spaces. Callers append a WHERE clause restricting matches and/or players.
+PARTICIPANTS_FROM_TEAMS = """
+INSERT INTO match_participants (match_id, player_id, side)
+SELECT m.id, p.id, t.side
+FROM matches m
+CROSS JOIN LATERAL (
+    SELECT 'A' AS side, unnest(string_to_array(m.team_a, ',')) AS raw
+    UNION ALL
+    SELECT 'B' AS side, unnest(string_to_array(m.team_b, ',')) AS raw
+) t
+JOIN players p
+  ON lower(btrim(translate(p.name, '{}()"', '')))
+   = lower(btrim(translate(t.raw, '{}()"', '')))
+"""
+
+INSERT_MATCH = statement(
+    "insert_match",
+    """
+INSERT INTO matches (club_a, club_b, team_a, team_b, score_a, score_b)
+VALUES (%s, %s, %s, %s, %s, %s)
+RETURNING *;
+""",
+)
+MATCH_PARTICIPANTS = statement(
+    "insert_match_participants",
+    PARTICIPANTS_FROM_TEAMS + "WHERE m.id = %s ON CONFLICT DO NOTHING;",
+)
+DELETE_MATCH = statement(
+    "delete_match", "DELETE FROM matches WHERE id = %s RETURNING *;"
+)
+GET_MATCHES = statement("get_matches", "SELECT * FROM matches ORDER BY time DESC;")
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+EXPORT_COLUMNS = (
+    "id",
+    "time",
+    "club_a",
+    "club_b",
+    "team_a",
+    "team_b",
+    "score_a",
+    "score_b",
+)
+
+
+def encode_cursor(match: dict) -> str:
+    """Opaque token for the (time, id) position of `match`."""
+    raw = json.dumps([match["time"].isoformat(), match["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str):
+    """(time, id) from encode_cursor(); ValueError if the token is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        time_value, match_id = json.loads(raw)
+        return datetime.fromisoformat(time_value), int(match_id)
+    except (TypeError, ValueError, binascii.Error) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def match_filters(player_id=None, club=None, start=None, end=None):
+    """
+    WHERE clause and params for the listing / export filters.
+    `start` and `end` are dates; both are inclusive.
+    """
+    clauses, params = [], {}
+    if player_id is not None:
+        clauses.append(
+            "EXISTS (SELECT 1 FROM match_participants mp"
+            " WHERE mp.match_id = m.id AND mp.player_id = %(player_id)s)"
+        )
+        params["player_id"] = player_id
+    if club is not None:
+        clauses.append("(m.club_a = %(club)s OR m.club_b = %(club)s)")
+        params["club"] = club
+    if start is not None:
+        clauses.append("m.time >= %(start)s")
+        params["start"] = start
+    if end is not None:
+        clauses.append("m.time < %(end)s")
+        params["end"] = end + timedelta(days=1)
+    return clauses, params
+
+
+def page_query(limit, cursor=None, **filters):
+    """
+    Newest-first keyset page over idx_matches_time_id. Fetches one extra row
+    so the caller can tell whether there is a next page.
+    """
+    clauses, params = match_filters(**filters)
+    if cursor:
+        clauses.append("(m.time, m.id) < (%(cursor_time)s, %(cursor_id)s)")
+        params["cursor_time"], params["cursor_id"] = decode_cursor(cursor)
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    params["limit"] = limit + 1
+    query = f"""
+    SELECT m.* FROM matches m
+    {where}
+    ORDER BY m.time DESC, m.id DESC
+    LIMIT %(limit)s;
+    """
+    return query, params
+
+
+def page_result(rows, limit) -> dict:
+    items = rows[:limit]
+    has_more = len(rows) > limit
+    return {
+        "items": items,
+        "nextCursor": encode_cursor(items[-1]) if has_more else None,
+    }
+
+
+def export_query(**filters):
+    clauses, params = match_filters(**filters)
+    where = "WHERE " + " AND ".join(clauses) if clauses else ""
+    query = f"""
+    SELECT {", ".join("m." + c for c in EXPORT_COLUMNS)} FROM matches m
+    {where}
+    ORDER BY m.time ASC, m.id ASC;
+    """
+    return query, params
+
+
+def export_lines(rows, fmt: str):
+    """
+    Serializes rows one line at a time as NDJSON or CSV (with header). The CSV
+    keeps the stored team form, so it can be fed back to the bulk import.
+    """
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(
+                [
+                    row["time"].isoformat() if c == "time" else row[c]
+                    for c in EXPORT_COLUMNS
+                ]
+            )
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        yield buf.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(
+                {
+                    c: row["time"].isoformat() if c == "time" else row[c]
+                    for c in EXPORT_COLUMNS
+                }
+            ) + "\n"
+
+
+def elo_change(action: str, match: dict) -> dict:
+    """One item of an "elo" job (see EloService.apply_changes)."""
+    return {"action": action, "match": match}
+
+
 class MatchService:
-    def __init__(self, db):
+    """
+    With a job queue, Elo (and what follows from it: live updates, cache
+    warm-up) is updated by an "elo" job enqueued in the write's transaction,
+    so writes return without waiting for it. Without one, elo_service is
+    updated inline as before.
+    """
+
+    def __init__(self, db, elo_service=None, rollup_service=None, jobs=None):
         self.db = db
+        self.elo_service = elo_service
+        self.rollup_service = rollup_service
+        self.jobs = jobs
 
     def add_match(self, club_a, club_b, team_a, team_b, score_a, score_b):
-        query = """
-        INSERT INTO matches (club_a, club_b, team_a, team_b, score_a, score_b)
-        VALUES (%s, %s, %s, %s, %s, %s);
+        with self.db.transaction() as tx:
+            match = tx.execute(
+                INSERT_MATCH,
+                (club_a, club_b, team_a, team_b, score_a, score_b),
+                fetch_one=True,
+            )
+            tx.execute(
+                MATCH_PARTICIPANTS,
+                (match["id"],),
+                commit=True,
+            )
+            if self.rollup_service:
+                self.rollup_service.apply_match(tx, match["id"], 1)
+            self._enqueue_elo(tx, "added", match)
+        self._update_elo("added", match)
+        return match
+
+    def backfill_participants(self, player_name=None):
         """
-        self.db.execute(
-            query, (club_a, club_b, team_a, team_b, score_a, score_b), commit=True
-        )
+        Fills match_participants from the team text columns.
+        With player_name, only that player's rows are (re)linked, e.g. after
+        adding a player whose name already appears in recorded matches.
+        """
+        if player_name is None:
+            query = (
+                PARTICIPANTS_FROM_TEAMS
+                + """
+            WHERE NOT EXISTS (
+                SELECT 1 FROM match_participants mp WHERE mp.match_id = m.id
+            )
+            ON CONFLICT DO NOTHING;
+            """
+            )
+            self.db.execute(query, commit=True)
+        else:
+            query = (
+                PARTICIPANTS_FROM_TEAMS + "WHERE p.name = %s ON CONFLICT DO NOTHING;"
+            )
+            self.db.execute(query, (player_name,), commit=True)
 
     def get_matches(self):
-        return self.db.execute(
-            "SELECT * FROM matches ORDER BY time DESC;", fetch_one=False
-        )
+        return self.db.replica().execute(GET_MATCHES, fetch_one=False)
+
+    def get_matches_page(self, limit=PAGE_SIZE, cursor=None, **filters):
+        """
+        {"items": [...], "nextCursor": token or None}, newest first.
+        Filters: player_id, club, start, end (see match_filters).
+        """
+        query, params = page_query(limit, cursor, **filters)
+        return page_result(self.db.replica().execute(query, params), limit)
+
+    def export_matches(self, fmt="ndjson", **filters):
+        """Yields export lines (see export_lines) from a server-side cursor."""
+        query, params = export_query(**filters)
+        return export_lines(self.db.replica().stream(query, params), fmt)
 
     def delete_match(self, match_id):
-        query = "DELETE FROM matches WHERE id = %s;"
-        self.db.execute(query, (match_id,), commit=True)
+        # match_participants rows go with it (ON DELETE CASCADE)
+        with self.db.transaction() as tx:
+            if self.rollup_service:
+                self.rollup_service.apply_match(tx, match_id, -1)
+            match = tx.execute(DELETE_MATCH, (match_id,), fetch_one=True)
+            if match:
+                self._enqueue_elo(tx, "deleted", match)
+        if match:
+            self._update_elo("deleted", match)
         return {"message": f"Match with ID {match_id} deleted successfully."}
+
+    def _enqueue_elo(self, tx, action, match):
+        if self.jobs:
+            self.jobs.enqueue("elo", [elo_change(action, match)], key="elo", tx=tx)
+
+    def _update_elo(self, action, match):
+        # after commit: wake the job workers, or update Elo inline without them
+        if self.jobs:
+            self.jobs.wake()
+        elif self.elo_service:
+            self.elo_service.apply_changes([elo_change(action, match)])
@@ -0,0 +1,500 @@
+# match_snapshot.py
+# The match history as a columnar Arrow IPC file, memory-mapped by the API
+# process, so the leaderboards and Elo history can be computed with vectorized
+# numpy scans instead of SQL over the text team columns:
+#
+#     cd backend
+#     python -m match_snapshot export --out /var/lib/fifa/matches.arrow
+#     python -m match_snapshot export --out h.arrow --parquet h.parquet
+#
+# The API uses it when ANALYTICS_SNAPSHOT names the file. Queries fall back to
+# SQL while the file's data version (the data_version counter it was exported
+# at) is behind the database's, and meanwhile the process rewrites the file in
+# the background. The file is per host: each host notices the new version and
+# rewrites its own copy, and processes on one host share it (a lock file lets
+# one of them export at a time).
+import argparse
+import fcntl
+import os
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from itertools import combinations
+from typing import List, Optional
+
+import numpy as np  # type: ignore
+import orjson
+
+from elo_service import DEFAULT_CLUB_ELO, FETCH_CLUBS, _clean, _team_ids, club_ratings
+from statements import statement
+
+# Columns, one row per match in (time, id) order. Team members are player ids:
+# team_a / team_b as match_participants links them (leaderboards), elo_a /
+# elo_b as EloService resolves the team text (its name matching leaves out
+# quoted names), so replays here reproduce /elo. Clubs are indices into the
+# "clubs" metadata list, -1 for none.
+SNAPSHOT_MATCHES = """
+SELECT m.id, m.time, m.club_a, m.club_b,
+       COALESCE(m.score_a, 0) AS score_a, COALESCE(m.score_b, 0) AS score_b,
+       m.team_a AS team_a_text, m.team_b AS team_b_text,
+       COALESCE(
+           array_agg(mp.player_id ORDER BY mp.player_id) FILTER (WHERE mp.side = 'A'),
+           '{}'
+       ) AS team_a,
+       COALESCE(
+           array_agg(mp.player_id ORDER BY mp.player_id) FILTER (WHERE mp.side = 'B'),
+           '{}'
+       ) AS team_b
+FROM matches m
+LEFT JOIN match_participants mp ON mp.match_id = m.id
+GROUP BY m.id
+ORDER BY m.time ASC, m.id ASC;
+"""
+# In name order, which is how the duo leaderboard orders a pair
+SNAPSHOT_PLAYERS = "SELECT id, name FROM players ORDER BY name ASC;"
+
+# Bumped by every write to players, clubs, matches and match_participants
+# once track_writes() has installed the triggers (migrations.DATA_VERSION).
+# Statement-level: one bump per statement, however many rows it touched.
+DATA_VERSION = statement(
+    "data_version", "SELECT version FROM data_version WHERE id = 1;"
+)
+TRACKED_TABLES = ("players", "clubs", "matches", "match_participants")
+TRACKED = statement(
+    "data_version_tracked",
+    """
+SELECT COUNT(*) = %s AS tracked FROM pg_trigger
+WHERE tgname = 'bump_data_version' AND NOT tgisinternal;
+""",
+)
+TRACK_WRITES = """
+DO $$
+DECLARE t TEXT;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('bump_data_version'));
+    FOREACH t IN ARRAY ARRAY['players', 'clubs', 'matches', 'match_participants']
+    LOOP
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_trigger
+            WHERE tgname = 'bump_data_version' AND tgrelid = t::regclass
+        ) THEN
+            EXECUTE format(
+                'CREATE TRIGGER bump_data_version'
+                ' AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I'
+                ' FOR EACH STATEMENT EXECUTE FUNCTION bump_data_version()',
+                t
+            );
+        END IF;
+    END LOOP;
+END;
+$$;
+"""
+
+# Leaderboard windows start this long before start_time (see
+# rollup_service.window_rows)
+CUTOFF = timedelta(hours=3)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _micros(t: datetime) -> int:
+    return (t - EPOCH) // timedelta(microseconds=1)
+
+
+def track_writes(db) -> None:
+    """
+    Installs the data_version triggers, if they are missing. CREATE TRIGGER
+    waits for the writers already running, so any write the export that
+    follows does not see still bumps the version after it.
+    """
+    if not db.execute(TRACKED, (len(TRACKED_TABLES),), fetch_one=True)["tracked"]:
+        print("[SNAPSHOT] installing the data_version triggers")
+        db.execute(TRACK_WRITES, commit=True)
+
+
+def export(db, path: str, compression: Optional[str] = None, parquet=None) -> dict:
+    """
+    Writes the snapshot to `path` (atomically, through a temporary file) from
+    one consistent read of the primary, and optionally the same table as
+    zstd-compressed Parquet. Compressed IPC (`compression` "lz4" / "zstd") is
+    smaller but is decompressed on open instead of being mapped in place.
+    """
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+
+    track_writes(db)
+    with db.primary(), db.transaction(read_only=True) as tx:
+        tx.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ;", commit=True)
+        exported_at = tx.execute("SELECT NOW()::timestamp AS t;", fetch_one=True)["t"]
+        version = tx.execute(DATA_VERSION, fetch_one=True)["version"]
+        players = tx.execute(SNAPSHOT_PLAYERS)
+        clubs = tx.execute(FETCH_CLUBS)
+        matches = tx.execute(SNAPSHOT_MATCHES)
+
+    name_to_id = {_clean(p["name"]): p["id"] for p in players}
+    club_names = sorted({c["name"] for c in clubs} | _club_names(matches))
+    club_index = {name: i for i, name in enumerate(club_names)}
+    ratings = club_ratings(clubs)
+
+    def members(lists):
+        return pa.array(lists, type=pa.list_(pa.int32()))
+
+    table = pa.table(
+        {
+            "id": pa.array([m["id"] for m in matches], pa.int32()),
+            "time": pa.array([m["time"] for m in matches], pa.timestamp("us")),
+            "club_a": pa.array(
+                [club_index.get(m["club_a"], -1) for m in matches], pa.int16()
+            ),
+            "club_b": pa.array(
+                [club_index.get(m["club_b"], -1) for m in matches], pa.int16()
+            ),
+            "score_a": pa.array([m["score_a"] for m in matches], pa.int32()),
+            "score_b": pa.array([m["score_b"] for m in matches], pa.int32()),
+            "team_a": members([m["team_a"] for m in matches]),
+            "team_b": members([m["team_b"] for m in matches]),
+            "elo_a": members(
+                [_team_ids(m["team_a_text"], name_to_id) for m in matches]
+            ),
+            "elo_b": members(
+                [_team_ids(m["team_b_text"], name_to_id) for m in matches]
+            ),
+        }
+    ).replace_schema_metadata(
+        {
+            "players": orjson.dumps([[p["id"], p["name"]] for p in players]),
+            "clubs": orjson.dumps(
+                [[name, ratings.get(name, DEFAULT_CLUB_ELO)] for name in club_names]
+            ),
+            "exported_at": exported_at.isoformat(),
+            "data_version": str(version),
+        }
+    )
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+            # one record batch, so every column maps as a single buffer
+            writer.write_table(table, max_chunksize=max(len(matches), 1))
+    os.replace(tmp, path)
+    if parquet:
+        pq.write_table(table, parquet, compression="zstd")
+    return {
+        "path": path,
+        "matches": len(matches),
+        "players": len(players),
+        "bytes": os.path.getsize(path),
+        "exportedAt": exported_at,
+        "dataVersion": version,
+    }
+
+
+def _club_names(matches) -> set:
+    return {m[c] for m in matches for c in ("club_a", "club_b") if m[c] is not None}
+
+
+class _Frame:
+    """One opened file: numpy views over the mapped Arrow buffers."""
+
+    def __init__(self, source, table):
+        def values(name):
+            return table.column(name).chunk(0).to_numpy()
+
+        def lists(name):
+            column = table.column(name).chunk(0)
+            return column.values.to_numpy(), column.offsets.to_numpy()
+
+        self.source, self.table = source, table  # keep the mapping alive
+        self.n = table.num_rows
+        metadata = table.schema.metadata
+        self.players = orjson.loads(metadata[b"players"])  # [[id, name]] by name
+        self.clubs = orjson.loads(metadata[b"clubs"])  # [[name, elo]]
+        self.exported_at = datetime.fromisoformat(metadata[b"exported_at"].decode())
+        # None for a file written before the counter existed: never fresh
+        version = metadata.get(b"data_version")
+        self.data_version = int(version) if version is not None else None
+        if not self.n:
+            return
+        self.times = table.column("time").chunk(0).cast("int64").to_numpy()
+        self.club_a, self.club_b = values("club_a"), values("club_b")
+        self.score_a, self.score_b = values("score_a"), values("score_b")
+        self.team_a, self.team_b = lists("team_a"), lists("team_b")
+        self.elo_a, self.elo_b = lists("elo_a"), lists("elo_b")
+        # player id -> name rank (dense index into self.players)
+        ids = np.array([pid for pid, _ in self.players], dtype=np.int64)
+        self.rank = np.full(int(ids.max(initial=0)) + 1, -1, dtype=np.int64)
+        self.rank[ids] = np.arange(len(ids))
+
+    def first_row(self, start_time: date) -> int:
+        """Index of the first match inside the window from `start_time`."""
+        cutoff = _micros(datetime.combine(start_time, datetime.min.time()) - CUTOFF)
+        return int(np.searchsorted(self.times, cutoff, side="left"))
+
+    def sides(self, first: int):
+        """
+        Both sides' participants from match `first` on, as flat arrays:
+        (team row, player rank, goals for, goals against), where a team row
+        is 2 * match + side.
+        """
+        rows, ranks, gf, ga = [], [], [], []
+        for side, (members, offsets) in enumerate((self.team_a, self.team_b)):
+            lengths = np.diff(offsets[first:])
+            match = np.repeat(np.arange(first, self.n), lengths)
+            own, other = (
+                (self.score_a, self.score_b)
+                if side == 0
+                else (self.score_b, self.score_a)
+            )
+            rows.append(2 * match + side)
+            ranks.append(self.rank[members[offsets[first] : offsets[-1]]])
+            gf.append(own[match])
+            ga.append(other[match])
+        return tuple(np.concatenate(x) for x in (rows, ranks, gf, ga))
+
+
+class MatchSnapshot:
+    """
+    The snapshot file, mapped on first use and re-mapped whenever export()
+    replaces it. Query methods return rows shaped like the matching SQL.
+    With `auto_refresh`, a fresh() that finds the file behind starts a
+    background re-export (see refresh_in_background).
+    """
+
+    def __init__(self, db, path: str, auto_refresh: bool = False):
+        self.db = db
+        self.path = path
+        self.auto_refresh = auto_refresh
+        self._frame = None
+        self._stat = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def refresh(self) -> Optional[dict]:
+        """
+        Re-exports the file unless it is already current or another process
+        on this host is exporting it (None then). The lock file serializes
+        the processes sharing the file, not hosts: each host has its own.
+        """
+        with open(f"{self.path}.lock", "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+            if self._current():
+                return None
+            return export(self.db, self.path)
+
+    def refresh_in_background(self) -> None:
+        """Starts refresh() in a thread, unless this process already runs one."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(
+            target=self._refresh, name="snapshot-refresh", daemon=True
+        ).start()
+
+    def _refresh(self) -> None:
+        try:
+            self.refresh()
+        except Exception as exc:  # queries keep falling back to SQL
+            print(f"[SNAPSHOT] refresh failed: {exc}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def fresh(self) -> bool:
+        """True when the file exists and reflects every committed write: it was
+        exported at the database's current data version."""
+        if self._current():
+            return True
+        if self.auto_refresh:
+            self.refresh_in_background()
+        return False
+
+    def _current(self) -> bool:
+        frame = self.frame()
+        if frame is None or frame.data_version is None:
+            return False
+        row = self.db.execute(DATA_VERSION, fetch_one=True)
+        return row["version"] == frame.data_version
+
+    def frame(self) -> Optional[_Frame]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        frame = self._frame
+        if frame is None or stat != self._stat:
+            import pyarrow as pa  # type: ignore
+
+            source = pa.memory_map(self.path)
+            frame = _Frame(source, pa.ipc.open_file(source).read_all())
+            self._frame, self._stat = frame, stat
+        return frame
+
+    # ----------- Leaderboards -----------
+    def player_leaderboard(self, start_time: date) -> List[dict]:
+        frame = self.frame()
+        if not frame.n:
+            return []
+        _, ranks, gf, ga = frame.sides(frame.first_row(start_time))
+        names = [name for _, name in frame.players]
+        return _leaderboard("name", names, ranks, gf, ga, len(names))
+
+    def team_leaderboard(self, start_time: date) -> List[dict]:
+        frame = self.frame()
+        if not frame.n:
+            return []
+        first = frame.first_row(start_time)
+        clubs = np.concatenate([frame.club_a[first:], frame.club_b[first:]])
+        gf = np.concatenate([frame.score_a[first:], frame.score_b[first:]])
+        ga = np.concatenate([frame.score_b[first:], frame.score_a[first:]])
+        known = clubs >= 0
+        names = [name for name, _ in frame.clubs]
+        return _leaderboard(
+            "team", names, clubs[known], gf[known], ga[known], len(names)
+        )
+
+    def duo_leaderboard(self, start_time: date) -> List[dict]:
+        frame = self.frame()
+        if not frame.n:
+            return []
+        rows, ranks, gf, ga = frame.sides(frame.first_row(start_time))
+        # every pair of players on the same team row, as (lower, higher) rank
+        order = np.lexsort((ranks, rows))
+        rows, ranks, gf, ga = rows[order], ranks[order], gf[order], ga[order]
+        starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+        sizes = np.diff(np.r_[starts, len(rows)])
+        pair_lo, pair_hi, pair_gf, pair_ga = [], [], [], []
+        for size in np.unique(sizes[sizes > 1]):
+            base = starts[sizes == size]
+            for i, j in combinations(range(size), 2):
+                pair_lo.append(ranks[base + i])
+                pair_hi.append(ranks[base + j])
+                pair_gf.append(gf[base])
+                pair_ga.append(ga[base])
+        if not pair_lo:
+            return []
+        n = len(frame.players)
+        keys = np.concatenate(pair_lo) * n + np.concatenate(pair_hi)
+        names = [name for _, name in frame.players]
+        groups, index = np.unique(keys, return_inverse=True)
+        labels = [f"{names[k // n]} & {names[k % n]}" for k in groups.tolist()]
+        return _leaderboard(
+            "team_name",
+            labels,
+            index,
+            np.concatenate(pair_gf),
+            np.concatenate(pair_ga),
+            len(groups),
+        )
+
+    # ----------- Elo -----------
+    def parsed(self):
+        """(player_ids, parsed) like EloService.parsed_history, for
+        elo_batch.pack / elo_sweep."""
+        frame = self.frame()
+        player_ids = sorted(pid for pid, _ in frame.players)
+        if not frame.n:
+            return player_ids, []
+        dense = np.zeros(player_ids[-1] + 1 if player_ids else 1, dtype=np.int64)
+        dense[player_ids] = np.arange(len(player_ids))
+        # club -1 (none) takes the last entry, like MatchLog.club_elo
+        club_elo = [float(elo) for _, elo in frame.clubs] + [float(DEFAULT_CLUB_ELO)]
+        (a_ids, a_off), (b_ids, b_off) = frame.elo_a, frame.elo_b
+        a_idx, b_idx = dense[a_ids].tolist(), dense[b_ids].tolist()
+        a_off, b_off = a_off.tolist(), b_off.tolist()
+        parsed = []
+        for i, (ca, cb, sa, sb) in enumerate(
+            zip(
+                frame.club_a.tolist(),
+                frame.club_b.tolist(),
+                frame.score_a.tolist(),
+                frame.score_b.tolist(),
+            )
+        ):
+            team_a = a_idx[a_off[i] : a_off[i + 1]]
+            team_b = b_idx[b_off[i] : b_off[i + 1]]
+            if team_a and team_b:
+                parsed.append(
+                    (
+                        team_a,
+                        team_b,
+                        club_elo[ca],
+                        club_elo[cb],
+                        sa,
+                        sb,
+                    )
+                )
+        return player_ids, parsed
+
+    def stats(self) -> dict:
+        frame = self.frame()
+        return {
+            "path": self.path,
+            "matches": frame.n if frame else None,
+            "bytes": self._stat[2] if frame else None,
+            "exportedAt": frame.exported_at if frame else None,
+            "dataVersion": frame.data_version if frame else None,
+        }
+
+
+def _leaderboard(key, labels, group, gf, ga, n_groups) -> List[dict]:
+    """
+    LEADERBOARD_COLUMNS for each group present, ordered like the SQL
+    (win_percentage DESC, total_matches DESC).
+    """
+    wins = np.bincount(group, gf > ga, n_groups).astype(np.int64)
+    draws = np.bincount(group, gf == ga, n_groups).astype(np.int64)
+    losses = np.bincount(group, gf < ga, n_groups).astype(np.int64)
+    goals_for = np.bincount(group, gf, n_groups).astype(np.int64)
+    goals_against = np.bincount(group, ga, n_groups).astype(np.int64)
+    matches = wins + draws + losses
+    present = np.flatnonzero(matches)
+    # ROUND(wins / matches * 100, 2), half away from zero, in hundredths
+    hundredths = (20000 * wins[present] + matches[present]) // (2 * matches[present])
+    order = np.lexsort((-matches[present], -hundredths))
+    rows = []
+    for i in order.tolist():
+        g = int(present[i])
+        rows.append(
+            {
+                key: labels[g],
+                "wins": int(wins[g]),
+                "draws": int(draws[g]),
+                "losses": int(losses[g]),
+                "total_matches": int(matches[g]),
+                "points": int(3 * wins[g] + draws[g]),
+                "win_percentage": Decimal(int(hundredths[i])).scaleb(-2),
+                "goals_forwarded": int(goals_for[g]),
+                "goals_accepted": int(goals_against[g]),
+            }
+        )
+    return rows
+
+
+def main():
+    from database import Database
+
+    parser = argparse.ArgumentParser(description="Columnar match-history snapshot")
+    commands = parser.add_subparsers(dest="command", required=True)
+    out = commands.add_parser("export", help="write the snapshot from DB_*")
+    out.add_argument("--out", default=os.getenv("ANALYTICS_SNAPSHOT"), required=False)
+    out.add_argument("--compression", choices=["lz4", "zstd"])
+    out.add_argument("--parquet", help="also write zstd Parquet here")
+    args = parser.parse_args()
+    if not args.out:
+        parser.error("--out (or ANALYTICS_SNAPSHOT) is required")
+
+    db = Database()
+    try:
+        result = export(db, args.out, args.compression, args.parquet)
+    finally:
+        db.close()
+    print(orjson.dumps(result).decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# matchmaking_service.py
+# Elo-balanced team splits for a selected pool of players.
+import random
+import threading
+from bisect import bisect_left, bisect_right, insort
+from itertools import combinations
+from typing import Dict, List, Optional, Set
+
+from elo_service import DEFAULT_CLUB_ELO, INITIAL_ELO
+from statements import statement
+
+TEAM_SIZES = {"1v1": (1, 1), "1v2": (1, 2), "2v2": (2, 2)}
+DEFAULT_TOP = 5
+MAX_TOP = 50
+
+# Teammates from each player's most recent match (same side). Driven from
+# idx_match_participants_player, so the cost follows the pool's own history
+# rather than the whole matches table.
+LAST_TEAMMATES = statement(
+    "last_teammates",
+    """
+WITH last AS (
+    SELECT DISTINCT ON (mp.player_id) mp.player_id, mp.match_id, mp.side
+    FROM match_participants mp
+    JOIN matches m ON m.id = mp.match_id
+    WHERE mp.player_id = ANY(%s)
+    ORDER BY mp.player_id, m.time DESC, m.id DESC
+)
+SELECT l.player_id, t.player_id AS teammate
+FROM last l
+JOIN match_participants t
+  ON t.match_id = l.match_id AND t.side = l.side AND t.player_id <> l.player_id;
+""",
+)
+
+
+class ClubIndex:
+    """
+    Clubs sorted by rating, loaded once and kept until invalidate() (called
+    when a club rating changes) or until `version()` changes: the result
+    cache's version, which every process's writes bump, so a rating changed
+    through another worker reloads the index here too. Pair queries are
+    binary searches over it.
+    """
+
+    def __init__(self, db, version=None):
+        self.db = db
+        self.version = version
+        self._lock = threading.Lock()
+        self._clubs: Optional[List[dict]] = None
+        self._ratings: List[float] = []
+        self._loaded_at = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._clubs = None
+
+    def load(self):
+        with self._lock:
+            version = self.version() if self.version else None
+            if self._clubs is None or version != self._loaded_at:
+                # the version is read first: a bump during the query reloads
+                self._loaded_at = version
+                clubs = self.db.execute("SELECT * FROM clubs;")
+                for c in clubs:
+                    c["elo"] = float(c.get("elo") or DEFAULT_CLUB_ELO)
+                clubs.sort(key=lambda c: (c["elo"], c["name"]))
+                self._clubs = clubs
+                self._ratings = [c["elo"] for c in clubs]
+            return self._clubs, self._ratings
+
+
+class MatchmakingService:
+    """
+    Finds the most balanced splits (smallest difference in average team Elo)
+    of a player pool without exhaustive shuffling.
+
+    Every valid team of each size is listed once and sorted by average rating.
+    For each team A, the search starts from the team B with the closest
+    average and walks outwards, stopping as soon as the gap exceeds the
+    current N-th best (branch and bound). Ties break on player ids, so the
+    same pool always gives the same answer.
+    """
+
+    def __init__(self, db, elo_service, elo_settings, cache_version=None):
+        self.db = db
+        self.elo_service = elo_service
+        self.elo_settings = elo_settings
+        self.club_index = ClubIndex(db, cache_version)
+
+    def last_teammates(self, player_ids: List[int]) -> Dict[int, Set[int]]:
+        mates: Dict[int, Set[int]] = {pid: set() for pid in player_ids}
+        for row in self.db.execute(LAST_TEAMMATES, (list(player_ids),)):
+            mates[row["player_id"]].add(row["teammate"])
+        return mates
+
+    def balanced_teams(
+        self,
+        player_ids: List[int],
+        mode: str = "2v2",
+        top: int = DEFAULT_TOP,
+        avoid_repeat: bool = True,
+    ) -> dict:
+        size_a, size_b = TEAM_SIZES[mode]
+        players = {
+            p["id"]: p["name"]
+            for p in self.db.execute(
+                "SELECT id, name FROM players WHERE id = ANY(%s);",
+                (list(player_ids),),
+            )
+        }
+        pool = sorted(players)
+        if len(pool) < size_a + size_b:
+            raise ValueError(
+                f"select at least {size_a + size_b} known players for {mode}"
+            )
+
+        ratings = self.elo_service.get_ratings(self.elo_settings.get_k_factor())
+        rating = {pid: float(ratings.get(pid, INITIAL_ELO)) for pid in pool}
+        mates = self.last_teammates(pool) if avoid_repeat else {}
+
+        def teams(size):
+            out = []
+            for team in combinations(pool, size):
+                if any(
+                    b in mates.get(a, ()) or a in mates.get(b, ())
+                    for a, b in combinations(team, 2)
+                ):
+                    continue
+                out.append((sum(rating[p] for p in team) / size, team))
+            out.sort()
+            return out
+
+        teams_a = teams(size_a)
+        teams_b = teams_a if size_b == size_a else teams(size_b)
+        averages_b = [avg for avg, _ in teams_b]
+
+        best: List[tuple] = []  # sorted (diff, team_a, team_b), at most `top`
+        evaluated = 0
+
+        def consider(avg_a, team_a, avg_b, team_b):
+            nonlocal evaluated
+            if set(team_a) & set(team_b):
+                return
+            if size_a == size_b and team_a > team_b:
+                return  # same split with sides swapped
+            evaluated += 1
+            insort(best, (abs(avg_a - avg_b), team_a, team_b))
+            if len(best) > top:
+                best.pop()
+
+        def bound():
+            return best[-1][0] if len(best) == top else float("inf")
+
+        for avg_a, team_a in teams_a:
+            start = bisect_left(averages_b, avg_a)
+            lo, hi = start - 1, start
+            while lo >= 0 or hi < len(teams_b):
+                # step towards whichever neighbour is closer in average
+                if hi < len(teams_b) and (
+                    lo < 0 or averages_b[hi] - avg_a <= avg_a - averages_b[lo]
+                ):
+                    i, hi = hi, hi + 1
+                else:
+                    i, lo = lo, lo - 1
+                if abs(averages_b[i] - avg_a) > bound():
+                    break
+                consider(avg_a, team_a, *teams_b[i])
+
+        return {
+            "mode": mode,
+            "evaluated": evaluated,
+            "splits": [
+                {
+                    "teamA": [players[p] for p in team_a],
+                    "teamB": [players[p] for p in team_b],
+                    "teamAIds": list(team_a),
+                    "teamBIds": list(team_b),
+                    "eloA": round(sum(rating[p] for p in team_a) / size_a, 1),
+                    "eloB": round(sum(rating[p] for p in team_b) / size_b, 1),
+                    "diff": round(diff, 1),
+                }
+                for diff, team_a, team_b in best
+            ],
+        }
+
+    def club_pairs(
+        self, gap: float = 0.0, margin: float = 0.0, seed: Optional[int] = None
+    ) -> dict:
+        """
+        Club pairings for two teams whose average Elo differs by
+        `gap` = team A - team B. Club A goes to team A; the pairing is balanced
+        when |gap + (elo_a - elo_b) / 2| <= margin, i.e. elo_b lies within
+        elo_a + 2 * (gap -/+ margin). One binary search per club gives the
+        count of balanced pairings, a uniform random pick among them and the
+        closest pairing overall, in O(clubs log clubs).
+        """
+        clubs, ratings = self.club_index.load()
+        n = len(clubs)
+        if n < 2:
+            raise ValueError("need at least 2 clubs")
+
+        def diff(i, j):
+            return abs(gap + (ratings[i] - ratings[j]) / 2)
+
+        ranges, total = [], 0
+        best = None
+        for i in range(n):
+            lo = bisect_left(ratings, ratings[i] + 2 * (gap - margin))
+            hi = bisect_right(ratings, ratings[i] + 2 * (gap + margin))
+            count = hi - lo - (1 if lo <= i < hi else 0)
+            ranges.append((lo, hi, count))
+            total += count
+
+            # closest partner: neighbours of the exact target, skipping i
+            at = bisect_left(ratings, ratings[i] + 2 * gap)
+            for j in (at - 2, at - 1, at, at + 1):
+                if 0 <= j < n and j != i:
+                    key = (diff(i, j), clubs[i]["name"], clubs[j]["name"])
+                    if best is None or key < best[0]:
+                        best = (key, i, j)
+
+        if total:
+            r = random.Random(seed).randrange(total)
+            for i, (lo, hi, count) in enumerate(ranges):
+                if r < count:
+                    j = lo + r
+                    if lo <= i <= j:
+                        j += 1  # step over the club itself
+                    break
+                r -= count
+        else:
+            _, i, j = best
+
+        def pairing(i, j):
+            return {"clubA": clubs[i], "clubB": clubs[j], "diff": round(diff(i, j), 1)}
+
+        return {
+            "count": total,
+            "withinMargin": total > 0,
+            "pick": pairing(i, j),
+            "best": pairing(best[1], best[2]),
+        }
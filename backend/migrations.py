@@ -0,0 +1,321 @@
+# migrations.py
+# Versioned schema changes, applied out-of-band before a deploy:
+#
+#     cd backend
+#     python -m migrations            # apply pending migrations and backfills
+#     python -m migrations --status   # print current / expected versions
+#
+# The app only checks the recorded version at first use (check_schema), one
+# query; DB_AUTO_MIGRATE=1 applies pending migrations there instead (local dev).
+# Append new migrations to MIGRATIONS; never edit one that has shipped.
+import argparse
+import json
+
+import psycopg2  # type: ignore
+
+from match_service import PARTICIPANTS_FROM_TEAMS
+
+SEED_CLUBS = [
+    ("Liverpool", 1),
+    ("Arsenal", 1),
+    ("City", 1),
+    ("Psg", 1),
+    ("Bayern", 1),
+    ("Barca", 1),
+    ("Inter", 1),
+    ("Aston Villa", 2),
+    ("Chelsea", 2),
+    ("Manu", 2),
+    ("Newcastle", 2),
+    ("Tottenham", 2),
+    ("Atletico", 2),
+    ("Napoli", 2),
+    ("Leverkusen", 2),
+]
+
+# One statement, and only into an empty clubs table
+SEED_CLUBS_SQL = """
+INSERT INTO clubs (name, tier)
+SELECT s.name, s.tier
+FROM unnest(%s::text[], %s::int[]) AS s(name, tier)
+WHERE NOT EXISTS (SELECT 1 FROM clubs);
+"""
+
+# Everything the services used to create at startup. IF NOT EXISTS throughout,
+# so databases created by those older builds are adopted as they are.
+BASELINE = """
+CREATE TABLE IF NOT EXISTS players (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clubs (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) UNIQUE NOT NULL,
+    tier INT NOT NULL
+);
+-- club rating used by Elo and club matchmaking; 500 is DEFAULT_CLUB_ELO
+ALTER TABLE clubs ADD COLUMN IF NOT EXISTS elo INT NOT NULL DEFAULT 500;
+CREATE TABLE IF NOT EXISTS matches (
+    id SERIAL PRIMARY KEY,
+    time TIMESTAMP DEFAULT NOW(),
+    club_a VARCHAR(100),
+    club_b VARCHAR(100),
+    team_a TEXT,
+    team_b TEXT,
+    score_a INT,
+    score_b INT
+);
+CREATE INDEX IF NOT EXISTS idx_matches_time ON matches (time);
+CREATE INDEX IF NOT EXISTS idx_matches_time_id ON matches (time, id);
+-- normalized team membership; the primary key doubles as the match_id index
+CREATE TABLE IF NOT EXISTS match_participants (
+    match_id INT NOT NULL REFERENCES matches(id) ON DELETE CASCADE,
+    player_id INT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    side CHAR(1) NOT NULL CHECK (side IN ('A', 'B')),
+    PRIMARY KEY (match_id, player_id)
+);
+CREATE INDEX IF NOT EXISTS idx_match_participants_player
+    ON match_participants (player_id);
+
+CREATE TABLE IF NOT EXISTS elo_settings (
+    id SMALLINT PRIMARY KEY DEFAULT 1,
+    k_factor INT NOT NULL DEFAULT 24,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+INSERT INTO elo_settings (id, k_factor) VALUES (1, 24) ON CONFLICT (id) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS elo_state (
+    id SMALLINT PRIMARY KEY DEFAULT 1,
+    k_factor INT,
+    last_match_id INT,
+    last_match_time TIMESTAMP,
+    processed INT NOT NULL DEFAULT 0,
+    valid BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+INSERT INTO elo_state (id) VALUES (1) ON CONFLICT (id) DO NOTHING;
+CREATE TABLE IF NOT EXISTS elo_ratings (
+    player_id INT PRIMARY KEY REFERENCES players(id) ON DELETE CASCADE,
+    elo DOUBLE PRECISION NOT NULL
+);
+CREATE TABLE IF NOT EXISTS elo_snapshots (
+    match_id INT NOT NULL,
+    match_time TIMESTAMP NOT NULL,
+    processed INT NOT NULL,
+    ratings JSONB NOT NULL,
+    PRIMARY KEY (match_time, match_id)
+);
+-- one row per rated player per match, for the persisted K
+CREATE TABLE IF NOT EXISTS elo_history (
+    player_id INT NOT NULL,
+    match_time TIMESTAMP NOT NULL,
+    match_id INT NOT NULL,
+    elo_before DOUBLE PRECISION NOT NULL,
+    elo_after DOUBLE PRECISION NOT NULL,
+    expected DOUBLE PRECISION NOT NULL,
+    multiplier DOUBLE PRECISION NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_elo_history_player
+    ON elo_history (player_id, match_time, match_id);
+CREATE INDEX IF NOT EXISTS idx_elo_history_match
+    ON elo_history (match_time, match_id);
+
+CREATE TABLE IF NOT EXISTS player_daily_stats (
+    day DATE NOT NULL,
+    player_id INT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    wins INT NOT NULL, draws INT NOT NULL, losses INT NOT NULL,
+    matches INT NOT NULL, points INT NOT NULL,
+    goals_for INT NOT NULL, goals_against INT NOT NULL,
+    PRIMARY KEY (day, player_id)
+);
+CREATE TABLE IF NOT EXISTS club_daily_stats (
+    day DATE NOT NULL,
+    club VARCHAR(100) NOT NULL,
+    wins INT NOT NULL, draws INT NOT NULL, losses INT NOT NULL,
+    matches INT NOT NULL, points INT NOT NULL,
+    goals_for INT NOT NULL, goals_against INT NOT NULL,
+    PRIMARY KEY (day, club)
+);
+CREATE TABLE IF NOT EXISTS partner_daily_stats (
+    day DATE NOT NULL,
+    player_id INT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    partner_id INT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    wins INT NOT NULL, draws INT NOT NULL, losses INT NOT NULL,
+    matches INT NOT NULL, points INT NOT NULL,
+    goals_for INT NOT NULL, goals_against INT NOT NULL,
+    PRIMARY KEY (day, player_id, partner_id)
+);
+CREATE INDEX IF NOT EXISTS idx_partner_daily_stats_player
+    ON partner_daily_stats (player_id, day);
+CREATE TABLE IF NOT EXISTS rival_daily_stats (
+    day DATE NOT NULL,
+    player_id INT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    opponent_id INT NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+    wins INT NOT NULL, draws INT NOT NULL, losses INT NOT NULL,
+    matches INT NOT NULL, points INT NOT NULL,
+    goals_for INT NOT NULL, goals_against INT NOT NULL,
+    PRIMARY KEY (day, player_id, opponent_id)
+);
+CREATE INDEX IF NOT EXISTS idx_rival_daily_stats_player
+    ON rival_daily_stats (player_id, day);
+-- replaced by partner_daily_stats
+DROP TABLE IF EXISTS duo_daily_stats;
+CREATE TABLE IF NOT EXISTS rollup_state (
+    id SMALLINT PRIMARY KEY DEFAULT 1,
+    version INT NOT NULL
+);
+"""
+
+# Background jobs (job_queue.py). dedupe_key is unique among pending jobs only,
+# which is what lets an enqueue coalesce into the job that has not started yet.
+JOBS = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedupe_key TEXT,
+    payload JSONB NOT NULL DEFAULT '{"items": []}',
+    status TEXT NOT NULL DEFAULT 'pending'
+        CHECK (status IN ('pending', 'running', 'done', 'failed')),
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    coalesced INT NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    run_after TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_pending_key
+    ON jobs (dedupe_key) WHERE status = 'pending';
+CREATE INDEX IF NOT EXISTS idx_jobs_open
+    ON jobs (id) WHERE status IN ('pending', 'running');
+"""
+
+# A counter for the analytics snapshot (match_snapshot.py): once its triggers
+# are installed, every write to the data the snapshot is built from bumps it in
+# its own transaction. The triggers are installed by the first export, not
+# here, so only databases that keep a snapshot make their writers update it.
+DATA_VERSION = """
+CREATE TABLE IF NOT EXISTS data_version (
+    id SMALLINT PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT NOT NULL
+);
+INSERT INTO data_version (id, version) VALUES (1, 0) ON CONFLICT DO NOTHING;
+CREATE OR REPLACE FUNCTION bump_data_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE data_version SET version = version + 1 WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# (version, name, statement, params)
+MIGRATIONS = [
+    (1, "baseline", BASELINE, None),
+    (
+        2,
+        "seed clubs",
+        SEED_CLUBS_SQL,
+        ([c for c, _ in SEED_CLUBS], [t for _, t in SEED_CLUBS]),
+    ),
+    (
+        3,
+        "link match_participants",
+        PARTICIPANTS_FROM_TEAMS
+        + """
+        WHERE NOT EXISTS (SELECT 1 FROM match_participants mp WHERE mp.match_id = m.id)
+        ON CONFLICT DO NOTHING;
+        """,
+        None,
+    ),
+    (4, "jobs", JOBS, None),
+    (5, "data version", DATA_VERSION, None),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+CREATE_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version INT PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+"""
+# Serializes concurrent migrate() runs (arbitrary application-wide key)
+MIGRATION_LOCK = 720_431
+
+
+class SchemaVersionError(RuntimeError):
+    """The database schema is older than this build expects."""
+
+
+def current_version(db) -> int:
+    try:
+        row = db.execute(
+            "SELECT MAX(version) AS version FROM schema_migrations;", fetch_one=True
+        )
+    except psycopg2.errors.UndefinedTable:
+        return 0
+    return row["version"] or 0
+
+
+def check_schema(db) -> int:
+    """The single boot-time query; raises SchemaVersionError when behind."""
+    version = current_version(db)
+    if version < SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"database schema is at version {version}, this build needs "
+            f"{SCHEMA_VERSION}; run `python -m migrations`"
+        )
+    return version
+
+
+def migrate(db, rollup_service=None) -> list:
+    """
+    Applies pending migrations, each in its own transaction, and returns the
+    versions applied. Then lets `rollup_service` rebuild rollups built under
+    another ROLLUP_VERSION.
+    """
+    applied = []
+    with db.transaction() as tx:
+        tx.execute(CREATE_VERSION_TABLE, commit=True)
+    for version, name, statement, params in MIGRATIONS:
+        with db.transaction() as tx:
+            tx.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK,))
+            done = tx.execute(
+                "SELECT 1 FROM schema_migrations WHERE version = %s;",
+                (version,),
+                fetch_one=True,
+            )
+            if done:
+                continue
+            tx.execute(statement, params, commit=True)
+            tx.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s);",
+                (version, name),
+                commit=True,
+            )
+            applied.append(version)
+    if rollup_service:
+        rollup_service.backfill()
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--status", action="store_true")
+    args = parser.parse_args()
+
+    from database import Database
+    from rollup_service import RollupService
+
+    db = Database()
+    if args.status:
+        result = {"current": current_version(db), "expected": SCHEMA_VERSION}
+    else:
+        result = {"applied": migrate(db, RollupService(db)), "version": SCHEMA_VERSION}
+    print(json.dumps(result))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
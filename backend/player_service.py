@@ -1,17 +1,24 @@
+from statements import statement
+
+# Shared with async_services.AsyncPlayerService
+INSERT_PLAYER = statement(
+    "insert_player",
+    "INSERT INTO players (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;",
+)
+GET_PLAYERS = statement("get_players", "SELECT * FROM players ORDER BY id ASC;")
+DELETE_PLAYER = statement("delete_player", "DELETE FROM players WHERE id = %s;")
+
+
 class PlayerService:
     def __init__(self, db):
         self.db = db
 
     def add_player(self, name):
-        query = "INSERT INTO players (name) VALUES (%s) ON CONFLICT (name) DO NOTHING;"
-        self.db.execute(query, (name,), commit=True)
+        self.db.execute(INSERT_PLAYER, (name,), commit=True)
 
     def get_players(self):
-        return self.db.execute(
-            "SELECT * FROM players ORDER BY id ASC;", fetch_one=False
-        )
+        return self.db.replica().execute(GET_PLAYERS, fetch_one=False)
 
     def delete_player(self, player_id):
-        query = "DELETE FROM players WHERE id = %s;"
-        self.db.execute(query, (player_id,), commit=True)
+        self.db.execute(DELETE_PLAYER, (player_id,), commit=True)
         return {"message": f"Player with ID {player_id} deleted successfully."}
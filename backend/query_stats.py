@@ -0,0 +1,280 @@
+# query_stats.py
+# Per-statement timing for the database layer, exported as Prometheus text.
+import hashlib
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+# Histogram bucket upper bounds, seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SLOW_LOG_SIZE = 50
+# Seconds before the same statement is EXPLAINed again
+EXPLAIN_INTERVAL = 300
+
+# Frames from these files are skipped when naming the caller
+_DB_FILES = ("database.py", "async_database.py", "query_stats.py", "contextlib.py")
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"%\(\w+\)s|%s")
+_COMMENT = re.compile(r"--[^\n]*")
+_SPACE = re.compile(r"\s+")
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR UPDATE|FOR SHARE)\b", re.I)
+
+# Current request's (statements, seconds); see track_request()
+_request = ContextVar("query_stats_request", default=None)
+
+
+@lru_cache(maxsize=2048)
+def fingerprint(query) -> str:
+    """SQL with literals and parameters replaced by ?, whitespace collapsed."""
+    if isinstance(query, bytes):
+        query = query.decode()
+    query = _COMMENT.sub("", str(query))
+    query = _PARAM.sub("?", _NUMBER.sub("?", _STRING.sub("?", query)))
+    return _SPACE.sub(" ", query).strip().rstrip(";")
+
+
+@lru_cache(maxsize=2048)
+def query_id(normalized: str) -> str:
+    return hashlib.sha1(normalized.encode()).hexdigest()[:10]
+
+
+def _explainable(normalized: str) -> bool:
+    # EXPLAIN ANALYZE runs the statement again: only plain reads qualify
+    head = normalized.split(" ", 1)[0].upper()
+    return head in ("SELECT", "WITH") and not _WRITES.search(normalized)
+
+
+def caller() -> str:
+    """ "Class.method" (or "module.function") of the first frame outside the DB layer."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if not code.co_filename.endswith(_DB_FILES):
+            owner = frame.f_locals.get("self")
+            if owner is not None:
+                return f"{type(owner).__name__}.{code.co_name}"
+            module = frame.f_globals.get("__name__", "?")
+            return f"{module}.{code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+@contextmanager
+def track_request():
+    """Collects [statements, seconds] for queries run in this context."""
+    totals = [0, 0.0]
+    token = _request.set(totals)
+    try:
+        yield totals
+    finally:
+        _request.reset(token)
+
+
+class _Series:
+    __slots__ = ("count", "seconds", "max", "rows", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.buckets = [0] * len(BUCKETS)
+
+
+class QueryStats:
+    """
+    Aggregates every statement by (fingerprint, caller): count, total / max
+    duration, rows and a latency histogram. Statements slower than
+    DB_SLOW_QUERY_MS go to a bounded slow log; with DB_EXPLAIN_SLOW=1, slow
+    reads are re-run under EXPLAIN (ANALYZE, BUFFERS) on the same connection
+    (at most once per EXPLAIN_INTERVAL per statement) and the plan is kept with
+    the slow-log entry. DB_QUERY_STATS=0 turns recording off.
+    """
+
+    def __init__(self, enabled=None, slow_ms=None, explain_slow=None):
+        env = os.getenv
+        self.enabled = env("DB_QUERY_STATS", "1") != "0" if enabled is None else enabled
+        self.slow_seconds = (
+            float(env("DB_SLOW_QUERY_MS", 200) if slow_ms is None else slow_ms) / 1000
+        )
+        self.explain_slow = (
+            env("DB_EXPLAIN_SLOW", "0") == "1" if explain_slow is None else explain_slow
+        )
+        self._lock = threading.Lock()
+        self._series = {}  # (query id, caller) -> _Series
+        self._sql = {}  # query id -> fingerprint
+        self._slow = deque(maxlen=SLOW_LOG_SIZE)
+        self._explained = {}  # query id -> monotonic time of the last EXPLAIN
+        self.slow_total = 0
+
+    def record(self, query, seconds: float, rows: int = -1, explain=None) -> None:
+        """
+        Adds one executed statement. `explain(sql)` runs an EXPLAIN statement
+        and returns its rows; it is only called for slow reads.
+        """
+        if not self.enabled:
+            return
+        totals = _request.get()
+        if totals is not None:
+            totals[0] += 1
+            totals[1] += seconds
+
+        normalized = fingerprint(query)
+        qid = query_id(normalized)
+        who = caller()
+        slow = seconds >= self.slow_seconds
+        with self._lock:
+            series = self._series.get((qid, who))
+            if series is None:
+                series = self._series[(qid, who)] = _Series()
+                self._sql[qid] = normalized
+            series.count += 1
+            series.seconds += seconds
+            series.max = max(series.max, seconds)
+            series.rows += max(rows, 0)
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    series.buckets[i] += 1
+                    break
+            if slow:
+                self.slow_total += 1
+                now = time.monotonic()
+                run_explain = (
+                    self.explain_slow
+                    and explain is not None
+                    and _explainable(normalized)
+                    and now - self._explained.get(qid, -EXPLAIN_INTERVAL)
+                    >= EXPLAIN_INTERVAL
+                )
+                if run_explain:
+                    self._explained[qid] = now
+        if not slow:
+            return
+
+        entry = {
+            "query": qid,
+            "caller": who,
+            "ms": round(1000 * seconds, 3),
+            "rows": rows,
+            "at": time.time(),
+            "sql": normalized,
+        }
+        if run_explain:
+            entry["plan"] = self._plan(explain)
+        with self._lock:
+            self._slow.append(entry)
+
+    def wants_plan(self, query, seconds: float) -> bool:
+        """Whether record() would EXPLAIN this statement (for async callers,
+        which must fetch the plan before recording)."""
+        if not (self.enabled and self.explain_slow and seconds >= self.slow_seconds):
+            return False
+        normalized = fingerprint(query)
+        last = self._explained.get(query_id(normalized), -EXPLAIN_INTERVAL)
+        return _explainable(normalized) and time.monotonic() - last >= EXPLAIN_INTERVAL
+
+    @staticmethod
+    def _plan(explain):
+        try:
+            rows = explain("EXPLAIN (ANALYZE, BUFFERS) ")
+            return "\n".join(next(iter(r.values())) for r in rows)
+        except Exception as exc:  # the plan is best-effort diagnostics
+            return f"EXPLAIN failed: {exc}"
+
+    @contextmanager
+    def timed(self, query, explain=None):
+        """Times the block as one statement; set .rows on the yielded dict."""
+        result = {"rows": -1}
+        started = time.perf_counter()
+        try:
+            yield result
+        finally:
+            self.record(query, time.perf_counter() - started, result["rows"], explain)
+
+    def summary(self, limit: int = 50) -> dict:
+        """Statements by total time, plus the slow log (newest first)."""
+        with self._lock:
+            series = [
+                {
+                    "query": qid,
+                    "caller": who,
+                    "calls": s.count,
+                    "totalMs": round(1000 * s.seconds, 3),
+                    "meanMs": round(1000 * s.seconds / s.count, 3),
+                    "maxMs": round(1000 * s.max, 3),
+                    "rows": s.rows,
+                    "sql": self._sql[qid],
+                }
+                for (qid, who), s in self._series.items()
+            ]
+            slow = list(reversed(self._slow))
+        series.sort(key=lambda s: s["totalMs"], reverse=True)
+        return {
+            "slowThresholdMs": round(1000 * self.slow_seconds, 3),
+            "statements": series[:limit],
+            "slow": slow,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+            self._slow.clear()
+            self.slow_total = 0
+
+    def prometheus(self) -> str:
+        """The statement metrics in Prometheus text exposition format."""
+        with self._lock:
+            items = [
+                (qid, who, s.count, s.seconds, s.rows, list(s.buckets))
+                for (qid, who), s in sorted(self._series.items())
+            ]
+            slow_total = self.slow_total
+
+        lines = [
+            "# HELP db_query_duration_seconds Statement execution time.",
+            "# TYPE db_query_duration_seconds histogram",
+        ]
+        for qid, who, count, seconds, _, buckets in items:
+            labels = f'query="{qid}",caller="{who}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(
+                    f'db_query_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'db_query_duration_seconds_bucket{{{labels},le="+Inf"}} {count}'
+            )
+            lines.append(f"db_query_duration_seconds_sum{{{labels}}} {seconds:.6f}")
+            lines.append(f"db_query_duration_seconds_count{{{labels}}} {count}")
+        lines += [
+            "# HELP db_query_rows_total Rows returned or affected.",
+            "# TYPE db_query_rows_total counter",
+        ]
+        for qid, who, _, _, rows, _ in items:
+            lines.append(f'db_query_rows_total{{query="{qid}",caller="{who}"}} {rows}')
+        lines += [
+            "# HELP db_slow_queries_total Statements over the slow-query threshold.",
+            "# TYPE db_slow_queries_total counter",
+            f"db_slow_queries_total {slow_total}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+def gauges(prefix: str, values: dict) -> str:
+    """Numeric entries of a stats() dict as Prometheus gauges."""
+    lines = []
+    for key, value in values.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        name = prefix + re.sub(r"(?<!^)(?=[A-Z])", "_", key).lower()
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
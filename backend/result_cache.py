@@ -0,0 +1,230 @@
+# result_cache.py
+import hashlib
+import select
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+
+import orjson
+from fastapi.responses import Response  # type: ignore
+
+# Bumps are broadcast to the other processes with NOTIFY on this channel
+CHANNEL = "result_cache"
+LISTEN_TIMEOUT = 15
+
+
+class ResultCache:
+    """
+    In-process LRU cache for read endpoints, keyed by (endpoint, start_time, k).
+
+    Every write path calls bump(), which advances a data version; entries built
+    under an older version are treated as misses. ETags are derived from the
+    version and the key only, so a matching If-None-Match is answered with 304
+    without computing anything. The version is per process; `notify(epoch)`,
+    when set, is called after every bump() to tell the other processes
+    (NOTIFY on CHANNEL), and listen() applies theirs here.
+
+    Entries remember how they were computed, so warm() can rebuild the most
+    recently used ones after a bump instead of leaving that to the next reader.
+    """
+
+    def __init__(self, max_entries: int = 256, notify=None):
+        self.max_entries = max_entries
+        self.notify = notify
+        self._listening = False
+        self._entries = OrderedDict()  # key -> (version, value)
+        self._computes = OrderedDict()  # key -> compute(), kept across bumps
+        self._lock = threading.Lock()
+        self._version = 0
+        # Distinguishes ETags across restarts, when the version starts over
+        self._epoch = uuid.uuid4().hex[:8]
+        self.hits = 0
+        self.misses = 0
+        self.warmed = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self) -> None:
+        """
+        Invalidates this process's entries, then every other process's. The
+        notify is best-effort: it runs after the write it follows has
+        committed, so a failure is logged rather than failing that write (the
+        other processes then keep their entries until the next bump reaches
+        them, or until their listener reconnects).
+        """
+        self._bump()
+        if self.notify is not None:
+            try:
+                self.notify(self._epoch)
+            except Exception as exc:
+                print(f"[CACHE] bump not broadcast: {exc}")
+
+    def _bump(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    # ----------- Other processes -----------
+    def listen(self, connect) -> None:
+        """
+        Starts a thread that LISTENs on CHANNEL over `connect()` (a new
+        psycopg2 connection) and bumps on every other process's NOTIFY.
+        """
+        with self._lock:
+            if self._listening:
+                return
+            self._listening = True
+        threading.Thread(
+            target=self._listen, args=(connect,), name="cache-listen", daemon=True
+        ).start()
+
+    def _listen(self, connect) -> None:
+        connected_before = False
+        while True:
+            conn = None
+            try:
+                conn = connect()
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL};")
+                if connected_before:
+                    self._bump()  # bumps sent while disconnected were missed
+                connected_before = True
+                while True:
+                    if select.select([conn], [], [], LISTEN_TIMEOUT) == ([], [], []):
+                        continue
+                    conn.poll()
+                    others = [n for n in conn.notifies if n.payload != self._epoch]
+                    conn.notifies.clear()
+                    if others:
+                        self._bump()
+            except Exception as exc:  # reconnect whatever went wrong
+                print(f"[CACHE] listener reconnecting: {exc}")
+                time.sleep(1)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def etag(self, key, version=None) -> str:
+        version = self._version if version is None else version
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+        return f'"{self._epoch}-{version}-{digest}"'
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != self._version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, version: int, compute=None) -> None:
+        with self._lock:
+            if compute is not None:
+                self._computes[key] = compute
+                self._computes.move_to_end(key)
+                while len(self._computes) > self.max_entries:
+                    self._computes.popitem(last=False)
+            if version != self._version:
+                return  # a write landed while computing; don't cache stale data
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def warm(self, limit: int = 16, warmable=None) -> int:
+        """
+        Recomputes up to `limit` of the most recently used entries that are
+        missing under the current version, only keys `warmable(key)` accepts
+        when it is given; returns how many were stored.
+        """
+        with self._lock:
+            keys = [
+                k
+                for k in reversed(self._computes)
+                if k not in self._entries and (warmable is None or warmable(k))
+            ]
+            todo = [(k, self._computes[k]) for k in keys[:limit]]
+        warmed = 0
+        for key, compute in todo:
+            version = self._version
+            try:
+                value = compute()
+            except Exception:  # e.g. an HTTPException; left to the next reader
+                with self._lock:
+                    self._computes.pop(key, None)
+                continue
+            self.put(key, value, version)
+            warmed += version == self._version
+        self.warmed += warmed
+        return warmed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "warmed": self.warmed,
+            }
+
+
+def _not_modified(cache: ResultCache, request, key):
+    etag = cache.etag(key)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def _default(value):
+    # NUMERIC columns (e.g. ROUND(...) percentages); same output as FastAPI's encoder
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    raise TypeError
+
+
+def dumps(value) -> bytes:
+    """orjson encoding of query results (datetimes, RealDictRows, Decimals)."""
+    return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _json(value, etag):
+    # no-cache: browsers keep the body but revalidate with If-None-Match
+    return Response(
+        dumps(value),
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": "no-cache"},
+    )
+
+
+def cached_json(cache: ResultCache, request, key, compute):
+    """Serves `compute()` through the cache with ETag / 304 handling."""
+    not_modified = _not_modified(cache, request, key)
+    if not_modified:
+        return not_modified
+    version = cache.version
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.put(key, value, version, compute)
+    return _json(value, cache.etag(key, version))
+
+
+async def cached_json_async(cache: ResultCache, request, key, compute):
+    """cached_json() for coroutine `compute` functions."""
+    not_modified = _not_modified(cache, request, key)
+    if not_modified:
+        return not_modified
+    version = cache.version
+    value = cache.get(key)
+    if value is None:
+        value = await compute()
+        cache.put(key, value, version)
+    return _json(value, cache.etag(key, version))
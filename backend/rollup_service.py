@@ -0,0 +1,274 @@
+# rollup_service.py
+# Daily per-player / per-club / per-player-pair counters behind the leaderboards.
+from statements import statement
+
+# One row per (match, group) with goals for/against from that group's side.
+# Every source exposes match_id, time, grp, gf, ga; pair sources add grp2.
+PLAYER_ROWS = """
+    SELECT
+        m.id AS match_id,
+        m.time,
+        mp.player_id AS grp,
+        CASE WHEN mp.side = 'A' THEN COALESCE(m.score_a, 0) ELSE COALESCE(m.score_b, 0) END AS gf,
+        CASE WHEN mp.side = 'A' THEN COALESCE(m.score_b, 0) ELSE COALESCE(m.score_a, 0) END AS ga
+    FROM matches m
+    JOIN match_participants mp ON mp.match_id = m.id
+"""
+
+CLUB_ROWS = """
+    SELECT m.id AS match_id, m.time, m.club_a AS grp,
+           COALESCE(m.score_a, 0) AS gf, COALESCE(m.score_b, 0) AS ga
+    FROM matches m
+    UNION ALL
+    SELECT m.id AS match_id, m.time, m.club_b AS grp,
+           COALESCE(m.score_b, 0) AS gf, COALESCE(m.score_a, 0) AS ga
+    FROM matches m
+"""
+
+# Player pairs on the same side (partners) / opposite sides (rivals). Both
+# orientations are stored, so either player id can be looked up directly.
+PAIR_ROWS = """
+    SELECT
+        m.id AS match_id,
+        m.time,
+        a.player_id AS grp,
+        b.player_id AS grp2,
+        CASE WHEN a.side = 'A' THEN COALESCE(m.score_a, 0) ELSE COALESCE(m.score_b, 0) END AS gf,
+        CASE WHEN a.side = 'A' THEN COALESCE(m.score_b, 0) ELSE COALESCE(m.score_a, 0) END AS ga
+    FROM matches m
+    JOIN match_participants a ON a.match_id = m.id
+    JOIN match_participants b ON b.match_id = m.id AND b.player_id <> a.player_id
+"""
+PARTNER_ROWS = PAIR_ROWS + "    WHERE b.side = a.side\n"
+RIVAL_ROWS = PAIR_ROWS + "    WHERE b.side <> a.side\n"
+
+# kind -> (rollup table, group columns, source rows)
+ROLLUPS = {
+    "player": ("player_daily_stats", ("player_id",), PLAYER_ROWS),
+    "club": ("club_daily_stats", ("club",), CLUB_ROWS),
+    "partner": ("partner_daily_stats", ("player_id", "partner_id"), PARTNER_ROWS),
+    "rival": ("rival_daily_stats", ("player_id", "opponent_id"), RIVAL_ROWS),
+}
+
+# Bumped whenever the set or shape of rollups changes; backfill() rebuilds
+# databases built under another version.
+ROLLUP_VERSION = 2
+
+# Per-row counters computed from gf/ga, in rollup column order
+COUNTERS = """
+    (x.gf > x.ga)::int,
+    (x.gf = x.ga)::int,
+    (x.gf < x.ga)::int,
+    1,
+    CASE WHEN x.gf > x.ga THEN 3 WHEN x.gf = x.ga THEN 1 ELSE 0 END,
+    x.gf,
+    x.ga
+"""
+
+STAT_COLUMNS = "wins, draws, losses, matches, points, goals_for, goals_against"
+
+
+def _group_exprs(columns):
+    return ", ".join(["x.grp", "x.grp2"][: len(columns)])
+
+
+def _delta_sql(table, columns, rows):
+    groups = _group_exprs(columns)
+    return f"""
+    INSERT INTO {table} AS s (day, {", ".join(columns)}, {STAT_COLUMNS})
+    SELECT
+        x.time::date, {groups},
+        %(sign)s * SUM((x.gf > x.ga)::int),
+        %(sign)s * SUM((x.gf = x.ga)::int),
+        %(sign)s * SUM((x.gf < x.ga)::int),
+        %(sign)s * COUNT(*),
+        %(sign)s * SUM(CASE WHEN x.gf > x.ga THEN 3 WHEN x.gf = x.ga THEN 1 ELSE 0 END),
+        %(sign)s * SUM(x.gf),
+        %(sign)s * SUM(x.ga)
+    FROM ({rows}) x
+    WHERE x.match_id = %(match_id)s AND x.grp IS NOT NULL
+    GROUP BY x.time::date, {groups}
+    ON CONFLICT (day, {", ".join(columns)}) DO UPDATE SET
+        wins = s.wins + EXCLUDED.wins,
+        draws = s.draws + EXCLUDED.draws,
+        losses = s.losses + EXCLUDED.losses,
+        matches = s.matches + EXCLUDED.matches,
+        points = s.points + EXCLUDED.points,
+        goals_for = s.goals_for + EXCLUDED.goals_for,
+        goals_against = s.goals_against + EXCLUDED.goals_against;
+    """
+
+
+def _prune_sql(table, columns, rows):
+    # only the (day, group) rows this match contributed to can have dropped to 0
+    keys = " AND ".join(
+        f"r.{c} = k.{g}" for c, g in zip(columns, ["grp", "grp2"][: len(columns)])
+    )
+    return f"""
+    DELETE FROM {table} r
+    USING (
+        SELECT DISTINCT x.time::date AS day, {_group_exprs(columns)}
+        FROM ({rows}) x
+        WHERE x.match_id = %(match_id)s AND x.grp IS NOT NULL
+    ) k
+    WHERE r.day = k.day AND {keys} AND r.matches = 0;
+    """
+
+
+def _rebuild_sql(table, columns, rows):
+    groups = _group_exprs(columns)
+    return f"""
+    INSERT INTO {table} (day, {", ".join(columns)}, {STAT_COLUMNS})
+    SELECT
+        x.time::date, {groups},
+        SUM((x.gf > x.ga)::int),
+        SUM((x.gf = x.ga)::int),
+        SUM((x.gf < x.ga)::int),
+        COUNT(*),
+        SUM(CASE WHEN x.gf > x.ga THEN 3 WHEN x.gf = x.ga THEN 1 ELSE 0 END),
+        SUM(x.gf),
+        SUM(x.ga)
+    FROM ({rows}) x
+    WHERE x.grp IS NOT NULL
+    GROUP BY x.time::date, {groups};
+    """
+
+
+def _player_sql(table, columns, rows):
+    """
+    Replaces one player's rows (%(player_id)s on either key column) with
+    counters recomputed from that player's own matches.
+    """
+    groups = _group_exprs(columns)
+    keys = " OR ".join(f"{c} = %(player_id)s" for c in columns)
+    mine = " UNION ALL ".join(
+        f"SELECT * FROM ({rows}) y WHERE y.{g} = %(player_id)s"
+        for g in ["grp", "grp2"][: len(columns)]
+    )
+    return [
+        f"DELETE FROM {table} WHERE {keys};",
+        f"""
+    INSERT INTO {table} (day, {", ".join(columns)}, {STAT_COLUMNS})
+    SELECT
+        x.time::date, {groups},
+        SUM((x.gf > x.ga)::int),
+        SUM((x.gf = x.ga)::int),
+        SUM((x.gf < x.ga)::int),
+        COUNT(*),
+        SUM(CASE WHEN x.gf > x.ga THEN 3 WHEN x.gf = x.ga THEN 1 ELSE 0 END),
+        SUM(x.gf),
+        SUM(x.ga)
+    FROM ({mine}) x
+    GROUP BY x.time::date, {groups};
+    """,
+    ]
+
+
+def window_rows(kind):
+    """
+    Per-group counters for matches at or after the leaderboard cutoff
+    (start_time - 3 hours): whole days come from the rollup table, the partial
+    first day from raw matches. Expects a %(start_time)s parameter and yields
+    columns grp (and grp2 for pair kinds), wins, draws, losses, matches, points,
+    goals_for, goals_against.
+    """
+    table, columns, rows = ROLLUPS[kind]
+    groups = ", ".join(
+        f"r.{c} AS {g}" for c, g in zip(columns, ["grp", "grp2"][: len(columns)])
+    )
+    return f"""
+    WITH bounds AS (
+        SELECT cutoff, (date_trunc('day', cutoff) + INTERVAL '1 day')::date AS first_day
+        FROM (SELECT CAST(%(start_time)s AS timestamp) - INTERVAL '3 hours' AS cutoff) c
+    )
+    SELECT {groups}, r.wins, r.draws, r.losses, r.matches, r.points,
+           r.goals_for, r.goals_against
+    FROM {table} r, bounds
+    WHERE r.day >= bounds.first_day
+    UNION ALL
+    SELECT {_group_exprs(columns)}, {COUNTERS}
+    FROM ({rows}) x, bounds
+    WHERE x.time >= bounds.cutoff AND x.time < bounds.first_day AND x.grp IS NOT NULL
+    """
+
+
+# Applied with {"match_id": ..., "sign": 1 | -1}; shared with AsyncMatchService.
+# sign=-1 must run before the match (and its participants) are deleted, and
+# is followed by PRUNE_MATCH, which drops the rows it emptied.
+APPLY_MATCH = [
+    statement(f"rollup_{kind}_delta", _delta_sql(*ROLLUPS[kind])) for kind in ROLLUPS
+]
+PRUNE_MATCH = [
+    statement(f"rollup_{kind}_prune", _prune_sql(*ROLLUPS[kind])) for kind in ROLLUPS
+]
+# Applied with {"player_id": ...}: the kinds keyed by player (clubs do not
+# depend on who played)
+APPLY_PLAYER = [
+    statement(f"rollup_{kind}_player_{step}", sql)
+    for kind in ("player", "partner", "rival")
+    for step, sql in zip(("delete", "insert"), _player_sql(*ROLLUPS[kind]))
+]
+
+
+class RollupService:
+    """
+    Owns the *_daily_stats tables: one row per (day, player | club | player
+    pair) with wins, draws, losses, matches, points and goals for/against.
+    Pair tables hold partners (same side) and rivals (opposite sides) in both
+    orientations; the duo leaderboard is a projection of the partner table.
+    Kept in step with matches by apply_match() and with linked players by
+    apply_player(); rebuild() recomputes them.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def apply_match(self, tx, match_id, sign=1):
+        """Adds (sign=1) or removes (sign=-1) one match's counters inside `tx`."""
+        params = {"match_id": match_id, "sign": sign}
+        for query in APPLY_MATCH + (PRUNE_MATCH if sign < 0 else []):
+            tx.execute(query, params, commit=True)
+
+    def apply_player(self, name):
+        """
+        Recomputes the rows of the player called `name` and of their partner
+        and rival pairs, e.g. after their matches were linked to them. Other
+        rows do not depend on the player. A deleted player needs nothing: the
+        foreign keys cascade their rows away.
+        """
+        with self.db.transaction() as tx:
+            for player in tx.execute(
+                "SELECT id FROM players WHERE name = %s;", (name,)
+            ):
+                for query in APPLY_PLAYER:
+                    tx.execute(query, {"player_id": player["id"]}, commit=True)
+
+    def rebuild(self):
+        """Recomputes all rollups from matches, e.g. after a schema change."""
+        with self.db.transaction() as tx:
+            tx.execute(
+                "TRUNCATE " + ", ".join(t for t, _, _ in ROLLUPS.values()) + ";",
+                commit=True,
+            )
+            for kind in ROLLUPS:
+                tx.execute(_rebuild_sql(*ROLLUPS[kind]), commit=True)
+            tx.execute(
+                """
+                INSERT INTO rollup_state (id, version) VALUES (1, %s)
+                ON CONFLICT (id) DO UPDATE SET version = EXCLUDED.version;
+                """,
+                (ROLLUP_VERSION,),
+                commit=True,
+            )
+
+    def backfill(self):
+        """Builds the rollups for databases that predate them (or this version)."""
+        row = self.db.execute(
+            """
+            SELECT EXISTS (SELECT 1 FROM matches) AS has_matches,
+                   (SELECT version FROM rollup_state WHERE id = 1) AS version;
+            """,
+            fetch_one=True,
+        )
+        if row["has_matches"] and row["version"] != ROLLUP_VERSION:
+            self.rebuild()
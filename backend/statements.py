@@ -0,0 +1,271 @@
+# statements.py
+# Registry of named service queries. A Statement is the SQL string itself
+# (services keep passing it to execute()), plus a name under which
+# database.Transaction PREPAREs it once per connection and then runs
+# EXECUTE name(...), so Postgres parses and plans it once instead of on every
+# call. The registry keeps per-statement timings: client-side time for every
+# call and, when sampling is turned on, the server's planning and execution
+# time.
+import os
+import re
+import threading
+import time
+import weakref
+
+import psycopg2  # type: ignore
+
+from query_stats import _explainable, fingerprint
+
+# Seconds between EXPLAIN (ANALYZE) samples of one statement; 0 (the default)
+# turns sampling off. A sample runs the query a second time, on the request's
+# thread, so turn it on to investigate rather than in production.
+PLAN_SAMPLE_SECONDS = float(os.getenv("DB_PLAN_SAMPLE_SECONDS", 0))
+
+_NAME = re.compile(r"^[a-z_][a-z0-9_]*$")
+_PARAM = re.compile(r"%\((\w+)\)s|%s|%%")
+
+# The server no longer has (or can no longer use) a statement this connection
+# prepared: a pooler handed over another backend, DISCARD ALL, or a SELECT *
+# whose table changed shape
+STALE_STATEMENT_ERRORS = (
+    psycopg2.errors.InvalidSqlStatementName,
+    psycopg2.errors.FeatureNotSupported,
+)
+# PREPARE failures that only mean Postgres cannot type a parameter without
+# the values: the text with literal arguments still runs
+UNPREPARABLE_ERRORS = (
+    psycopg2.errors.IndeterminateDatatype,
+    psycopg2.errors.AmbiguousParameter,
+    psycopg2.errors.AmbiguousFunction,
+    psycopg2.errors.UndefinedFunction,
+)
+
+
+class Statement(str):
+    """
+    A named query. Behaves as its SQL text everywhere (QueryStats, EXPLAIN,
+    the async backend, string composition, which yields a plain str); only
+    Transaction.execute() looks at the name. Parameters use one style, %s or
+    %(name)s, as in the rest of the code.
+    """
+
+    def __new__(cls, name: str, sql: str):
+        if not _NAME.match(name):
+            raise ValueError(f"invalid statement name: {name!r}")
+        self = super().__new__(cls, sql)
+        self.name = name
+        named, positional = [], 0
+
+        def placeholder(m):
+            nonlocal positional
+            if m.group(0) == "%%":
+                return "%"
+            if m.group(1) is None:
+                positional += 1
+                return f"${positional}"
+            if m.group(1) not in named:
+                named.append(m.group(1))
+            return f"${named.index(m.group(1)) + 1}"
+
+        # PREPARE text: placeholders as $n, %% unescaped (sent without params)
+        body = _PARAM.sub(placeholder, sql).strip().rstrip(";")
+        if named and positional:
+            raise ValueError(f"{name}: mixes %s and %(name)s parameters")
+        self.prepare_sql = f"PREPARE {name} AS {body};"
+        self.params = tuple(named) or positional
+        self.read_only = _explainable(fingerprint(sql))
+        return self
+
+    def execute_sql(self, params):
+        """EXECUTE text and its arguments, in $n order."""
+        if isinstance(self.params, tuple):
+            args = tuple(params[p] for p in self.params)
+        else:
+            args = tuple(params or ())
+        if not args:
+            return f"EXECUTE {self.name};", None
+        return f"EXECUTE {self.name} ({', '.join(['%s'] * len(args))});", args
+
+
+class _Counters:
+    __slots__ = (
+        "calls",
+        "executed",
+        "prepares",
+        "seconds",
+        "samples",
+        "plan_ms",
+        "exec_ms",
+        "last_plan_ms",
+        "last_exec_ms",
+        "last_mode",
+    )
+
+    def __init__(self):
+        self.calls = self.executed = self.prepares = self.samples = 0
+        self.seconds = self.plan_ms = self.exec_ms = 0.0
+        self.last_plan_ms = self.last_exec_ms = self.last_mode = None
+
+
+class StatementRegistry:
+    """
+    Every Statement by name, which of them each connection has prepared
+    (weakly keyed, so a closed connection takes its set with it), and the
+    counters behind summary(). Statements whose PREPARE fails (e.g. a
+    parameter type Postgres cannot infer) are remembered and run as text.
+    """
+
+    def __init__(self, sample_seconds: float = PLAN_SAMPLE_SECONDS):
+        self.sample_seconds = sample_seconds
+        self._lock = threading.Lock()
+        self._statements = {}  # name -> Statement
+        self._counters = {}  # name -> _Counters
+        self._prepared = weakref.WeakKeyDictionary()  # connection -> {name}
+        self._unpreparable = {}  # name -> error
+        self._sampled = {}  # name -> monotonic time of the last sample
+
+    def register(self, name: str, sql: str) -> Statement:
+        statement = Statement(name, sql)
+        with self._lock:
+            existing = self._statements.get(name)
+            if existing is not None and str(existing) != sql:
+                raise ValueError(f"statement {name!r} is already registered")
+            self._statements[name] = statement
+            self._counters.setdefault(name, _Counters())
+        return statement
+
+    def get(self, name: str) -> Statement:
+        return self._statements[name]
+
+    # ----------- Per connection -----------
+    def is_prepared(self, conn, statement: Statement) -> bool:
+        return statement.name in self._prepared.get(conn, ())
+
+    def can_prepare(self, statement: Statement) -> bool:
+        return statement.name not in self._unpreparable
+
+    def prepare(self, cur, statement: Statement) -> bool:
+        """
+        PREPAREs on the cursor's connection; False if it cannot be. Inside a
+        transaction the PREPARE runs in a savepoint, so a failure leaves the
+        transaction usable (prepared statements outlive a rollback either way).
+        """
+        savepoint = not cur.connection.autocommit
+        if savepoint:
+            cur.execute("SAVEPOINT prepare_statement;")
+        try:
+            try:
+                cur.execute(statement.prepare_sql)
+            except psycopg2.errors.DuplicatePreparedStatement:
+                # left on the connection by an earlier attempt; replaced, in
+                # case the tables changed shape since
+                if savepoint:
+                    cur.execute("ROLLBACK TO SAVEPOINT prepare_statement;")
+                cur.execute(f"DEALLOCATE {statement.name}; {statement.prepare_sql}")
+        except UNPREPARABLE_ERRORS as exc:
+            if savepoint:
+                cur.execute("ROLLBACK TO SAVEPOINT prepare_statement;")
+            print(f"[DB] statement {statement.name} runs unprepared: {exc}")
+            with self._lock:
+                self._unpreparable[statement.name] = str(exc).strip()
+            return False
+        if savepoint:
+            cur.execute("RELEASE SAVEPOINT prepare_statement;")
+        with self._lock:
+            self._prepared.setdefault(cur.connection, set()).add(statement.name)
+            self._counters[statement.name].prepares += 1
+        return True
+
+    def forget(self, conn, statement: Statement) -> None:
+        with self._lock:
+            self._prepared.get(conn, set()).discard(statement.name)
+
+    def deallocate(self, cur, statement: Statement) -> None:
+        self.forget(cur.connection, statement)
+        try:
+            cur.execute(f"DEALLOCATE {statement.name};")
+        except psycopg2.errors.InvalidSqlStatementName:
+            pass
+
+    # ----------- Timings -----------
+    def record(self, statement: Statement, seconds: float, prepared: bool) -> None:
+        with self._lock:
+            counters = self._counters[statement.name]
+            counters.calls += 1
+            counters.executed += prepared
+            counters.seconds += seconds
+
+    def wants_sample(self, statement: Statement) -> bool:
+        if not (self.sample_seconds and statement.read_only):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            if now - self._sampled.get(statement.name, float("-inf")) < (
+                self.sample_seconds
+            ):
+                return False
+            self._sampled[statement.name] = now
+        return True
+
+    def sample(self, cur, statement: Statement, sql: str, args) -> None:
+        """Runs `sql` (the EXECUTE or the text) under EXPLAIN ANALYZE on an
+        idle connection and records the server's planning / execution time."""
+        try:
+            cur.execute(
+                "EXPLAIN (ANALYZE, SUMMARY, TIMING OFF, FORMAT JSON) " + sql, args
+            )
+            plan = next(iter(cur.fetchone().values()))[0]
+        except Exception as exc:  # sampling is best-effort diagnostics
+            print(f"[DB] statement {statement.name} not sampled: {exc}")
+            return
+        with self._lock:
+            counters = self._counters[statement.name]
+            counters.samples += 1
+            counters.plan_ms += plan["Planning Time"]
+            counters.exec_ms += plan["Execution Time"]
+            counters.last_plan_ms = plan["Planning Time"]
+            counters.last_exec_ms = plan["Execution Time"]
+            counters.last_mode = "prepared" if sql.startswith("EXECUTE") else "text"
+
+    def summary(self) -> list:
+        """Per statement: calls (prepared / text), client time and the sampled
+        server planning and execution time, by total time."""
+        with self._lock:
+            rows = [
+                {
+                    "name": name,
+                    "calls": c.calls,
+                    "prepared": c.executed,
+                    "text": c.calls - c.executed,
+                    "prepares": c.prepares,
+                    "totalMs": round(1000 * c.seconds, 3),
+                    "meanMs": round(1000 * c.seconds / c.calls, 3) if c.calls else 0.0,
+                    "samples": c.samples,
+                    "planMsAvg": (
+                        round(c.plan_ms / c.samples, 3) if c.samples else None
+                    ),
+                    "execMsAvg": (
+                        round(c.exec_ms / c.samples, 3) if c.samples else None
+                    ),
+                    "lastPlanMs": c.last_plan_ms,
+                    "lastExecMs": c.last_exec_ms,
+                    "lastMode": c.last_mode,
+                    "unpreparable": self._unpreparable.get(name),
+                }
+                for name, c in self._counters.items()
+            ]
+        rows.sort(key=lambda r: r["totalMs"], reverse=True)
+        return rows
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters = {name: _Counters() for name in self._statements}
+            self._sampled.clear()
+
+
+registry = StatementRegistry()
+
+
+def statement(name: str, sql: str) -> Statement:
+    """Declares a named service query in the shared registry."""
+    return registry.register(name, sql)
@@ -1,4 +1,4 @@
-import React, { useState, useMemo } from "react";
+import React, { useState, useMemo, useEffect } from "react";
 import "./../styles/MatchHistory.css";
 
 interface Match {
@@ -23,10 +23,38 @@ const cleanPlayerName = (name: string) =>
 const capitalize = (name: string) =>
   name.charAt(0).toUpperCase() + name.slice(1).toLowerCase();
 
-const MatchHistory: React.FC<{ matches: Match[] }> = ({ matches }) => {
+interface MatchHistoryProps {
+  matches: Match[];
+  /** older matches exist beyond `matches` */
+  hasMore?: boolean;
+  loadingMore?: boolean;
+  onLoadMore?: () => void;
+}
+
+const MatchHistory: React.FC<MatchHistoryProps> = ({
+  matches,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore,
+}) => {
   const [filter, setFilter] = useState<string>("all");
   const [selectedDate, setSelectedDate] = useState<string>("");
 
+  // A filter searches the whole history: keep loading older pages while one
+  // is set (the date filter only until the loaded history reaches that date)
+  const oldestLoaded = useMemo(() => {
+    if (!matches.length) return "";
+    const date = new Date(matches[matches.length - 1].time);
+    date.setHours(date.getHours() + 3); // same UTC+3 day as the date filter
+    return date.toLocaleDateString("en-CA");
+  }, [matches]);
+  useEffect(() => {
+    if (!hasMore || loadingMore || !onLoadMore) return;
+    const byPlayer = filter !== "all";
+    const byDate = selectedDate !== "" && oldestLoaded >= selectedDate;
+    if (byPlayer || byDate) onLoadMore();
+  }, [filter, selectedDate, oldestLoaded, hasMore, loadingMore, onLoadMore]);
+
   // Unique player list
   const uniquePlayers = useMemo(() => {
     const allPlayers = matches.flatMap((match) =>
@@ -133,6 +161,16 @@ const MatchHistory: React.FC<{ matches: Match[] }> = ({ matches }) => {
           ))}
         </tbody>
       </table>
+
+      {hasMore && onLoadMore && (
+        <button
+          className="load-more"
+          onClick={onLoadMore}
+          disabled={loadingMore}
+        >
+          {loadingMore ? "Loading..." : "Load older matches"}
+        </button>
+      )}
     </div>
   );
 };
@@ -1,5 +1,6 @@
-import React, { useMemo } from "react";
+import React, { useEffect, useState } from "react";
 import "./../styles/TeamManager.css";
+import { EloPreview, fetchEloPreview } from "../services/api";
 
 interface TeamManagerProps {
   teamMode: string;
@@ -13,6 +14,8 @@ interface TeamManagerProps {
   manualTeamB: number[];
   players: { id: number; name: string }[];
   eloRatings: Record<number, number>;
+  clubAName?: string;
+  clubBName?: string;
 }
 
 const TeamManager: React.FC<TeamManagerProps> = ({
@@ -27,6 +30,8 @@ const TeamManager: React.FC<TeamManagerProps> = ({
   manualTeamB,
   players,
   eloRatings,
+  clubAName,
+  clubBName,
 }) => {
   const getNamesFromIds = (ids: number[]) =>
     ids
@@ -50,13 +55,46 @@ const TeamManager: React.FC<TeamManagerProps> = ({
   const teamAEloAvg = getAvgElo(currentTeamA);
   const teamBEloAvg = getAvgElo(currentTeamB);
 
-  const expectedA = useMemo(() => {
-    if (!currentTeamA.length || !currentTeamB.length) return null;
-    const Ea = 1 / (1 + Math.pow(10, (teamBEloAvg - teamAEloAvg) / 400));
-    return Math.round(Ea * 100);
-  }, [currentTeamA, currentTeamB, teamAEloAvg, teamBEloAvg]);
+  // Win chance and Elo at stake come from the server, which rates the
+  // lineup exactly as it would rate the recorded match (clubs included)
+  const [preview, setPreview] = useState<EloPreview | null>(null);
+  const lineupKey = JSON.stringify([
+    currentTeamA,
+    currentTeamB,
+    clubAName,
+    clubBName,
+    eloRatings,
+  ]);
 
+  useEffect(() => {
+    if (!currentTeamA.length || !currentTeamB.length) {
+      setPreview(null);
+      return;
+    }
+    let cancelled = false;
+    fetchEloPreview({
+      teamA: currentTeamA,
+      teamB: currentTeamB,
+      clubA: clubAName,
+      clubB: clubBName,
+    })
+      .then((p) => !cancelled && setPreview(p))
+      .catch(() => !cancelled && setPreview(null));
+    return () => {
+      cancelled = true;
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [lineupKey]);
+
+  const expectedA = preview ? Math.round(preview.expectedA * 100) : null;
   const expectedB = expectedA !== null ? 100 - expectedA : null;
+  // rating change for a one-goal win / loss
+  const stakes = (side: "deltaA" | "deltaB", winMargin: number) => {
+    const win = preview?.outcomes.find((o) => o.margin === winMargin);
+    const loss = preview?.outcomes.find((o) => o.margin === -winMargin);
+    if (!win || !loss) return null;
+    return `+${Math.round(win[side])} / ${Math.round(loss[side])}`;
+  };
 
   return (
     <div className="team-section">
@@ -100,6 +138,11 @@ const TeamManager: React.FC<TeamManagerProps> = ({
                   • Win Chance: {expectedA}%
                 </span>
               )}
+              {stakes("deltaA", 1) && (
+                <span style={{ marginLeft: 8 }}>
+                  • ELO ±1 goal: {stakes("deltaA", 1)}
+                </span>
+              )}
             </div>
           )}
           <ul>
@@ -118,6 +161,11 @@ const TeamManager: React.FC<TeamManagerProps> = ({
                   • Win Chance: {expectedB}%
                 </span>
               )}
+              {stakes("deltaB", -1) && (
+                <span style={{ marginLeft: 8 }}>
+                  • ELO ±1 goal: {stakes("deltaB", -1)}
+                </span>
+              )}
             </div>
           )}
           <ul>
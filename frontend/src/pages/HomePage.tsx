@@ -8,11 +8,14 @@ import "../styles/App.css";
 
 import {
   fetchPlayersAPI,
-  fetchClubsAPI,
-  fetchMatchesAPI,
+  fetchBootstrap,
+  fetchMatchesPageAPI,
   addPlayerAPI,
   addMatchAPI,
   fetchEloRatings,
+  fetchBalancedTeams,
+  fetchClubPairing,
+  subscribeLive,
 } from "../services/api";
 
 interface Player {
@@ -55,6 +58,9 @@ function HomePage() {
   const [scoreA, setScoreA] = useState<number | "">("");
   const [scoreB, setScoreB] = useState<number | "">("");
   const [matches, setMatches] = useState<Match[]>([]);
+  // where the loaded history ends; null once it reaches the first match
+  const [matchesCursor, setMatchesCursor] = useState<string | null>(null);
+  const [loadingMatches, setLoadingMatches] = useState(false);
   const [message, setMessage] = useState("");
   // const [selectedTiers, setSelectedTiers] = useState<number[]>([]);
   const [selectedForRandom, setSelectedForRandom] = useState<number[]>([]);
@@ -81,32 +87,31 @@ function HomePage() {
       .map((x) => cleanText(x))
       .filter(Boolean);
 
+  // Newest first, like /bootstrap and /matches/page
+  const withMatch = (prev: Match[], match: Match) =>
+    [match, ...prev.filter((m) => m.id !== match.id)].sort(
+      (a, b) => b.time.localeCompare(a.time) || b.id - a.id
+    );
+
   useEffect(() => {
     const load = async () => {
       try {
         setLoading(true);
-        const [playersResp, clubsResp, matchesResp, eloResp] =
-          await Promise.all([
-            fetchPlayersAPI(),
-            fetchClubsAPI(),
-            fetchMatchesAPI(),
-            fetchEloRatings(),
-          ]);
+        // One request: players carry their elo, matches are the recent window
+        const boot = await fetchBootstrap();
+        const playersResp = boot.players;
 
         setPlayers(playersResp);
-        setClubs(clubsResp);
-        setMatches(matchesResp);
-        // setKFactor(settingsResp?.kFactor ?? null);
+        setClubs(boot.clubs);
+        setMatches(boot.matches);
+        setMatchesCursor(boot.nextCursor);
 
         // Build map {id: elo}
         const ratingsMap: Record<number, number> = {};
-        (eloResp?.ratings || []).forEach(
-          (r) => (ratingsMap[r.playerId] = r.elo)
+        playersResp.forEach(
+          (p: Player & { elo?: number }) =>
+            (ratingsMap[p.id] = p.elo ?? INITIAL_ELO)
         );
-        // Default missing players to 1000 (e.g., new players without matches yet)
-        playersResp.forEach((p: Player) => {
-          if (!(p.id in ratingsMap)) ratingsMap[p.id] = INITIAL_ELO;
-        });
         setEloRatings(ratingsMap);
 
         // default: tick everyone for randomization
@@ -120,6 +125,58 @@ function HomePage() {
     load();
   }, []);
 
+  // Matches recorded or deleted anywhere arrive as deltas; no refetching
+  useEffect(
+    () =>
+      subscribeLive(
+        null,
+        ({ action, match, elo }) => {
+          setMatches((prev) =>
+            action === "added"
+              ? withMatch(prev, match)
+              : prev.filter((m) => m.id !== match.id)
+          );
+          setEloRatings((prev) => {
+            const next = { ...prev };
+            elo.forEach((r) => (next[r.playerId] = r.elo));
+            return next;
+          });
+        },
+        async () => {
+          const boot = await fetchBootstrap();
+          setPlayers(boot.players);
+          setClubs(boot.clubs);
+          setMatches(boot.matches);
+          setMatchesCursor(boot.nextCursor);
+          const ratingsMap: Record<number, number> = {};
+          boot.players.forEach(
+            (p: Player & { elo?: number }) =>
+              (ratingsMap[p.id] = p.elo ?? INITIAL_ELO)
+          );
+          setEloRatings(ratingsMap);
+        }
+      ),
+    []
+  );
+
+  // Appends the next page of older matches to the history
+  const loadMoreMatches = async () => {
+    if (!matchesCursor || loadingMatches) return;
+    try {
+      setLoadingMatches(true);
+      const page = await fetchMatchesPageAPI(matchesCursor);
+      setMatches((prev) => {
+        const seen = new Set(prev.map((m) => m.id));
+        return [...prev, ...page.items.filter((m: Match) => !seen.has(m.id))];
+      });
+      setMatchesCursor(page.nextCursor);
+    } catch (e) {
+      console.error("Failed to load older matches:", e);
+    } finally {
+      setLoadingMatches(false);
+    }
+  };
+
   const refreshElo = async () => {
     try {
       const eloResp = await fetchEloRatings();
@@ -135,14 +192,6 @@ function HomePage() {
     }
   };
 
-  const fetchMatches = async () => {
-    try {
-      setMatches(await fetchMatchesAPI());
-    } catch (e) {
-      console.error("Failed to fetch matches:", e);
-    }
-  };
-
   const handleSubmit = async (e: React.FormEvent) => {
     e.preventDefault();
     if (!username.trim()) return;
@@ -207,7 +256,7 @@ function HomePage() {
       : INITIAL_ELO;
   };
 
-  const generateRandomTeams = () => {
+  const generateRandomTeams = async () => {
     let teamASize = 1;
     let teamBSize = 1;
 
@@ -230,6 +279,29 @@ function HomePage() {
       return;
     }
 
+    if (eloMatchmakingEnabled) {
+      // Server enumerates every split and returns the most balanced one
+      try {
+        const { splits } = await fetchBalancedTeams(
+          pool.map((p) => p.id),
+          teamMode
+        );
+        if (splits?.length) {
+          setTeamA(splits[0].teamA);
+          setTeamB(splits[0].teamB);
+          setManualTeamA([]);
+          setManualTeamB([]);
+          return;
+        }
+      } catch (e) {
+        console.error("Failed to fetch balanced teams:", e);
+      }
+      alert(
+        "Couldn't form balanced ELO teams without repeating last-match teammates. Try changing selection or team mode."
+      );
+      return;
+    }
+
     const lastTeammates = buildLastTeammatesMap();
 
     const isTeamValid = (names: string[]) => {
@@ -249,8 +321,6 @@ function HomePage() {
     };
 
     const MAX_TRIES = 1200;
-    let bestSplit: { A: string[]; B: string[] } | null = null;
-    let bestDiff = Number.POSITIVE_INFINITY;
 
     for (let attempt = 0; attempt < MAX_TRIES; attempt++) {
       const shuffled = [...pool].sort(() => Math.random() - 0.5);
@@ -262,41 +332,19 @@ function HomePage() {
 
       if (!isTeamValid(pickA) || !isTeamValid(pickB)) continue;
 
-      if (eloMatchmakingEnabled) {
-        const avgA = teamAverageEloByNames(pickA);
-        const avgB = teamAverageEloByNames(pickB);
-        const diff = Math.abs(avgA - avgB);
-
-        if (diff < bestDiff) {
-          bestDiff = diff;
-          bestSplit = { A: pickA, B: pickB };
-          if (bestDiff === 0) break;
-        }
-      } else {
-        setTeamA(pickA);
-        setTeamB(pickB);
-        setManualTeamA([]);
-        setManualTeamB([]);
-        return;
-      }
-    }
-
-    if (eloMatchmakingEnabled && bestSplit) {
-      setTeamA(bestSplit.A);
-      setTeamB(bestSplit.B);
+      setTeamA(pickA);
+      setTeamB(pickB);
       setManualTeamA([]);
       setManualTeamB([]);
       return;
     }
 
     alert(
-      eloMatchmakingEnabled
-        ? "Couldn't form balanced ELO teams without repeating last-match teammates. Try changing selection or team mode."
-        : "Couldn't form teams without repeating last-match teammates. Try changing selection or team mode."
+      "Couldn't form teams without repeating last-match teammates. Try changing selection or team mode."
     );
   };
 
-  const generateRandomClubs = () => {
+  const generateRandomClubs = async () => {
     if (clubs.length < 2) {
       alert("You need at least 2 clubs to select randomly.");
       return;
@@ -321,53 +369,24 @@ function HomePage() {
     const avgA = teamAverageEloByNames(teamANames);
     const avgB = teamAverageEloByNames(teamBNames);
 
-    const clubElo = (c: Club) =>
-      typeof c.elo === "number" ? c.elo! : DEFAULT_CLUB_ELO;
-
-    type Candidate = { a: Club; b: Club; diff: number };
-
-    let best: Candidate | null = null;
-    const within: Candidate[] = [];
-
-    // Evaluate ALL unordered pairs (no tiers), using club ELO / 2
-    for (let i = 0; i < clubs.length; i++) {
-      for (let j = i + 1; j < clubs.length; j++) {
-        const c1 = clubs[i];
-        const c2 = clubs[j];
-
-        const c1Half = clubElo(c1) / 2;
-        const c2Half = clubElo(c2) / 2;
-
-        // try both orientations; pick the better
-        const d1 = Math.abs(avgA + c1Half - (avgB + c2Half));
-        const d2 = Math.abs(avgA + c2Half - (avgB + c1Half));
-        const swap = d2 < d1;
-
-        const cand: Candidate = {
-          a: swap ? c2 : c1,
-          b: swap ? c1 : c2,
-          diff: swap ? d2 : d1,
-        };
-
-        if (cand.diff <= clubBalanceMargin) within.push(cand);
-        if (!best || cand.diff < best.diff) best = cand;
-      }
-    }
-
-    const pick =
-      within.length > 0
-        ? within[Math.floor(Math.random() * within.length)]
-        : (best as Candidate);
-
-    setClubA(pick.a.id);
-    setClubB(pick.b.id);
-
-    if (within.length === 0) {
-      console.info(
-        `Closest balance diff: ${Math.round(
-          pick.diff
-        )} (margin ${clubBalanceMargin})`
+    // Server scans clubs sorted by rating instead of every pair here
+    try {
+      const { withinMargin, pick } = await fetchClubPairing(
+        avgA - avgB,
+        clubBalanceMargin
       );
+      setClubA(pick.clubA.id);
+      setClubB(pick.clubB.id);
+
+      if (!withinMargin) {
+        console.info(
+          `Closest balance diff: ${Math.round(
+            pick.diff
+          )} (margin ${clubBalanceMargin})`
+        );
+      }
+    } catch (e) {
+      console.error("Failed to fetch club pairing:", e);
     }
   };
 
@@ -419,7 +438,7 @@ function HomePage() {
             .filter(Boolean);
 
     try {
-      await addMatchAPI({
+      const data = await addMatchAPI({
         clubA:
           clubA === "custom"
             ? customClubA
@@ -434,8 +453,8 @@ function HomePage() {
         scoreB: Number(scoreB) || 0,
       });
 
-      await fetchMatches();
-      await refreshElo(); // ratings update after new match
+      // shown right away; the new ratings follow over the live stream
+      if (data.match) setMatches((prev) => withMatch(prev, data.match));
       setScoreA("");
       setScoreB("");
     } catch (error) {
@@ -475,6 +494,16 @@ function HomePage() {
             manualTeamB={manualTeamB}
             players={players}
             eloRatings={eloRatings}
+            clubAName={
+              clubA === "custom"
+                ? customClubA
+                : clubs.find((c) => c.id === clubA)?.name
+            }
+            clubBName={
+              clubB === "custom"
+                ? customClubB
+                : clubs.find((c) => c.id === clubB)?.name
+            }
           />
 
           {/* <TierSelector
@@ -565,7 +594,12 @@ function HomePage() {
             generateRandomClubs={generateRandomClubs}
           />
 
-          <MatchHistory matches={matches} />
+          <MatchHistory
+            matches={matches}
+            hasMore={matchesCursor !== null}
+            loadingMore={loadingMatches}
+            onLoadMore={loadMoreMatches}
+          />
         </>
       )}
     </div>
@@ -5,6 +5,7 @@ import {
   fetchTeamLeaderboard,
   fetchDuoLeaderboard,
 } from "../services/leaderboardAPI";
+import { mergeLeaderboard, subscribeLive } from "../services/api";
 import "../styles/Leaderboard.css";
 
 // Type definitions
@@ -78,6 +79,29 @@ const Leaderboard: React.FC = () => {
       }
     };
     loadData();
+
+    // recorded / deleted matches update only the lines they touched
+    const byRank = (
+      a: { win_percentage: number; total_matches: number },
+      b: { win_percentage: number; total_matches: number }
+    ) =>
+      b.win_percentage - a.win_percentage || b.total_matches - a.total_matches;
+    return subscribeLive(
+      startTime,
+      ({ leaderboards }) => {
+        if (!leaderboards) return;
+        setPlayerStats((rows) =>
+          mergeLeaderboard(rows, leaderboards.players, (r) => r.name, byRank)
+        );
+        setTeamStats((rows) =>
+          mergeLeaderboard(rows, leaderboards.teams, (r) => r.team, byRank)
+        );
+        setDuoStats((rows) =>
+          mergeLeaderboard(rows, leaderboards.duos, (r) => r.team_name, byRank)
+        );
+      },
+      loadData
+    );
   }, [startTime]);
 
   return (
@@ -17,6 +17,21 @@ export const fetchMatchesAPI = async () => {
   return res.json();
 };
 
+export const RECENT_MATCHES = 100;
+
+/** Players (with elo), clubs and recent matches from one consistent snapshot */
+export const fetchBootstrap = async (recent = RECENT_MATCHES) => {
+  const res = await fetch(`${API_URL}/bootstrap?recent=${recent}`);
+  return res.json();
+};
+
+/** Older matches: the page after `cursor` (a nextCursor from /bootstrap or a previous page) */
+export const fetchMatchesPageAPI = async (cursor: string, limit = 500) => {
+  const params = new URLSearchParams({ cursor, limit: String(limit) });
+  const res = await fetch(`${API_URL}/matches/page?${params}`);
+  return res.json() as Promise<{ items: any[]; nextCursor: string | null }>;
+};
+
 export const addPlayerAPI = async (name: string) => {
   const res = await fetch(`${API_URL}/players`, {
     method: "POST",
@@ -56,3 +71,108 @@ export const fetchEloRatings = async () => {
     ratings: { playerId: number; elo: number }[];
   }>;
 };
+
+export type LeaderboardDelta = { keys: string[]; rows: any[] };
+
+export interface LiveMatchEvent {
+  action: "added" | "deleted";
+  match: any;
+  /** new ratings of the match's players (everyone's after a back-dated match) */
+  elo: { playerId: number; elo: number }[];
+  /** only when subscribed with a start time */
+  leaderboards: {
+    players: LeaderboardDelta;
+    teams: LeaderboardDelta;
+    duos: LeaderboardDelta;
+  } | null;
+}
+
+/**
+ * Live updates over Server-Sent Events. onReset means "refetch everything".
+ * Returns a function that closes the stream.
+ */
+export const subscribeLive = (
+  startTime: string | null,
+  onMatch: (event: LiveMatchEvent) => void,
+  onReset: () => void
+) => {
+  const source = new EventSource(
+    startTime
+      ? `${API_URL}/stream?start_time=${startTime}`
+      : `${API_URL}/stream`
+  );
+  source.addEventListener("match", (e) =>
+    onMatch(JSON.parse((e as MessageEvent).data))
+  );
+  source.addEventListener("reset", onReset);
+  return () => source.close();
+};
+
+/** Replaces the rows named in `delta.keys` (and the incoming rows) */
+export const mergeLeaderboard = <T,>(
+  rows: T[],
+  delta: LeaderboardDelta,
+  key: (row: T) => string,
+  order: (a: T, b: T) => number
+) => {
+  const replaced = new Set([...delta.keys, ...delta.rows.map(key)]);
+  return [...rows.filter((r) => !replaced.has(key(r))), ...delta.rows].sort(
+    order
+  );
+};
+
+export interface EloPreview {
+  expectedA: number;
+  expectedB: number;
+  ratingA: number;
+  ratingB: number;
+  unknown: string[];
+  outcomes: {
+    margin: number;
+    multiplier: number;
+    deltaA: number;
+    deltaB: number;
+  }[];
+}
+
+/** Win probability and per-scoreline Elo changes for a proposed lineup */
+export const fetchEloPreview = async (lineup: {
+  teamA: string[];
+  teamB: string[];
+  clubA?: string;
+  clubB?: string;
+}) => {
+  const res = await fetch(`${API_URL}/elo/preview`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(lineup),
+  });
+  if (!res.ok) throw new Error(`preview failed: ${res.status}`);
+  return res.json() as Promise<EloPreview>;
+};
+
+export const fetchBalancedTeams = async (
+  playerIds: number[],
+  mode: string,
+  top = 1
+) => {
+  const params = new URLSearchParams({ mode, top: String(top) });
+  playerIds.forEach((id) => params.append("player_ids", String(id)));
+  const res = await fetch(`${API_URL}/matchmaking/teams?${params}`);
+  return res.json() as Promise<{
+    splits: { teamA: string[]; teamB: string[]; diff: number }[];
+  }>;
+};
+
+export const fetchClubPairing = async (gap: number, margin: number) => {
+  const params = new URLSearchParams({
+    gap: String(gap),
+    margin: String(margin),
+  });
+  const res = await fetch(`${API_URL}/matchmaking/clubs?${params}`);
+  return res.json() as Promise<{
+    count: number;
+    withinMargin: boolean;
+    pick: { clubA: { id: number }; clubB: { id: number }; diff: number };
+  }>;
+};